@@ -0,0 +1,44 @@
+import sys
+import time
+import argparse
+import fitz  # PyMuPDF
+from ocr_script import render_page
+from ocr_engines import get_engine, available_engines
+from bench_image_path import make_sample_pdf
+
+# Compares the OCR engines on the same rendered pages: per-page cost and whether the text matches.
+# The first page is reported separately because it includes engine start-up (traineddata load).
+# Usage: python bench_engines.py [book.pdf] [--pages 10] [--zoom 3] [--psm 5] [--lang jpn_vert]
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Measure per-page cost of each OCR engine.")
+    parser.add_argument("pdf", nargs="?", help="PDF to sample pages from (default: generated sample)")
+    parser.add_argument("--pages", type=int, default=10)
+    parser.add_argument("--zoom", type=float, default=3)
+    parser.add_argument("--psm", type=int, default=5)
+    parser.add_argument("--lang", default="jpn_vert")
+    parser.add_argument("--tesseract-cmd")
+    args = parser.parse_args(argv)
+
+    doc = fitz.open(args.pdf) if args.pdf else make_sample_pdf(min(args.pages, 5))
+    pixmaps = [render_page(doc.load_page(i % len(doc)), args.zoom) for i in range(args.pages)]
+
+    texts = {}
+    for name in available_engines():
+        start = time.perf_counter()
+        engine = get_engine(name, args.lang, args.psm, args.tesseract_cmd)
+        texts[name] = [engine.recognize(pixmaps[0])]
+        first_ms = (time.perf_counter() - start) * 1000
+        start = time.perf_counter()
+        texts[name] += [engine.recognize(pix) for pix in pixmaps[1:]]
+        rest = len(pixmaps) - 1
+        rest_ms = (time.perf_counter() - start) * 1000 / rest if rest else 0
+        print(f"{name:12s} first page {first_ms:8.1f} ms, then {rest_ms:8.1f} ms/page")
+
+    names = list(texts)
+    for other in names[1:]:
+        same = sum(a == b for a, b in zip(texts[names[0]], texts[other]))
+        print(f"{other} matches {names[0]} on {same}/{len(pixmaps)} pages")
+
+if __name__ == "__main__":
+    sys.exit(main())
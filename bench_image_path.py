@@ -0,0 +1,81 @@
+import sys
+import os
+import io
+import time
+import argparse
+import tempfile
+import fitz  # PyMuPDF
+from PIL import Image
+from ocr_script import render_page
+from ocr_engines import scratch_dir
+
+# Micro-benchmark for the PyMuPDF -> Tesseract hand-off only (no OCR is run).
+#   old: RGB pixmap -> PNG bytes -> PIL decode -> convert('L') -> PNG temp file (what pytesseract does)
+#   new: grayscale pixmap -> uncompressed PGM in the RAM-backed scratch dir
+# Usage: python bench_image_path.py [book.pdf] [--zoom 3] [--pages 10]
+
+SAMPLE_TEXT = "吾輩は猫である。名前はまだ無い。どこで生れたかとんと見当がつかぬ。"
+
+def make_sample_pdf(pages):
+    # A few pages of vertical Japanese text, one character per line step, right to left.
+    doc = fitz.open()
+    for _ in range(pages):
+        page = doc.new_page(width=516, height=729)  # B5
+        x = page.rect.width - 60
+        while x > 40:
+            y = 60
+            for ch in SAMPLE_TEXT:
+                page.insert_text((x, y), ch, fontname="japan", fontsize=12)
+                y += 14
+                if y > page.rect.height - 50:
+                    break
+            x -= 20
+    return doc
+
+def old_path(page, zoom):
+    pix = page.get_pixmap(matrix=fitz.Matrix(zoom, zoom))
+    image = Image.open(io.BytesIO(pix.tobytes("png")))
+    image = image.convert('L')
+    fd, path = tempfile.mkstemp(suffix=".PNG")
+    os.close(fd)
+    try:
+        image.save(path, format="PNG")
+    finally:
+        os.remove(path)
+
+def new_path(page, zoom):
+    pix = render_page(page, zoom)
+    fd, path = tempfile.mkstemp(suffix=".pgm", dir=scratch_dir)
+    os.close(fd)
+    try:
+        pix.save(path)
+    finally:
+        os.remove(path)
+
+def time_per_page(func, doc, zoom, pages):
+    start = time.perf_counter()
+    for i in range(pages):
+        func(doc.load_page(i % len(doc)), zoom)
+    return (time.perf_counter() - start) * 1000 / pages
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Time the image hand-off between PyMuPDF and Tesseract.")
+    parser.add_argument("pdf", nargs="?", help="PDF to sample pages from (default: generated sample)")
+    parser.add_argument("--zoom", type=float, default=3)
+    parser.add_argument("--pages", type=int, default=10)
+    args = parser.parse_args(argv)
+
+    doc = fitz.open(args.pdf) if args.pdf else make_sample_pdf(min(args.pages, 5))
+    # Warm up fonts and caches so neither path pays for them.
+    old_path(doc.load_page(0), args.zoom)
+    new_path(doc.load_page(0), args.zoom)
+
+    old_ms = time_per_page(old_path, doc, args.zoom, args.pages)
+    new_ms = time_per_page(new_path, doc, args.zoom, args.pages)
+    print(f"Zoom {args.zoom}, {args.pages} pages, scratch dir {scratch_dir}")
+    print(f"  PNG round trip : {old_ms:8.1f} ms/page")
+    print(f"  Direct PGM     : {new_ms:8.1f} ms/page")
+    print(f"  Saved          : {old_ms - new_ms:8.1f} ms/page ({old_ms / new_ms:.1f}x)")
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,254 @@
+import sys
+import os
+import json
+import time
+import shutil
+import argparse
+import tempfile
+import platform
+from concurrent.futures import ProcessPoolExecutor
+import fitz  # PyMuPDF
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+# Offline throughput benchmark for ocr_pdf.
+#   python bench_suite.py                              # run the default matrix, write bench_results.json
+#   python bench_suite.py --save-baseline              # ... and store it as bench_baseline.json
+#   python bench_suite.py --baseline bench_baseline.json   # exit 1 on a regression
+# The corpus is generated with PyMuPDF (no files or network needed): vertical Japanese text with a
+# text layer, the same pages as image-only "scans", blank pages, and several page sizes.
+# Each matrix entry runs in a fresh process so its peak RSS is its own.
+
+PASSAGE = ("吾輩は猫である。名前はまだ無い。どこで生れたかとんと見当がつかぬ。何でも薄暗いじめじめした所で"
+           "ニャーニャー泣いていた事だけは記憶している。吾輩はここで始めて人間というものを見た。しかもあとで"
+           "聞くとそれは書生という人間中で一番獰悪な種族であったそうだ。")
+
+PAGE_SIZES = {
+    "A5": (420, 595),
+    "B6": (363, 516),
+    "B5": (516, 729),
+    "A4": (595, 842),
+}
+
+DEFAULT_MATRIX = [
+    {"name": "zoom3"},
+    {"name": "zoom2", "zoom": 2},
+    {"name": "zoom3-workers2", "workers": 2},
+    {"name": "zoom3-drop-headers", "header_mode": "drop"},
+    {"name": "zoom3-no-text-layer", "use_text_layer": False},
+    {"name": "zoom8-tiled-64mb", "zoom": 8, "memory_budget": 64, "use_text_layer": False},
+    {"name": "zoom3-scan-cleanup", "preprocess": "border,deskew,otsu,despeckle", "use_text_layer": False},
+    {"name": "zoom3-batch8", "batch_size": 8, "use_text_layer": False},
+]
+
+# Regression tolerance against the baseline (relative).
+DEFAULT_TOLERANCE = 0.15
+
+def draw_vertical_page(page, number, fontsize=11):
+    # Body text in columns from right to left, a running head and a page number (nombre).
+    width, height = page.rect.width, page.rect.height
+    step = fontsize * 1.1
+    chars = iter(PASSAGE * 20)
+    x = width - 50
+    while x > 50:
+        y = 70
+        while y < height - 60:
+            page.insert_text((x, y), next(chars), fontname="japan", fontsize=fontsize)
+            y += step
+        x -= fontsize * 1.8
+    page.insert_text((width - 120, 35), "吾輩は猫である", fontname="japan", fontsize=8)
+    page.insert_text((width / 2, height - 25), str(number), fontsize=8)
+
+def _scan_of(page, dpi=200):
+    # Image-only copy of a page, like a scanner produces (no text layer).
+    return page.get_pixmap(dpi=dpi, colorspace=fitz.csGRAY)
+
+def make_corpus(out_dir, pages=6):
+    # Returns the generated PDF paths. Deterministic: same files on every machine.
+    os.makedirs(out_dir, exist_ok=True)
+    paths = []
+    for size_name, (width, height) in PAGE_SIZES.items():
+        text_doc = fitz.open()
+        for n in range(pages):
+            draw_vertical_page(text_doc.new_page(width=width, height=height), n + 1)
+
+        # Born-digital: every page has a text layer.
+        path = os.path.join(out_dir, f"text_{size_name}.pdf")
+        text_doc.save(path)
+        paths.append(path)
+
+        # Scanned: image-only pages, with a blank verso every third page.
+        scan_doc = fitz.open()
+        for n, page in enumerate(text_doc):
+            new_page = scan_doc.new_page(width=width, height=height)
+            if n % 3 != 2:
+                new_page.insert_image(new_page.rect, pixmap=_scan_of(page))
+        path = os.path.join(out_dir, f"scan_{size_name}.pdf")
+        scan_doc.save(path)
+        paths.append(path)
+
+        # Mixed: alternating text-layer and scanned pages.
+        mixed_doc = fitz.open()
+        for n, page in enumerate(text_doc):
+            if n % 2:
+                mixed_doc.insert_pdf(text_doc, from_page=n, to_page=n)
+            else:
+                new_page = mixed_doc.new_page(width=width, height=height)
+                new_page.insert_image(new_page.rect, pixmap=_scan_of(page))
+        path = os.path.join(out_dir, f"mixed_{size_name}.pdf")
+        mixed_doc.save(path)
+        paths.append(path)
+    return paths
+
+def check_text_layer(pdf_paths):
+    # The text-layer fast path must read the generated pages exactly: the running head first,
+    # the body columns in reading order, the page number last. Returns problem messages.
+    from ocr_text_layer import extract_text_layer
+    problems = []
+    for pdf_path in pdf_paths:
+        if not os.path.basename(pdf_path).startswith("text_"):
+            continue
+        with fitz.open(pdf_path) as doc:
+            for page in doc:
+                lines = (extract_text_layer(page) or "").splitlines()
+                body = "".join(lines[1:-1])
+                name = f"{os.path.basename(pdf_path)} page {page.number + 1}"
+                if len(lines) < 3 or lines[0] != "吾輩は猫である" or lines[-1] != str(page.number + 1):
+                    problems.append(f"{name}: head/page number not on lines of their own")
+                elif not body or body != (PASSAGE * 20)[:len(body)]:
+                    problems.append(f"{name}: body text out of reading order")
+    return problems
+
+def _peak_rss_mb():
+    if resource is None:
+        return None
+    # ru_maxrss is KiB on Linux and bytes on macOS. Children covers tesseract and pool workers.
+    scale = 1 if platform.system() == "Darwin" else 1024
+    own = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * scale
+    children = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss * scale
+    return round(max(own, children) / (1 << 20), 1)
+
+def _percentile(values, q):
+    if not values:
+        return None
+    values = sorted(values)
+    index = min(len(values) - 1, int(round(q / 100 * (len(values) - 1))))
+    return values[index]
+
+def run_config(config, pdf_paths):
+    # Runs in its own process. Page latency is the time between consecutive progress callbacks
+    # (with workers > 1 that is the interval between page completions).
+    from ocr_script import ocr_pdf
+    options = {k: v for k, v in config.items() if k != "name"}
+    latencies = []
+    pages = 0
+    start = time.perf_counter()
+    with tempfile.TemporaryDirectory() as out_dir:
+        for pdf_path in pdf_paths:
+            last = [time.perf_counter()]
+
+            def on_progress(current, total):
+                now = time.perf_counter()
+                if current > 1:
+                    latencies.append(now - last[0])
+                last[0] = now
+
+            stats = ocr_pdf(pdf_path, output_dir=out_dir, progress_callback=on_progress, **options)
+            latencies.append(time.perf_counter() - last[0])
+            pages += stats["pages"]
+    elapsed = time.perf_counter() - start
+    return {
+        "name": config["name"],
+        "settings": options,
+        "pages": pages,
+        "seconds": round(elapsed, 3),
+        "pages_per_sec": round(pages / elapsed, 3),
+        "latency_ms": {
+            "p50": round(_percentile(latencies, 50) * 1000, 1),
+            "p90": round(_percentile(latencies, 90) * 1000, 1),
+            "p99": round(_percentile(latencies, 99) * 1000, 1),
+        },
+        "peak_rss_mb": _peak_rss_mb(),
+    }
+
+def compare(results, baseline, tolerance=DEFAULT_TOLERANCE):
+    # Returns a list of regression messages (empty when everything is within tolerance).
+    regressions = []
+    previous = {r["name"]: r for r in baseline.get("results", [])}
+    for result in results:
+        old = previous.get(result["name"])
+        if old is None:
+            continue
+        name = result["name"]
+        if result["pages_per_sec"] < old["pages_per_sec"] * (1 - tolerance):
+            regressions.append(f"{name}: {result['pages_per_sec']} pages/sec < baseline {old['pages_per_sec']}")
+        if result["latency_ms"]["p90"] > old["latency_ms"]["p90"] * (1 + tolerance):
+            regressions.append(f"{name}: p90 {result['latency_ms']['p90']} ms > baseline {old['latency_ms']['p90']} ms")
+        if result["peak_rss_mb"] and old.get("peak_rss_mb") and result["peak_rss_mb"] > old["peak_rss_mb"] * (1 + tolerance):
+            regressions.append(f"{name}: peak RSS {result['peak_rss_mb']} MB > baseline {old['peak_rss_mb']} MB")
+    return regressions
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Offline OCR throughput benchmark.")
+    parser.add_argument("--matrix", help="JSON file with a list of settings (each with a 'name')")
+    parser.add_argument("--pages", type=int, default=6, help="pages per generated PDF")
+    parser.add_argument("--corpus-dir", help="keep the generated PDFs here (default: temporary)")
+    parser.add_argument("--output", default="bench_results.json")
+    parser.add_argument("--baseline", help="fail if results regress against this file")
+    parser.add_argument("--save-baseline", action="store_true", help="also write results to bench_baseline.json")
+    parser.add_argument("--tolerance", type=float, default=DEFAULT_TOLERANCE)
+    args = parser.parse_args(argv)
+
+    matrix = DEFAULT_MATRIX
+    if args.matrix:
+        with open(args.matrix, "r", encoding="utf-8") as f:
+            matrix = json.load(f)
+
+    corpus_dir = args.corpus_dir or tempfile.mkdtemp(prefix="glassocr_bench_")
+    try:
+        pdf_paths = make_corpus(corpus_dir, args.pages)
+        text_layer_problems = check_text_layer(pdf_paths)
+        for message in text_layer_problems:
+            print(f"TEXT LAYER {message}")
+        results = []
+        for config in matrix:
+            # A fresh process per entry: separate peak RSS and cold engine caches.
+            with ProcessPoolExecutor(max_workers=1) as executor:
+                result = executor.submit(run_config, config, pdf_paths).result()
+            results.append(result)
+            print(f"{result['name']:24s} {result['pages_per_sec']:8.2f} pages/sec  "
+                  f"p50 {result['latency_ms']['p50']:8.1f} ms  p90 {result['latency_ms']['p90']:8.1f} ms  "
+                  f"p99 {result['latency_ms']['p99']:8.1f} ms  peak RSS {result['peak_rss_mb']} MB")
+    finally:
+        if not args.corpus_dir:
+            shutil.rmtree(corpus_dir, ignore_errors=True)
+
+    report = {
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "machine": {"platform": platform.platform(), "python": platform.python_version(), "cpus": os.cpu_count()},
+        "corpus": {"files": len(pdf_paths), "pages_per_file": args.pages},
+        "results": results,
+    }
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    if args.save_baseline:
+        with open("bench_baseline.json", "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+
+    if text_layer_problems:
+        return 1
+    if args.baseline:
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            regressions = compare(results, json.load(f), args.tolerance)
+        for message in regressions:
+            print(f"REGRESSION {message}")
+        if regressions:
+            return 1
+        print("No regressions against the baseline.")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
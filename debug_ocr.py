@@ -1,8 +1,9 @@
 import fitz
 import pytesseract
-from PIL import Image
-import io
 import os
+from ocr_script import render_page
+from ocr_engines import pixmap_to_image, pixmap_to_string
+from ocr_image import preprocess, parse_preprocess
 
 # Configuration
 pytesseract.pytesseract.tesseract_cmd = r"C:\Program Files\Tesseract-OCR\tesseract.exe"
@@ -17,6 +18,8 @@ configs = [
     {"name": "Zoom 3, jpn_vert, psm 3", "zoom": 3, "lang": "jpn_vert", "config": "--psm 3"},
     {"name": "Zoom 3, jpn_vert, psm 1", "zoom": 3, "lang": "jpn_vert", "config": "--psm 1"},
     {"name": "Zoom 3, jpn, psm 6", "zoom": 3, "lang": "jpn", "config": "--psm 6"},
+    {"name": "Zoom 3, jpn_vert, psm 5, deskew + otsu", "zoom": 3, "lang": "jpn_vert", "config": "--psm 5",
+     "preprocess": "deskew,otsu"},
 ]
 
 doc = fitz.open(target_pdf)
@@ -27,19 +30,22 @@ print(f"Testing on Page {page_index+1}")
 for cfg in configs:
     print(f"\n--- Testing: {cfg['name']} ---")
     
-    mat = fitz.Matrix(cfg['zoom'], cfg['zoom'])
-    pix = page.get_pixmap(matrix=mat)
-    img_data = pix.tobytes("png")
-    image = Image.open(io.BytesIO(img_data))
+    pix = render_page(page, cfg['zoom'])
+    
+    # Image clean-up, as ocr_pdf(preprocess=...) does it
+    if cfg.get('preprocess'):
+        pix, _ = preprocess(pix, parse_preprocess(cfg['preprocess']))
     
     # Check if rotation is requested
+    image = None
     if cfg.get('rotate'):
-        image = image.rotate(cfg['rotate'], expand=True)
-    
-    # Don't convert to grayscale unless specified (removed for now)
+        image = pixmap_to_image(pix).rotate(cfg['rotate'], expand=True)
     
     try:
-        text = pytesseract.image_to_string(image, lang=cfg['lang'], config=cfg['config'])
+        if image is not None:
+            text = pytesseract.image_to_string(image, lang=cfg['lang'], config=cfg['config'])
+        else:
+            text = pixmap_to_string(pix, cfg['lang'], cfg['config'])
         print(f"--- Output ({len(text)} chars) ---\n{text[:200].replace(chr(10), ' ')}") 
     except Exception as e:
         print(f"Error: {e}")
@@ -0,0 +1,280 @@
+import sys
+import os
+import json
+import time
+import fnmatch
+import cProfile
+import argparse
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from ocr_script import ocr_pdf, ocr_settings, output_settings, DEFAULT_MIN_CONFIDENCE
+from ocr_manifest import Manifest
+from ocr_image import DEFAULT_BLANK_THRESHOLD, PREPROCESS_STEPS, parse_preprocess
+from ocr_metrics import JsonlEventWriter, PrometheusMetrics, fan_out
+from ocr_probe import check_lang
+from ocr_tune import configured_zoom, load_tuned
+from ocr_scheduler import PageScheduler, ORDERS, priority_from_patterns
+from ocr_index import SearchIndex
+
+# Headless batch runner: no PySide6 needed, so it runs on build servers.
+#   python ocr_batch.py ~/books -r --jobs 4 --zoom 3 --summary summary.json
+# Several PDFs are processed at once with --jobs (one process per document); --workers still
+# splits the pages of each document. Documents already done with the same content and settings
+# are skipped via the processing manifest.
+# Instrumentation: --events writes per-page stage timings as JSONL, --metrics a Prometheus text
+# file, and --profile runs the first document under cProfile (view with python -m pstats FILE).
+
+# The old ocr_script (and the GUI) kept the names of finished files here; imported into the
+# manifest so upgrading doesn't re-OCR the library.
+LEGACY_LOG_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "processed_log.txt")
+
+def find_pdfs(paths, recursive=False, patterns=("*.pdf",)):
+    # Yields (pdf path, directory relative to the input root). The relative directory is
+    # mirrored under the output directory so equal file names in different folders don't collide.
+    for root in paths:
+        if os.path.isfile(root):
+            yield root, ""
+            continue
+        for dirpath, dirnames, filenames in os.walk(root):
+            dirnames.sort()
+            for filename in sorted(filenames):
+                if any(fnmatch.fnmatch(filename.lower(), pattern.lower()) for pattern in patterns):
+                    yield os.path.join(dirpath, filename), os.path.relpath(dirpath, root)
+            if not recursive:
+                break
+
+def _number(value):
+    # 3.0 -> 3, so settings from the command line hash the same as the GUI's integer spinbox values.
+    return int(value) if float(value).is_integer() else value
+
+def _run_job(pdf_path, output_dir, options, profile_path=None):
+    # Runs in a job process: events are collected and handed back with the stats,
+    # since a callback can't reach the main process's sinks.
+    start = time.time()
+    os.makedirs(output_dir, exist_ok=True)
+    events = []
+    if profile_path:
+        profiler = cProfile.Profile()
+        stats = profiler.runcall(ocr_pdf, pdf_path, output_dir=output_dir, event_callback=events.append, **options)
+        profiler.dump_stats(profile_path)
+    else:
+        stats = ocr_pdf(pdf_path, output_dir=output_dir, event_callback=events.append, **options)
+    return stats, time.time() - start, events
+
+def add_ocr_arguments(parser):
+    # OCR settings shared with ocr_watch and ocr_service. Workers and Tesseract threads default to
+    # the values ocr_tune measured on this machine, if it has been run; zoom to the one it saved
+    # with --save-zoom, else the GUI's.
+    tuned = load_tuned()
+    parser.add_argument("--workers", type=int, default=tuned.get("workers", 1), help="page worker processes per PDF")
+    parser.add_argument("--tesseract-threads", type=int, default=tuned.get("tesseract_threads"),
+                        help="OMP_THREAD_LIMIT for tesseract (default: tesseract's own, one thread per core)")
+    parser.add_argument("--zoom", type=float, default=tuned.get("zoom", configured_zoom()))
+    parser.add_argument("--zoom-steps", help="adaptive zoom ladder, e.g. 2,3,5 (overrides --zoom)")
+    parser.add_argument("--min-confidence", type=float, default=DEFAULT_MIN_CONFIDENCE,
+                        help="adaptive zoom: mean word confidence a page must reach")
+    parser.add_argument("--psm", type=int, default=5)
+    parser.add_argument("--lang", default="jpn_vert")
+    parser.add_argument("--engine", default="pytesseract")
+    parser.add_argument("--tesseract-cmd", help="path to the tesseract executable")
+    parser.add_argument("--no-text-layer", action="store_true", help="OCR every page even if it has a text layer")
+    parser.add_argument("--blank-threshold", type=float, default=DEFAULT_BLANK_THRESHOLD,
+                        help="ink share below which a page is skipped as blank (0 disables)")
+    parser.add_argument("--headers", choices=["keep", "drop", "separate"], default="keep",
+                        help="keep: OCR whole pages; drop: crop to the body text; separate: also OCR running heads apart")
+    parser.add_argument("--cache", nargs="?", const=True, default=None,
+                        help="use the page cache (optionally at the given path)")
+    parser.add_argument("--memory-budget", type=int,
+                        help="MB per worker: larger renders are OCR'd in column tiles, and --workers is capped to free memory")
+    parser.add_argument("--formats", default="text",
+                        help="comma-separated output formats: text, jsonl, hocr, alto (default: text)")
+    parser.add_argument("--preprocess", default="",
+                        help="comma-separated image clean-up before OCR: " + ", ".join(PREPROCESS_STEPS))
+    parser.add_argument("--batch-size", type=int, default=1,
+                        help="pages OCR'd per tesseract process (pytesseract engine); 8-16 saves start-up time; "
+                             "with --memory-budget, only as many as fit the budget together")
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="Batch OCR for Japanese vertical PDFs.")
+    parser.add_argument("paths", nargs="+", help="PDF files or directories")
+    parser.add_argument("-r", "--recursive", action="store_true", help="walk directories recursively")
+    parser.add_argument("-g", "--glob", action="append", dest="patterns",
+                        help="file name pattern to include (repeatable, default: *.pdf)")
+    parser.add_argument("-o", "--output-dir", default=os.getcwd(), help="where *_output.txt files go")
+    parser.add_argument("-j", "--jobs", type=int, default=1, help="PDFs processed concurrently")
+    add_ocr_arguments(parser)
+    parser.add_argument("--schedule", choices=ORDERS,
+                        help="share --workers page workers across all PDFs, taking documents in this order "
+                             "(instead of --jobs)")
+    parser.add_argument("--priority", action="append", default=[], metavar="GLOB",
+                        help="with --schedule priority: PDFs matching this pattern go first (repeatable, "
+                             "earlier patterns first)")
+    parser.add_argument("--manifest", default="processed_manifest.sqlite", help="processing manifest database")
+    parser.add_argument("--force", action="store_true", help="process documents even if the manifest says done")
+    parser.add_argument("--legacy-log", default=LEGACY_LOG_PATH,
+                        help="processed_log.txt of the old ocr_script; the home-folder PDFs listed there are "
+                             "recorded as done, once, if the settings are the defaults it used")
+    parser.add_argument("--index", help="add each finished document to this full-text search index (see ocr_index)")
+    parser.add_argument("--summary", help="write a JSON summary to this file ('-' for stdout)")
+    parser.add_argument("--events", help="append per-page timing events to this JSONL file")
+    parser.add_argument("--metrics", help="write Prometheus metrics to this text file after every document")
+    parser.add_argument("--profile", help="run the first document under cProfile and dump the stats here")
+    return parser
+
+def job_options(args):
+    # (ocr_pdf keyword arguments, manifest settings) from the parsed OCR arguments.
+    # Raises ValueError when the requested language is not installed.
+    zoom = _number(args.zoom)
+    header_mode = None if args.headers == "keep" else args.headers
+    zoom_steps = [_number(float(z)) for z in args.zoom_steps.split(",")] if args.zoom_steps else None
+    formats = [name.strip() for name in args.formats.split(",") if name.strip()]
+    options = {
+        "zoom": zoom,
+        "psm": args.psm,
+        "lang": args.lang,
+        "engine": args.engine,
+        "tesseract_cmd": args.tesseract_cmd,
+        "workers": args.workers,
+        "use_text_layer": not args.no_text_layer,
+        "cache": args.cache,
+        "blank_threshold": args.blank_threshold,
+        "zoom_steps": zoom_steps,
+        "min_confidence": args.min_confidence,
+        "header_mode": header_mode,
+        "formats": formats,
+        "memory_budget": args.memory_budget,
+        "preprocess": list(parse_preprocess(args.preprocess)),
+        "batch_size": args.batch_size,
+        "tesseract_threads": args.tesseract_threads,
+    }
+    # Checked once for the whole batch instead of failing every page of every document.
+    if check_lang(args.lang, args.tesseract_cmd) is None:
+        print("Warning: Tesseract not found; only pages with a text layer can be read.")
+    settings = output_settings(zoom, args.psm, args.lang, args.engine, not args.no_text_layer, args.blank_threshold,
+                               zoom_steps, args.min_confidence, header_mode, formats, args.memory_budget,
+                               options["preprocess"])
+    return options, settings
+
+def main(argv=None):
+    parser = build_parser()
+    args = parser.parse_args(argv)
+    if args.profile and args.schedule:
+        # The scheduled pages run in pool workers, where a profile of this process sees nothing.
+        parser.error("--profile profiles one document in this process; it can't be combined with --schedule")
+    patterns = args.patterns or ["*.pdf"]
+    try:
+        options, settings = job_options(args)
+    except ValueError as e:
+        print(f"Error: {e}")
+        return 2
+    manifest = Manifest(args.manifest)
+    index = SearchIndex(args.index) if args.index else None
+    events_writer = JsonlEventWriter(args.events) if args.events else None
+    metrics = PrometheusMetrics() if args.metrics else None
+    on_event = fan_out(events_writer, metrics)
+
+    summary = {"files": 0, "processed": 0, "skipped": 0, "failed": [], "pages": 0,
+               "text_layer_pages": 0, "blank_pages": 0, "ocr_pages": 0, "cache_hits": 0}
+    found = list(find_pdfs(args.paths, args.recursive, patterns))
+    # The old script processed the home folder with the default settings.
+    imported = manifest.import_legacy_log(args.legacy_log, os.path.expanduser("~"), settings, output_settings())
+    if imported:
+        print(f"Imported {imported} files from {args.legacy_log}.")
+    jobs = []
+    for pdf_path, rel_dir in found:
+        summary["files"] += 1
+        if not args.force and manifest.is_done(pdf_path, settings):
+            print(f"Skipping {pdf_path} (already processed).")
+            summary["skipped"] += 1
+            continue
+        jobs.append((pdf_path, os.path.normpath(os.path.join(args.output_dir, rel_dir))))
+
+    def record(pdf_path, stats, seconds, error=None):
+        if error is not None:
+            print(f"Error processing {pdf_path}: {error}")
+            manifest.fail(pdf_path, settings, error, seconds=seconds)
+            summary["failed"].append({"path": pdf_path, "error": str(error)})
+            return
+        if metrics:
+            metrics.write(args.metrics)
+        manifest.finish(pdf_path, settings, pages=stats["pages"], output=stats["output"], seconds=seconds)
+        if index:
+            index.add_stats(pdf_path, stats)
+        summary["processed"] += 1
+        summary["pages"] += stats["pages"]
+        summary["text_layer_pages"] += len(stats["text layer"])
+        summary["blank_pages"] += len(stats["blank"])
+        summary["ocr_pages"] += len(stats["ocr"])
+        summary["cache_hits"] += stats["cache hits"]
+        print(f"Successfully processed {pdf_path} ({stats['pages']} pages, {seconds:.1f}s)")
+
+    if args.schedule:
+        try:
+            # One page pool for the whole batch; events arrive here directly, page by page.
+            scheduler = PageScheduler(ocr_settings(**{k: v for k, v in options.items() if k != "workers"}),
+                                      args.workers, args.schedule, event_callback=on_event, on_document=record)
+        except ValueError as e:
+            print(f"Error: {e}")
+            manifest.close()
+            if index:
+                index.close()
+            if events_writer:
+                events_writer.close()
+            return 2
+        print(f"Found {summary['files']} PDF files, {len(jobs)} to process on {args.workers} shared page workers.")
+    else:
+        print(f"Found {summary['files']} PDF files, {len(jobs)} to process with {args.jobs} jobs.")
+    start = time.time()
+    try:
+        if args.schedule:
+            for pdf_path, output_dir in jobs:
+                try:
+                    scheduler.add(pdf_path, output_dir, priority_from_patterns(pdf_path, args.priority))
+                except Exception as e:
+                    record(pdf_path, None, None, e)
+                    continue
+                manifest.start(pdf_path, settings)
+            scheduler.run()
+        else:
+            executor = ProcessPoolExecutor(max_workers=max(1, args.jobs))
+            try:
+                futures = {}
+                for n, (pdf_path, output_dir) in enumerate(jobs):
+                    manifest.start(pdf_path, settings)
+                    profile_path = args.profile if n == 0 else None
+                    futures[executor.submit(_run_job, pdf_path, output_dir, options, profile_path)] = pdf_path
+                for future in as_completed(futures):
+                    pdf_path = futures[future]
+                    try:
+                        stats, seconds, events = future.result()
+                    except Exception as e:
+                        record(pdf_path, None, None, e)
+                        continue
+                    for event in events:
+                        on_event(event)
+                    record(pdf_path, stats, seconds)
+            finally:
+                executor.shutdown(wait=True, cancel_futures=True)
+    finally:
+        manifest.close()
+        if index:
+            index.close()
+        if events_writer:
+            events_writer.close()
+
+    elapsed = time.time() - start
+    summary["seconds"] = round(elapsed, 3)
+    summary["pages_per_sec"] = round(summary["pages"] / elapsed, 3) if elapsed > 0 else 0.0
+    if metrics:
+        summary["stage_seconds"] = {k: round(v, 3) for k, v in sorted(metrics.stage_seconds.items())}
+    report = json.dumps(summary, ensure_ascii=False, indent=2)
+    if args.summary == "-":
+        print(report)
+    elif args.summary:
+        with open(args.summary, "w", encoding="utf-8") as f:
+            f.write(report + "\n")
+    print(f"Processed {summary['processed']}, skipped {summary['skipped']}, failed {len(summary['failed'])}; "
+          f"{summary['pages_per_sec']} pages/sec")
+    return 1 if summary["failed"] else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
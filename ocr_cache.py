@@ -0,0 +1,76 @@
+import os
+import time
+import sqlite3
+import hashlib
+
+# Persistent cache of recognized page text, keyed by the rendered page image and everything
+# that affects recognition (lang, psm, zoom, engine and its version). Re-running a folder,
+# changing the output directory or OCR'ing a reprint then reuses every page already seen.
+# SQLite in WAL mode so the pool workers of one or more runs can share the file.
+
+DEFAULT_CACHE_PATH = os.path.join(os.path.expanduser("~"), ".cache", "glassocr", "page_cache.sqlite")
+DEFAULT_MAX_ENTRIES = 200000
+# Checking the size on every insert would cost a COUNT(*) per page.
+_EVICT_EVERY = 100
+
+class PageCache:
+    def __init__(self, path=None, max_entries=DEFAULT_MAX_ENTRIES):
+        self.path = path or DEFAULT_CACHE_PATH
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._puts = 0
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        self.conn = sqlite3.connect(self.path, timeout=30)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.execute("CREATE TABLE IF NOT EXISTS pages (key TEXT PRIMARY KEY, text TEXT NOT NULL, last_used REAL NOT NULL)")
+        self.conn.execute("CREATE INDEX IF NOT EXISTS pages_last_used ON pages (last_used)")
+        self.conn.commit()
+
+    @staticmethod
+    def key(pix, lang, psm, zoom, engine, engine_version):
+        h = hashlib.blake2b(digest_size=20)
+        h.update(f"{lang}|{psm}|{zoom}|{engine}|{engine_version}|{pix.width}x{pix.height}x{pix.n}|".encode())
+        h.update(pix.samples_mv)
+        return h.hexdigest()
+
+    def get(self, key):
+        row = self.conn.execute("SELECT text FROM pages WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        # Touch the entry so eviction stays least-recently-used.
+        self.conn.execute("UPDATE pages SET last_used = ? WHERE key = ?", (time.time(), key))
+        self.conn.commit()
+        return row[0]
+
+    def put(self, key, text):
+        self.conn.execute("INSERT OR REPLACE INTO pages (key, text, last_used) VALUES (?, ?, ?)",
+                          (key, text, time.time()))
+        self.conn.commit()
+        self._puts += 1
+        if self._puts % _EVICT_EVERY == 0:
+            self.evict()
+
+    def evict(self):
+        count = self.conn.execute("SELECT COUNT(*) FROM pages").fetchone()[0]
+        if count > self.max_entries:
+            self.conn.execute("DELETE FROM pages WHERE key IN (SELECT key FROM pages ORDER BY last_used LIMIT ?)",
+                              (count - self.max_entries,))
+            self.conn.commit()
+
+    def close(self):
+        self.conn.close()
+
+# One connection per process and cache file; pool workers open their own on first use.
+_caches = {}
+
+def get_cache(path=None, max_entries=DEFAULT_MAX_ENTRIES):
+    path = path or DEFAULT_CACHE_PATH
+    cache = _caches.get(path)
+    if cache is None:
+        cache = PageCache(path, max_entries)
+        _caches[path] = cache
+    return cache
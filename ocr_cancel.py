@@ -0,0 +1,51 @@
+import threading
+
+# Cancellation for ocr_pdf. The caller (e.g. the GUI's STOP button) calls token.cancel() from any
+# thread. Work that can be interrupted registers a callback with the token: running tesseract
+# processes are killed and page worker pools are terminated right away, instead of STOP waiting
+# for the current page to finish. ocr_pdf then raises Cancelled; the pages finished so far are
+# already in the journal, so the next run resumes from there.
+
+class Cancelled(Exception):
+    def __init__(self, message="Stopped by user"):
+        super().__init__(message)
+
+class CancelToken:
+    def __init__(self):
+        self._event = threading.Event()
+        self._lock = threading.Lock()
+        self._callbacks = {}
+        self._next_id = 0
+
+    @property
+    def cancelled(self):
+        return self._event.is_set()
+
+    def cancel(self):
+        with self._lock:
+            self._event.set()
+            callbacks = list(self._callbacks.values())
+        for callback in callbacks:
+            try:
+                callback()
+            except Exception as e:
+                print(f"Cancel callback failed: {e}")
+
+    def check(self):
+        if self._event.is_set():
+            raise Cancelled()
+
+    def register(self, callback):
+        # Returns an id for unregister(). Registering on a cancelled token calls back at once.
+        with self._lock:
+            handle = self._next_id
+            self._next_id += 1
+            self._callbacks[handle] = callback
+            cancelled = self._event.is_set()
+        if cancelled:
+            callback()
+        return handle
+
+    def unregister(self, handle):
+        with self._lock:
+            self._callbacks.pop(handle, None)
@@ -0,0 +1,295 @@
+import os
+import sys
+import time
+import shlex
+import tempfile
+import subprocess
+import pytesseract
+from PIL import Image
+from ocr_cancel import Cancelled
+from ocr_probe import find_tesseract, probe
+
+# tesserocr (Tesseract C API bindings) is optional; without it only the pytesseract engine is available.
+try:
+    import tesserocr
+except ImportError:
+    tesserocr = None
+
+# OCR backends used by ocr_pdf. Every engine takes a grayscale fitz.Pixmap and returns the page text
+# exactly as the tesseract command line prints it, so the output file is the same whichever engine ran.
+# Engines also count pages and seconds spent so their per-page cost can be compared (see bench_engines.py).
+
+# Images for Tesseract go to a RAM-backed directory when the OS has one (Linux /dev/shm),
+# so the hand-off never touches the disk.
+scratch_dir = "/dev/shm" if os.path.isdir("/dev/shm") else tempfile.gettempdir()
+
+def pixmap_to_image(pix):
+    # Wrap the pixmap samples as a PIL image without copying them.
+    # The image borrows the pixmap's memory: drop the image before the pixmap.
+    return Image.frombuffer("L", (pix.width, pix.height), pix.samples_mv, "raw", "L", pix.stride, 1)
+
+def _scratch_pgm(pix):
+    fd, image_path = tempfile.mkstemp(prefix="glassocr_", suffix=".pgm", dir=scratch_dir)
+    os.close(fd)
+    pix.save(image_path)
+    return image_path
+
+def run_tesseract(image_path, output_base, lang, config='', extension="txt", cancel_token=None):
+    # Same command line as pytesseract.run_tesseract, but the process is ours: while it runs it is
+    # registered with the cancel token, so STOP kills it instead of waiting for the page.
+    args = [pytesseract.pytesseract.tesseract_cmd, image_path, output_base, "-l", lang]
+    args += shlex.split(config, posix=sys.platform != "win32")
+    args.append(extension)
+    try:
+        proc = subprocess.Popen(args, **pytesseract.pytesseract.subprocess_args())
+    except FileNotFoundError:
+        raise pytesseract.TesseractNotFoundError()
+    handle = cancel_token.register(proc.kill) if cancel_token else None
+    try:
+        _, errors = proc.communicate()
+    finally:
+        if handle is not None:
+            cancel_token.unregister(handle)
+    if cancel_token and cancel_token.cancelled:
+        raise Cancelled()
+    if proc.returncode:
+        raise pytesseract.TesseractError(proc.returncode, pytesseract.pytesseract.get_errors(errors))
+
+def pixmap_to_string(pix, lang, config='', cancel_token=None):
+    # Hand the pixmap to Tesseract as an uncompressed PGM file in the scratch dir
+    # instead of re-encoding a PNG. PGM has no resolution field, so pass the DPI
+    # the PNG used to carry.
+    image_path = _scratch_pgm(pix)
+    output_base = image_path[:-len(".pgm")]
+    try:
+        config = f"{config} --dpi {pix.xres}".strip()
+        run_tesseract(image_path, output_base, lang, config, "txt", cancel_token)
+        with open(output_base + ".txt", "rb") as f:
+            return f.read().decode("utf-8")
+    finally:
+        for path in (image_path, output_base + ".txt"):
+            if os.path.exists(path):
+                os.remove(path)
+
+def _tsv_words(tsv):
+    # (page_num, word) for the word rows (level 5) of Tesseract's TSV output, with pixel boxes
+    # and confidences.
+    for row in tsv.splitlines()[1:]:
+        cols = row.split("\t")
+        if len(cols) < 12 or cols[0] != "5" or not cols[11].strip():
+            continue
+        yield int(cols[1]), {
+            "block": int(cols[2]), "par": int(cols[3]), "line": int(cols[4]),
+            "left": int(cols[6]), "top": int(cols[7]), "width": int(cols[8]), "height": int(cols[9]),
+            "conf": float(cols[10]), "text": cols[11],
+        }
+
+def _parse_tsv(tsv):
+    return [word for _, word in _tsv_words(tsv)]
+
+def pixmap_to_data(pix, lang, config='', cancel_token=None):
+    # One tesseract run that writes both the txt and the tsv renderer output, so the text is
+    # identical to pixmap_to_string() and the word boxes/confidences come for free.
+    image_path = _scratch_pgm(pix)
+    output_base = image_path[:-len(".pgm")]
+    try:
+        config = f"{config} --dpi {pix.xres} -c tessedit_create_tsv=1".strip()
+        run_tesseract(image_path, output_base, lang, config, "txt", cancel_token)
+        with open(output_base + ".txt", "r", encoding="utf-8") as f:
+            text = f.read()
+        with open(output_base + ".tsv", "r", encoding="utf-8") as f:
+            words = _parse_tsv(f.read())
+        return text, words
+    finally:
+        for path in (image_path, output_base + ".txt", output_base + ".tsv"):
+            if os.path.exists(path):
+                os.remove(path)
+
+def pixmaps_to_strings(pixes, lang, config='', cancel_token=None, words=False):
+    # Several pages in one tesseract run: the images are listed in a text file, which tesseract
+    # reads as a multi-page document, so the process start and traineddata load are paid once.
+    # Returns one text per image (each ending in the form feed tesseract puts after every page),
+    # or (text, words) pairs with words=True. Raises RuntimeError when the output doesn't split
+    # into exactly one page per image, e.g. because tesseract skipped an image it couldn't read.
+    image_paths = [_scratch_pgm(pix) for pix in pixes]
+    fd, list_path = tempfile.mkstemp(prefix="glassocr_", suffix=".lst", dir=scratch_dir)
+    output_base = list_path[:-len(".lst")]
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            f.write("\n".join(image_paths) + "\n")
+        # One render zoom per run, so the pages share their resolution.
+        config = f"{config} --dpi {pixes[0].xres}".strip()
+        if words:
+            config += " -c tessedit_create_tsv=1"
+        run_tesseract(list_path, output_base, lang, config, "txt", cancel_token)
+        with open(output_base + ".txt", "rb") as f:
+            pages = f.read().decode("utf-8").split("\f")
+        if len(pages) != len(pixes) + 1:
+            raise RuntimeError(f"tesseract returned {len(pages) - 1} pages for {len(pixes)} images")
+        texts = [text + "\f" for text in pages[:-1]]
+        if not words:
+            return texts
+        by_page = [[] for _ in pixes]
+        with open(output_base + ".tsv", "r", encoding="utf-8") as f:
+            for page_num, word in _tsv_words(f.read()):
+                by_page[page_num - 1].append(word)
+        return list(zip(texts, by_page))
+    finally:
+        for path in image_paths + [list_path, output_base + ".txt", output_base + ".tsv"]:
+            if os.path.exists(path):
+                os.remove(path)
+
+def mean_confidence(words):
+    # Character-weighted mean word confidence (0-100); 0 when nothing was recognised.
+    weights = [len(w["text"]) for w in words if w["conf"] >= 0]
+    if not weights:
+        return 0.0
+    total = sum(w["conf"] * len(w["text"]) for w in words if w["conf"] >= 0)
+    return total / sum(weights)
+
+class PytesseractEngine:
+    # Current behaviour: one tesseract process per page, traineddata reloaded every time.
+    name = "pytesseract"
+
+    def __init__(self, lang, psm, tesseract_cmd=None):
+        if tesseract_cmd:
+            pytesseract.pytesseract.tesseract_cmd = tesseract_cmd
+        self.lang = lang
+        self.psm = psm
+        self.pages = 0
+        self.seconds = 0.0
+        # Set by ocr_pdf for the document being processed (see ocr_cancel).
+        self.cancel_token = None
+
+    def recognize(self, pix):
+        start = time.perf_counter()
+        try:
+            return pixmap_to_string(pix, self.lang, f'--psm {self.psm}', self.cancel_token)
+        finally:
+            self.pages += 1
+            self.seconds += time.perf_counter() - start
+
+    def recognize_words(self, pix):
+        # (text, words): the same text as recognize() plus word boxes and confidences.
+        start = time.perf_counter()
+        try:
+            return pixmap_to_data(pix, self.lang, f'--psm {self.psm}', self.cancel_token)
+        finally:
+            self.pages += 1
+            self.seconds += time.perf_counter() - start
+
+    def recognize_batch(self, pixes, words=False):
+        # recognize() (or recognize_words() with words=True) for several pages in one process.
+        start = time.perf_counter()
+        try:
+            return pixmaps_to_strings(pixes, self.lang, f'--psm {self.psm}', self.cancel_token, words)
+        finally:
+            self.pages += len(pixes)
+            self.seconds += time.perf_counter() - start
+
+    def version(self):
+        # From the probe cache: no `tesseract --version` process per document.
+        info = probe(find_tesseract(pytesseract.pytesseract.tesseract_cmd))
+        return info["version"] if info else str(pytesseract.get_tesseract_version())
+
+    def close(self):
+        pass
+
+class TesserocrEngine:
+    # Keeps one Tesseract instance (and its loaded traineddata) alive across pages.
+    name = "tesserocr"
+
+    def __init__(self, lang, psm, tesseract_cmd=None):
+        if tesserocr is None:
+            raise RuntimeError("The tesserocr engine needs the 'tesserocr' package (pip install tesserocr).")
+        kwargs = {"lang": lang, "psm": psm}
+        # A Windows install keeps its traineddata next to tesseract.exe.
+        if tesseract_cmd:
+            tessdata = os.path.join(os.path.dirname(tesseract_cmd), "tessdata")
+            if os.path.isdir(tessdata):
+                kwargs["path"] = tessdata
+        self.api = tesserocr.PyTessBaseAPI(**kwargs)
+        self.lang = lang
+        self.psm = psm
+        self.pages = 0
+        self.seconds = 0.0
+        # The C API can't be interrupted mid-page; ocr_pdf checks the token between pages.
+        self.cancel_token = None
+
+    def _set_page(self, pix):
+        # Raw 8-bit grayscale samples go straight in; no image file or encoder involved.
+        self.api.SetImageBytes(pix.samples, pix.width, pix.height, 1, pix.stride)
+        self.api.SetSourceResolution(pix.xres)
+
+    def recognize(self, pix):
+        start = time.perf_counter()
+        try:
+            self._set_page(pix)
+            text = self.api.GetUTF8Text()
+            self.api.Clear()
+            # The command line's txt renderer ends every page with a form feed; match it.
+            return text + "\f"
+        finally:
+            self.pages += 1
+            self.seconds += time.perf_counter() - start
+
+    def recognize_words(self, pix):
+        start = time.perf_counter()
+        try:
+            self._set_page(pix)
+            text = self.api.GetUTF8Text()
+            words = []
+            level = tesserocr.RIL.WORD
+            iterator = self.api.GetIterator()
+            if iterator is not None:
+                # Block/paragraph/line numbers as in Tesseract's TSV output (1-based).
+                block = par = line = 0
+                for word in tesserocr.iterate_level(iterator, level):
+                    if word.IsAtBeginningOf(tesserocr.RIL.BLOCK):
+                        block, par, line = block + 1, 0, 0
+                    if word.IsAtBeginningOf(tesserocr.RIL.PARA):
+                        par, line = par + 1, 0
+                    if word.IsAtBeginningOf(tesserocr.RIL.TEXTLINE):
+                        line += 1
+                    word_text = word.GetUTF8Text(level)
+                    box = word.BoundingBox(level)
+                    if not word_text or not word_text.strip() or box is None:
+                        continue
+                    x1, y1, x2, y2 = box
+                    words.append({
+                        "block": block, "par": par, "line": line,
+                        "left": x1, "top": y1, "width": x2 - x1, "height": y2 - y1,
+                        "conf": word.Confidence(level), "text": word_text,
+                    })
+            self.api.Clear()
+            return text + "\f", words
+        finally:
+            self.pages += 1
+            self.seconds += time.perf_counter() - start
+
+    def version(self):
+        return tesserocr.tesseract_version()
+
+    def close(self):
+        self.api.End()
+
+ENGINES = {
+    PytesseractEngine.name: PytesseractEngine,
+    TesserocrEngine.name: TesserocrEngine,
+}
+
+def available_engines():
+    return [name for name, cls in ENGINES.items() if cls is not TesserocrEngine or tesserocr is not None]
+
+# One long-lived engine per process and settings; pool workers each build their own on first use.
+_engines = {}
+
+def get_engine(name, lang, psm, tesseract_cmd=None):
+    if name not in ENGINES:
+        raise ValueError(f"Unknown OCR engine '{name}'. Choose from: {', '.join(ENGINES)}")
+    key = (name, lang, psm, tesseract_cmd)
+    engine = _engines.get(key)
+    if engine is None:
+        engine = ENGINES[name](lang, psm, tesseract_cmd)
+        _engines[key] = engine
+    return engine
@@ -1,26 +1,88 @@
 import sys
 import os
 import json
+import time
+import multiprocessing
+from collections import deque
 from PySide6.QtWidgets import (QApplication, QMainWindow, QWidget, QVBoxLayout, 
                                QHBoxLayout, QLabel, QLineEdit, QPushButton, 
                                QFileDialog, QSpinBox, QTextEdit, QFrame, 
-                               QGraphicsDropShadowEffect, QProgressBar, QMessageBox)
-from PySide6.QtCore import Qt, QThread, Signal, QSize, QPoint
-from PySide6.QtGui import QColor, QPalette, QBrush, QLinearGradient, QFont, QIcon, QPainter, QTextCursor
+                               QGraphicsDropShadowEffect, QProgressBar, QMessageBox,
+                               QComboBox, QCheckBox, QListView)
+from PySide6.QtCore import Qt, QThread, Signal, QSize, QPoint, QTimer, QAbstractListModel, QModelIndex
+from PySide6.QtGui import QColor, QPalette, QBrush, QLinearGradient, QFont, QIcon, QPainter
 
 # Import OCR Logic
 try:
-    from ocr_script import ocr_pdf
+    import fitz  # PyMuPDF
+    from ocr_script import ocr_settings, output_settings
+    from ocr_scheduler import PageScheduler
+    from ocr_manifest import Manifest
+    from ocr_index import SearchIndex, DEFAULT_INDEX_PATH
+    from ocr_engines import available_engines
+    from ocr_cancel import CancelToken, Cancelled
+    from ocr_probe import find_tesseract, check_lang
+    from ocr_tune import load_config
 except ImportError:
-    pass
+    available_engines = lambda: ["pytesseract"]
+
+# The UI is refreshed from the worker's queued events at this interval instead of once per
+# page and log line, and each log view keeps only the most recent lines.
+UPDATE_INTERVAL_MS = 200
+MAX_LOG_LINES = 5000
+
+# Image clean-up presets for the Clean-up box (see ocr_image.preprocess).
+PREPROCESS_PRESETS = {
+    "Off": "",
+    "Binarize": "otsu",
+    "Adaptive": "adaptive",
+    "Scan": "border,deskew,otsu,despeckle",
+}
+
+# Document orders for the Order box (see ocr_scheduler).
+ORDER_CHOICES = {
+    "Shortest first": "shortest",
+    "Folder order": "fifo",
+}
+
+class LogModel(QAbstractListModel):
+    # Bounded list of log lines for a QListView; the oldest lines are dropped past max_lines.
+    def __init__(self, max_lines=MAX_LOG_LINES, parent=None):
+        super().__init__(parent)
+        self.lines = deque()
+        self.max_lines = max_lines
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.lines)
+
+    def data(self, index, role=Qt.DisplayRole):
+        if role == Qt.DisplayRole and index.isValid():
+            return self.lines[index.row()]
+        return None
+
+    def append_lines(self, lines):
+        # One insert (and at most one removal) per batch, however many lines it holds.
+        lines = lines[-self.max_lines:]
+        if not lines:
+            return
+        overflow = len(self.lines) + len(lines) - self.max_lines
+        if overflow > 0:
+            self.beginRemoveRows(QModelIndex(), 0, overflow - 1)
+            for _ in range(overflow):
+                self.lines.popleft()
+            self.endRemoveRows()
+        first = len(self.lines)
+        self.beginInsertRows(QModelIndex(), first, first + len(lines) - 1)
+        self.lines.extend(lines)
+        self.endInsertRows()
 
 class WorkerThread(QThread):
-    progress_signal = Signal(str)
-    log_signal = Signal(str)
     error_signal = Signal(str)
     finished_signal = Signal()
     
-    def __init__(self, source_dir, output_dir, zoom, psm, lang, tess_path):
+    def __init__(self, source_dir, output_dir, zoom, psm, lang, tess_path, workers=1, engine="pytesseract", use_cache=True, zoom_steps=None,
+                 header_mode=None, memory_budget=None, preprocess="", batch_size=1,
+                 tesseract_threads=None, order="shortest"):
         super().__init__()
         self.source_dir = source_dir
         self.output_dir = output_dir
@@ -28,7 +90,34 @@ class WorkerThread(QThread):
         self.psm = psm
         self.lang = lang
         self.tess_path = tess_path
-        self.is_running = True
+        self.workers = workers
+        self.engine = engine
+        self.use_cache = use_cache
+        self.zoom_steps = zoom_steps
+        self.header_mode = header_mode
+        self.memory_budget = memory_budget
+        self.preprocess = preprocess
+        self.batch_size = batch_size
+        self.tesseract_threads = tesseract_threads
+        self.order = order
+        self.cancel_token = CancelToken()
+        # Log lines and page progress are queued here and picked up by the window's update timer,
+        # so a fast batch doesn't flood the event loop with one signal per page.
+        self.log_lines = deque()
+        self.page_lines = deque()
+        self.files_total = 0
+        self.files_done = 0
+        self.current_file = ""
+        self.page_current = 0
+        self.page_total = 0
+        self.pages_total = 0
+        self.pages_done = 0
+        # Pages actually processed in this run (for pages/sec; resumed pages excluded).
+        self.pages_processed = 0
+        self.started = None
+
+    def log(self, message):
+        self.log_lines.append(message)
 
     def run(self):
         try:
@@ -37,58 +126,109 @@ class WorkerThread(QThread):
             
             pdf_files = [f for f in os.listdir(self.source_dir) if f.lower().endswith('.pdf')]
             total_files = len(pdf_files)
-            self.log_signal.emit(f"Found {total_files} PDF files.")
+            self.log(f"Found {total_files} PDF files.")
             
             script_dir = os.path.dirname(os.path.abspath(sys.argv[0]))
-            history_file = os.path.join(script_dir, "processed_log.txt")
+            manifest = Manifest(os.path.join(script_dir, "processed_manifest.sqlite"))
+            # Finished documents go into the search index next to the manifest (python ocr_index.py search ...).
+            index = SearchIndex(os.path.join(script_dir, DEFAULT_INDEX_PATH))
+            settings = output_settings(self.zoom, self.psm, self.lang, self.engine, zoom_steps=self.zoom_steps,
+                                       header_mode=self.header_mode, memory_budget=self.memory_budget,
+                                       preprocess=self.preprocess)
             
-            processed_files = set()
-            if os.path.exists(history_file):
-                with open(history_file, "r", encoding="utf-8") as f:
-                    processed_files = set(f.read().splitlines())
+            # The old GUI logged bare file names from its source folder; config.json still holds that
+            # folder and the Zoom / PSM / Lang the names were processed with.
+            config = load_config()
+            legacy_settings = output_settings(int(config.get("zoom", 3)), int(config.get("psm", 5)),
+                                              config.get("lang", "jpn_vert"))
+            imported = manifest.import_legacy_log(os.path.join(script_dir, "processed_log.txt"),
+                                                  config.get("source_dir") or self.source_dir, settings,
+                                                  legacy_settings)
+            if imported:
+                self.log(f"Imported {imported} files from processed_log.txt.")
             
-            for i, filename in enumerate(pdf_files):
-                if not self.is_running:
-                    self.log_signal.emit("Process stopped by user.")
-                    break
-                
-                if filename in processed_files:
-                    self.log_signal.emit(f"Skipping {filename} (Already processed).")
+            # Page counts up front give the page progress bar and the ETA a total to work towards.
+            todo = []
+            for filename in pdf_files:
+                pdf_path = os.path.join(self.source_dir, filename)
+                if manifest.is_done(pdf_path, settings):
+                    self.log(f"Skipping {filename} (Already processed).")
                     continue
-                
-                self.log_signal.emit(f"Processing: {filename}...")
-                
                 try:
-                    pdf_path = os.path.join(self.source_dir, filename)
-                    
-                    def on_page_progress(current, total):
-                        if not self.is_running:
-                            raise Exception("Stopped by user")
-                        self.progress_signal.emit(f"[{filename}] Page {current}/{total}")
-                    
-                    ocr_pdf(pdf_path, output_dir=self.output_dir, progress_callback=on_page_progress, 
-                            zoom=self.zoom, psm=self.psm, lang=self.lang, tesseract_cmd=self.tess_path)
-                    
-                    with open(history_file, "a", encoding="utf-8") as f:
-                        f.write(filename + "\n")
-                    
-                    self.log_signal.emit(f"Completed: {filename}")
-                    
-                except Exception as e:
-                    self.log_signal.emit(f"Error processing {filename}: {e}")
-                    if "Stopped by user" in str(e):
-                        break
+                    with fitz.open(pdf_path) as doc:
+                        pages = len(doc)
+                except Exception:
+                    pages = 0
+                todo.append((filename, pages))
+            self.files_total = len(todo)
+            self.pages_total = sum(pages for _, pages in todo)
+            self.started = time.time()
+            
+            # The pages of every file share one pool of Workers processes, so a long book at the
+            # end of the folder still keeps every worker busy (see ocr_scheduler).
+            page_counts = {}
+            reported = {}
+            
+            def on_page_progress(pdf_path, current, total):
+                filename = os.path.basename(pdf_path)
+                self.current_file = filename
+                self.page_current, self.page_total = current, total
+                reported[pdf_path] = reported.get(pdf_path, 0) + 1
+                self.pages_done += 1
+                self.pages_processed += 1
+                self.page_lines.append(f"[{filename}] Page {current}/{total}")
             
-            self.log_signal.emit("All tasks finished.")
+            def on_document(pdf_path, stats, seconds, error):
+                filename = os.path.basename(pdf_path)
+                if isinstance(error, Cancelled):
+                    manifest.fail(pdf_path, settings, error, seconds=seconds)
+                    self.log(f"Stopped {filename}; finished pages are kept and resume on the next run.")
+                    return
+                if error is not None:
+                    manifest.fail(pdf_path, settings, error, seconds=seconds)
+                    self.log(f"Error processing {filename}: {error}")
+                else:
+                    manifest.finish(pdf_path, settings, pages=stats["pages"], output=stats["output"],
+                                    seconds=seconds)
+                    self.log(f"Completed: {filename} (text layer: {len(stats['text layer'])} pages, "
+                             f"blank: {len(stats['blank'])} pages, OCR: {len(stats['ocr'])} pages)")
+                    try:
+                        index.add_stats(pdf_path, stats)
+                    except Exception as e:
+                        self.log(f"Could not add {filename} to the search index: {e}")
+                # Resumed (or failed) pages are not reported page by page; count the whole document.
+                self.pages_done += page_counts[pdf_path] - reported.get(pdf_path, 0)
+                self.files_done += 1
+            
+            scheduler = PageScheduler(
+                ocr_settings(zoom=self.zoom, psm=self.psm, lang=self.lang, tesseract_cmd=self.tess_path,
+                             engine=self.engine, cache=self.use_cache, zoom_steps=self.zoom_steps,
+                             header_mode=self.header_mode, memory_budget=self.memory_budget,
+                             preprocess=self.preprocess, batch_size=self.batch_size,
+                             tesseract_threads=self.tesseract_threads),
+                self.workers, self.order, progress_callback=on_page_progress, on_document=on_document,
+                cancel_token=self.cancel_token)
+            for filename, pages in todo:
+                pdf_path = os.path.join(self.source_dir, filename)
+                page_counts[pdf_path] = pages
+                manifest.start(pdf_path, settings)
+                scheduler.add(pdf_path, self.output_dir, pages=pages)
+            
+            try:
+                scheduler.run()
+                self.log("All tasks finished.")
+            except Cancelled:
+                self.log("Process stopped by user.")
             
         except Exception as e:
-            self.log_signal.emit(f"Critical Error: {e}")
+            self.log(f"Critical Error: {e}")
             self.error_signal.emit(str(e))
         finally:
             self.finished_signal.emit()
 
     def stop(self):
-        self.is_running = False
+        # Kills running tesseract processes / page workers right away (see ocr_cancel).
+        self.cancel_token.cancel()
 
 class GlassFrame(QFrame):
     def __init__(self, parent=None):
@@ -133,6 +273,9 @@ class MainWindow(QMainWindow):
         
         # Worker
         self.worker = None
+        self.update_timer = QTimer(self)
+        self.update_timer.setInterval(UPDATE_INTERVAL_MS)
+        self.update_timer.timeout.connect(self.flush_updates)
 
         # Load Settings
         self.load_settings()
@@ -143,20 +286,11 @@ class MainWindow(QMainWindow):
     def check_tesseract(self):
         tess = self.tess_edit.text()
         if not tess or not os.path.exists(tess):
-            # Try to find again in case it wasn't in settings
-            found = False
-            possible_paths = [
-                r"C:\Program Files\Tesseract-OCR\tesseract.exe",
-                r"C:\Program Files (x86)\Tesseract-OCR\tesseract.exe",
-                os.path.join(os.getenv('LOCALAPPDATA'), r"Programs\Tesseract-OCR\tesseract.exe") 
-            ]
-            for p in possible_paths:
-                if os.path.exists(p):
-                    self.tess_edit.setText(p)
-                    found = True
-                    break
-            
-            if not found:
+            # Try to find again in case it wasn't in settings (PATH or the usual install folders)
+            found = find_tesseract()
+            if found:
+                self.tess_edit.setText(found)
+            else:
                  QMessageBox.warning(self, "Tesseract Not Found", 
                                     "Tesseract OCR could not be found automatically.\n"
                                     "Please set the path to 'tesseract.exe' manually in the settings.\n\n"
@@ -179,10 +313,30 @@ class MainWindow(QMainWindow):
                     self.output_dir.setText(settings["output_dir"])
                 if "zoom" in settings:
                     self.zoom_spin.setValue(int(settings["zoom"]))
+                if "adaptive_zoom" in settings:
+                    self.adaptive_check.setChecked(bool(settings["adaptive_zoom"]))
                 if "psm" in settings:
                     self.psm_spin.setValue(int(settings["psm"]))
                 if "lang" in settings:
                     self.lang_edit.setText(settings["lang"])
+                if "workers" in settings:
+                    self.workers_spin.setValue(int(settings["workers"]))
+                if settings.get("tesseract_threads"):
+                    self.threads_spin.setValue(int(settings["tesseract_threads"]))
+                if "headers" in settings and self.headers_combo.findText(settings["headers"]) >= 0:
+                    self.headers_combo.setCurrentText(settings["headers"])
+                if "memory_budget" in settings:
+                    self.memory_spin.setValue(int(settings["memory_budget"]))
+                if "preprocess" in settings and self.preprocess_combo.findText(settings["preprocess"]) >= 0:
+                    self.preprocess_combo.setCurrentText(settings["preprocess"])
+                if "batch_size" in settings:
+                    self.batch_spin.setValue(int(settings["batch_size"]))
+                if "order" in settings and self.order_combo.findText(settings["order"]) >= 0:
+                    self.order_combo.setCurrentText(settings["order"])
+                if "cache" in settings:
+                    self.cache_check.setChecked(bool(settings["cache"]))
+                if "engine" in settings and self.engine_combo.findText(settings["engine"]) >= 0:
+                    self.engine_combo.setCurrentText(settings["engine"])
                 if "tess_path" in settings and os.path.exists(settings["tess_path"]):
                     self.tess_edit.setText(settings["tess_path"])
                     
@@ -195,11 +349,23 @@ class MainWindow(QMainWindow):
             "source_dir": self.source_dir.text(),
             "output_dir": self.output_dir.text(),
             "zoom": self.zoom_spin.value(),
+            "adaptive_zoom": self.adaptive_check.isChecked(),
             "psm": self.psm_spin.value(),
             "lang": self.lang_edit.text(),
+            "workers": self.workers_spin.value(),
+            "tesseract_threads": self.threads_spin.value() or None,
+            "engine": self.engine_combo.currentText(),
+            "cache": self.cache_check.isChecked(),
+            "memory_budget": self.memory_spin.value(),
+            "preprocess": self.preprocess_combo.currentText(),
+            "batch_size": self.batch_spin.value(),
+            "order": self.order_combo.currentText(),
+            "headers": self.headers_combo.currentText(),
             "tess_path": self.tess_edit.text()
         }
         config_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), "config.json")
+        # Keys the window doesn't own (ocr_tune's "tuned" result) are kept.
+        settings = dict(load_config(config_path), **settings)
         try:
             with open(config_path, "w", encoding="utf-8") as f:
                 json.dump(settings, f, indent=4)
@@ -229,7 +395,7 @@ class MainWindow(QMainWindow):
                 font-size: 14px;
                 background: transparent;
             }
-            QLineEdit, QSpinBox {
+            QLineEdit, QSpinBox, QComboBox {
                 background-color: rgba(255, 255, 255, 180);
                 border: 1px solid rgba(255, 255, 255, 200);
                 border-radius: 8px;
@@ -237,7 +403,7 @@ class MainWindow(QMainWindow):
                 font-size: 13px;
                 color: #333;
             }
-            QLineEdit:focus, QSpinBox:focus {
+            QLineEdit:focus, QSpinBox:focus, QComboBox:focus {
                 background-color: rgba(255, 255, 255, 230);
                 border: 1px solid #a18cd1;
             }
@@ -256,7 +422,7 @@ class MainWindow(QMainWindow):
             QPushButton:pressed {
                 background-color: rgba(255, 255, 255, 100);
             }
-            QTextEdit {
+            QTextEdit, QListView {
                 background-color: rgba(255, 255, 255, 120);
                 border-radius: 10px;
                 border: none;
@@ -312,6 +478,11 @@ class MainWindow(QMainWindow):
         self.zoom_spin.setValue(3)
         settings_layout.addWidget(self.zoom_spin)
         
+        # Adaptive zoom: start cheap, re-render low-confidence pages up to the Zoom value
+        self.adaptive_check = QCheckBox("Adaptive")
+        self.adaptive_check.setToolTip("OCR at low zoom first and re-render only low-confidence pages, up to Zoom")
+        settings_layout.addWidget(self.adaptive_check)
+        
         # PSM
         settings_layout.addWidget(QLabel("PSM:"))
         self.psm_spin = QSpinBox()
@@ -324,6 +495,70 @@ class MainWindow(QMainWindow):
         self.lang_edit = QLineEdit("jpn_vert")
         settings_layout.addWidget(self.lang_edit)
         
+        # Workers (parallel page OCR)
+        settings_layout.addWidget(QLabel("Workers:"))
+        self.workers_spin = QSpinBox()
+        self.workers_spin.setRange(1, os.cpu_count() or 1)
+        self.workers_spin.setValue(1)
+        settings_layout.addWidget(self.workers_spin)
+        
+        # Tesseract threads per worker (OMP_THREAD_LIMIT); python ocr_tune.py measures the best split
+        settings_layout.addWidget(QLabel("Threads:"))
+        self.threads_spin = QSpinBox()
+        self.threads_spin.setRange(0, os.cpu_count() or 1)
+        self.threads_spin.setSpecialValueText("Auto")
+        self.threads_spin.setToolTip("Tesseract threads per worker; Auto lets Tesseract use every core")
+        settings_layout.addWidget(self.threads_spin)
+        
+        # OCR Engine
+        settings_layout.addWidget(QLabel("Engine:"))
+        self.engine_combo = QComboBox()
+        self.engine_combo.addItems(available_engines())
+        settings_layout.addWidget(self.engine_combo)
+        
+        # Running heads / page numbers: OCR whole page, crop them away, or OCR them separately
+        settings_layout.addWidget(QLabel("Headers:"))
+        self.headers_combo = QComboBox()
+        self.headers_combo.addItems(["Keep", "Drop", "Separate"])
+        settings_layout.addWidget(self.headers_combo)
+        
+        # Memory budget per worker: bigger renders are OCR'd in column tiles (0 = off)
+        settings_layout.addWidget(QLabel("Memory:"))
+        self.memory_spin = QSpinBox()
+        self.memory_spin.setRange(0, 4096)
+        self.memory_spin.setSingleStep(64)
+        self.memory_spin.setSuffix(" MB")
+        self.memory_spin.setSpecialValueText("Off")
+        self.memory_spin.setToolTip("Per-worker memory budget; pages that would need more are rendered in column tiles")
+        settings_layout.addWidget(self.memory_spin)
+        
+        # Image clean-up before OCR (binarization, deskew, speck and border removal)
+        settings_layout.addWidget(QLabel("Clean-up:"))
+        self.preprocess_combo = QComboBox()
+        self.preprocess_combo.addItems(list(PREPROCESS_PRESETS))
+        self.preprocess_combo.setToolTip("Scan: crop scanner borders, straighten, binarize and remove specks")
+        settings_layout.addWidget(self.preprocess_combo)
+        
+        # Pages per tesseract run (1 = one process per page)
+        settings_layout.addWidget(QLabel("Batch:"))
+        self.batch_spin = QSpinBox()
+        self.batch_spin.setRange(1, 64)
+        self.batch_spin.setValue(1)
+        self.batch_spin.setToolTip("Pages OCR'd per Tesseract run; larger batches save process start-up time")
+        settings_layout.addWidget(self.batch_spin)
+        
+        # Which files' pages the workers take first
+        settings_layout.addWidget(QLabel("Order:"))
+        self.order_combo = QComboBox()
+        self.order_combo.addItems(list(ORDER_CHOICES))
+        self.order_combo.setToolTip("Shortest first: short files finish early while long ones use the remaining workers")
+        settings_layout.addWidget(self.order_combo)
+        
+        # Page cache (reuse text of pages already OCR'd with the same settings)
+        self.cache_check = QCheckBox("Cache")
+        self.cache_check.setChecked(True)
+        settings_layout.addWidget(self.cache_check)
+        
         self.main_layout.addWidget(settings_frame)
 
         # 4. Tesseract Path
@@ -366,24 +601,46 @@ class MainWindow(QMainWindow):
         self.status_label.setAlignment(Qt.AlignCenter)
         self.main_layout.addWidget(self.status_label)
 
-        # 7. Logs Area
+        # 7. Progress: files in the batch and pages of the whole batch, with throughput and ETA
+        progress_frame = GlassFrame()
+        progress_layout = QVBoxLayout(progress_frame)
+        progress_layout.setContentsMargins(10, 10, 10, 10)
+        self.file_progress = QProgressBar()
+        self.file_progress.setFormat("Files: %v/%m")
+        self.page_progress = QProgressBar()
+        self.page_progress.setFormat("Pages: %v/%m")
+        self.rate_label = QLabel("")
+        self.rate_label.setAlignment(Qt.AlignCenter)
+        progress_layout.addWidget(self.file_progress)
+        progress_layout.addWidget(self.page_progress)
+        progress_layout.addWidget(self.rate_label)
+        self.main_layout.addWidget(progress_frame)
+
+        # 8. Logs Area (bounded, model-backed)
         logs_layout = QHBoxLayout()
         
         # General Log
-        self.log_text = QTextEdit()
-        self.log_text.setReadOnly(True)
-        self.log_text.setPlaceholderText("General Logs...")
+        self.log_model = LogModel(parent=self)
+        self.log_view = self.create_log_view(self.log_model)
         
         # Page Log
-        self.page_log_text = QTextEdit()
-        self.page_log_text.setReadOnly(True)
-        self.page_log_text.setPlaceholderText("Page Progress...")
+        self.page_log_model = LogModel(parent=self)
+        self.page_log_view = self.create_log_view(self.page_log_model)
         
-        logs_layout.addWidget(self.log_text)
-        logs_layout.addWidget(self.page_log_text)
+        logs_layout.addWidget(self.log_view)
+        logs_layout.addWidget(self.page_log_view)
         
         self.main_layout.addLayout(logs_layout)
 
+    def create_log_view(self, model):
+        view = QListView()
+        view.setModel(model)
+        # Fixed row heights: the view never measures the lines it doesn't show.
+        view.setUniformItemSizes(True)
+        view.setEditTriggers(QListView.NoEditTriggers)
+        view.setSelectionMode(QListView.ExtendedSelection)
+        return view
+
     def create_path_selector(self, label_text, var_name, default_val):
         frame = GlassFrame()
         layout = QHBoxLayout(frame)
@@ -408,18 +665,8 @@ class MainWindow(QMainWindow):
         
         layout.addWidget(QLabel("Tesseract Path:"))
         
-        default_tess = ""
-        possible_paths = [
-            r"C:\Program Files\Tesseract-OCR\tesseract.exe",
-            r"C:\Program Files (x86)\Tesseract-OCR\tesseract.exe",
-            os.path.join(os.getenv('LOCALAPPDATA'), r"Programs\Tesseract-OCR\tesseract.exe") 
-        ]
-        for p in possible_paths:
-            if os.path.exists(p):
-                default_tess = p
-                break
-                
-        self.tess_edit = QLineEdit(default_tess)
+        # Filled in from the saved settings or by check_tesseract().
+        self.tess_edit = QLineEdit()
         layout.addWidget(self.tess_edit)
         
         btn = QPushButton("Browse")
@@ -438,18 +685,40 @@ class MainWindow(QMainWindow):
         if f:
             self.tess_edit.setText(f)
 
+    def append_log(self, view, lines):
+        # Follow the end of the log unless the user has scrolled up to read it.
+        scrollbar = view.verticalScrollBar()
+        at_bottom = scrollbar.value() >= scrollbar.maximum()
+        view.model().append_lines(lines)
+        if at_bottom:
+            view.scrollToBottom()
+
     def log(self, message):
-        self.log_text.append(message)
-        # Scroll to bottom
-        cursor = self.log_text.textCursor()
-        cursor.movePosition(QTextCursor.MoveOperation.End)
-        self.log_text.setTextCursor(cursor)
-
-    def log_page(self, message):
-        self.page_log_text.append(message)
-        cursor = self.page_log_text.textCursor()
-        cursor.movePosition(QTextCursor.MoveOperation.End)
-        self.page_log_text.setTextCursor(cursor)
+        self.append_log(self.log_view, [message])
+
+    def flush_updates(self):
+        # Runs on the update timer: everything the worker queued since the last tick in one go.
+        worker = self.worker
+        if worker is None:
+            return
+        for queue, view in ((worker.log_lines, self.log_view), (worker.page_lines, self.page_log_view)):
+            lines = []
+            while queue:
+                lines.append(queue.popleft())
+            if lines:
+                self.append_log(view, lines)
+
+        self.file_progress.setMaximum(max(1, worker.files_total))
+        self.file_progress.setValue(worker.files_done)
+        self.page_progress.setMaximum(max(1, worker.pages_total))
+        self.page_progress.setValue(min(worker.pages_done, worker.pages_total))
+        if worker.started and worker.pages_processed:
+            elapsed = time.time() - worker.started
+            rate = worker.pages_processed / elapsed
+            remaining = max(0, worker.pages_total - worker.pages_done)
+            eta = time.strftime("%H:%M:%S", time.gmtime(remaining / rate)) if rate > 0 else "--:--:--"
+            self.rate_label.setText(f"{worker.current_file}  page {worker.page_current}/{worker.page_total}  |  "
+                                    f"{rate:.2f} pages/sec  |  ETA {eta}")
 
     def start_processing(self):
         if self.worker is not None and self.worker.isRunning():
@@ -458,30 +727,57 @@ class MainWindow(QMainWindow):
         source = self.source_dir.text()
         output = self.output_dir.text()
         
+        # Catch a language without traineddata now rather than as an error on every page.
+        try:
+            check_lang(self.lang_edit.text(), self.tess_edit.text() or None)
+        except ValueError as e:
+            QMessageBox.warning(self, "Language Not Installed", str(e))
+            return
+        
         self.worker = WorkerThread(
             source, output, 
             self.zoom_spin.value(), 
             self.psm_spin.value(), 
             self.lang_edit.text(),
-            self.tess_edit.text()
+            self.tess_edit.text(),
+            self.workers_spin.value(),
+            self.engine_combo.currentText(),
+            self.cache_check.isChecked(),
+            self.adaptive_zoom_steps(),
+            None if self.headers_combo.currentText() == "Keep" else self.headers_combo.currentText().lower(),
+            self.memory_spin.value() or None,
+            PREPROCESS_PRESETS[self.preprocess_combo.currentText()],
+            self.batch_spin.value(),
+            self.threads_spin.value() or None,
+            ORDER_CHOICES[self.order_combo.currentText()]
         )
         
-        self.worker.log_signal.connect(self.log)
-        self.worker.progress_signal.connect(self.log_page)
         self.worker.error_signal.connect(self.show_error)
         self.worker.finished_signal.connect(self.on_process_finished)
         
+        self.file_progress.setValue(0)
+        self.page_progress.setValue(0)
+        self.rate_label.setText("")
         self.worker.start()
+        self.update_timer.start()
         
         self.btn_start.setEnabled(False)
         self.btn_stop.setEnabled(True)
         self.status_label.setText("Processing...")
         self.status_label.setStyleSheet("color: white; font-weight: bold;")
 
+    def adaptive_zoom_steps(self):
+        # Zoom ladder for adaptive mode: cheap, middle and the configured (maximum) zoom.
+        if not self.adaptive_check.isChecked():
+            return None
+        zoom = self.zoom_spin.value()
+        low = min(2, zoom)
+        return sorted({low, (low + zoom) // 2, zoom})
+
     def stop_processing(self):
         if self.worker:
             self.worker.stop()
-            self.log("Stopping process... please wait.")
+            self.log("Stopping process...")
             self.status_label.setText("Stopping...")
 
     def show_error(self, message):
@@ -524,6 +820,9 @@ class MainWindow(QMainWindow):
         dialog.show()
 
     def on_process_finished(self):
+        # Last batch of queued updates before the worker is released.
+        self.update_timer.stop()
+        self.flush_updates()
         self.btn_start.setEnabled(True)
         self.btn_stop.setEnabled(False)
         self.status_label.setText("Ready")
@@ -531,6 +830,8 @@ class MainWindow(QMainWindow):
         self.worker = None
 
 if __name__ == "__main__":
+    # Needed for the page worker processes when running as a frozen exe
+    multiprocessing.freeze_support()
     app = QApplication(sys.argv)
     
     # Optional: Load a font if needed, but we rely on system fonts for now
@@ -0,0 +1,330 @@
+import math
+import fitz  # PyMuPDF
+import numpy as np
+
+# NumPy image analysis on cheap low-resolution renders, run before a page is sent to Tesseract.
+
+# Preview renders use 0.5x zoom (36 dpi): enough to see where ink is, a tiny fraction of the OCR render.
+PREVIEW_ZOOM = 0.5
+# Pixels darker than this count as ink.
+INK_LEVEL = 160
+# Scanner edges and gutter shadows live in the outer margin; ignore it when measuring ink.
+EDGE_MARGIN = 0.05
+# Below this share of ink pixels a page is considered blank. A centred three-character
+# chapter title on a B5 page measures about 0.0006, so it is still OCR'd.
+DEFAULT_BLANK_THRESHOLD = 0.0003
+
+def pixmap_array(pix):
+    # 2-D uint8 view of a grayscale pixmap's samples (no copy; drop the array before the pixmap).
+    return np.frombuffer(pix.samples_mv, dtype=np.uint8).reshape(pix.height, pix.stride)[:, :pix.width]
+
+def render_preview(page, zoom=PREVIEW_ZOOM, clip=None):
+    return page.get_pixmap(matrix=fitz.Matrix(zoom, zoom), colorspace=fitz.csGRAY, clip=clip)
+
+def ink_density(gray, margin=EDGE_MARGIN, level=INK_LEVEL):
+    h, w = gray.shape
+    dy, dx = int(h * margin), int(w * margin)
+    inner = gray[dy:h - dy, dx:w - dx]
+    if inner.size == 0:
+        return 0.0
+    return float(np.count_nonzero(inner < level)) / inner.size
+
+def _segments(profile, min_ink, max_gap):
+    # Runs of profile entries with ink, merging runs separated by fewer than max_gap empty entries.
+    # Returns [(start, end, ink)] with end exclusive.
+    segments = []
+    has_ink = np.flatnonzero(profile >= min_ink)
+    if has_ink.size == 0:
+        return segments
+    breaks = np.flatnonzero(np.diff(has_ink) > max_gap)
+    starts = np.concatenate(([has_ink[0]], has_ink[breaks + 1]))
+    ends = np.concatenate((has_ink[breaks], [has_ink[-1]])) + 1
+    for start, end in zip(starts, ends):
+        segments.append((int(start), int(end), int(profile[start:end].sum())))
+    return segments
+
+# Running heads and the nombre are small and sit at the edge of the page: a band separated from
+# the body is only a margin band if it is at most MAX_MARGIN_BAND of the page across and lies
+# within the outer MARGIN_ZONE. Anything else (a blank scene-break column, a gap between
+# paragraphs) is part of the body.
+MAX_MARGIN_BAND = 0.08
+MARGIN_ZONE = 0.15
+
+def _split_margins(segments, size):
+    # (first, last, margin bands) for segments along an axis of `size` pixels: the body runs
+    # from first to last and the margin bands are peeled off both ends. The band with the most
+    # ink is always body.
+    main = max(segments, key=lambda s: s[2])
+    max_band, zone = size * MAX_MARGIN_BAND, size * MARGIN_ZONE
+    lo, hi = 0, len(segments)
+    while segments[lo] is not main and segments[lo][1] - segments[lo][0] <= max_band and segments[lo][1] <= zone:
+        lo += 1
+    while segments[hi - 1] is not main and (segments[hi - 1][1] - segments[hi - 1][0] <= max_band
+                                            and segments[hi - 1][0] >= size - zone):
+        hi -= 1
+    return segments[lo][0], segments[hi - 1][1], segments[:lo] + segments[hi:]
+
+def find_body_region(gray, zoom=PREVIEW_ZOOM, margin=0.02, level=INK_LEVEL):
+    # Main text block of a page from projection profiles of a low-resolution render.
+    # Running heads and page numbers (nombre) sit in the margins, separated from the body by a
+    # clear gap: rows are split into bands at gaps of 2% of the page height, columns at gaps
+    # of 5% of the width (wider, because vertical text has blank space between its columns).
+    # Narrow bands at the page edges are margins; everything between them is the body.
+    # Returns (body, others) as fitz.Rects in page coordinates, or (None, []) when cropping
+    # would not remove anything worthwhile.
+    h, w = gray.shape
+    ink = gray < level
+    dy, dx = int(h * margin), int(w * margin)
+    # Scanner edges are not text; blank a thin outer strip before profiling
+    # (thinner than EDGE_MARGIN, running heads sit close to the edge).
+    ink[:dy, :] = False
+    ink[h - dy:, :] = False
+    ink[:, :dx] = False
+    ink[:, w - dx:] = False
+
+    rows = _segments(ink.sum(axis=1), 2, max(1, int(h * 0.02)))
+    if not rows:
+        return None, []
+    top, bottom, margin_rows = _split_margins(rows, h)
+    cols = _segments(ink[top:bottom].sum(axis=0), 2, max(1, int(w * 0.05)))
+    if not cols:
+        return None, []
+    left, right, margin_cols = _split_margins(cols, w)
+
+    # Pad so strokes at the block edge are not clipped.
+    pad = max(2, int(min(h, w) * 0.02))
+    x0, y0 = max(0, left - pad), max(0, top - pad)
+    x1, y1 = min(w, right + pad), min(h, bottom + pad)
+    if (x1 - x0) * (y1 - y0) > 0.97 * w * h:
+        return None, []
+
+    def to_page(a, b, c, d):
+        return fitz.Rect(a / zoom, b / zoom, c / zoom, d / zoom)
+
+    body = to_page(x0, y0, x1, y1)
+    others = [to_page(0, max(0, s - pad), w, min(h, e + pad)) for s, e, _ in margin_rows]
+    others += [to_page(max(0, s - pad), y0, min(w, e + pad), y1) for s, e, _ in margin_cols]
+    return body, others
+
+def column_tiles(gray, region, max_width, zoom=PREVIEW_ZOOM, overlap=0.2, pad=2, level=INK_LEVEL):
+    # Splits region (page coordinates, previewed as gray at zoom) into full-height column tiles
+    # at most max_width points wide and of about equal width, for rendering a large page piece by
+    # piece. Each cut goes in the emptiest pixel column of a band (`overlap` of a tile wide) around
+    # its even-split position, so it falls in the gap between two vertical text lines instead of
+    # through characters; tiles are padded by `pad` points into that gap.
+    # Returned right to left (vertical reading order).
+    ink = (gray < level).sum(axis=0)
+    width = gray.shape[1]
+    # The padding counts towards the width.
+    max_px = max(2, int((max_width - 2 * pad) * zoom))
+    half_band = max(1, int(max_px * overlap / 2))
+    # Even splits close enough together that moving each cut within its band keeps every tile
+    # under max_px.
+    count = math.ceil(width / max(1, max_px - 2 * half_band))
+    cuts = [0]
+    for k in range(1, count if width > max_px else 1):
+        start = cuts[-1]
+        target = k * width / count
+        lo = max(start + 1, int(target) - half_band)
+        hi = min(start + max_px, int(target) + half_band, width - 1)
+        columns = np.arange(lo, hi + 1)
+        # Least ink first, then nearest to the even split.
+        best = np.lexsort((np.abs(columns - target), ink[lo:hi + 1]))[0]
+        cuts.append(int(columns[best]))
+    cuts.append(width)
+    tiles = []
+    for a, b in zip(cuts, cuts[1:]):
+        tiles.append(fitz.Rect(max(region.x0, region.x0 + a / zoom - pad), region.y0,
+                               min(region.x1, region.x0 + b / zoom + pad), region.y1))
+    return tiles[::-1]
+
+# Preprocessing of the full-resolution render before OCR, selected by a comma-separated spec such
+# as "border,deskew,otsu,despeckle". Steps always run in this order, whatever order they are given
+# in: scanner borders are cut off first so they don't skew the threshold or the skew estimate.
+# Everything works on the pixmap's samples as NumPy arrays (box sums through integral images,
+# histograms through bincount), so a page costs a few tens of milliseconds at zoom 3.
+PREPROCESS_STEPS = ("border", "deskew", "otsu", "adaptive", "despeckle")
+
+def parse_preprocess(spec):
+    # "deskew,otsu" (or a list) -> ("deskew", "otsu") in pipeline order; ValueError for unknown steps.
+    if not spec:
+        return ()
+    steps = [s.strip().lower() for s in (spec.split(",") if isinstance(spec, str) else spec) if s and s.strip()]
+    steps = [s for s in steps if s != "none"]
+    unknown = [s for s in steps if s not in PREPROCESS_STEPS]
+    if unknown:
+        raise ValueError(f"unknown preprocessing step(s) {', '.join(unknown)} (choose from {', '.join(PREPROCESS_STEPS)})")
+    if "otsu" in steps and "adaptive" in steps:
+        raise ValueError("choose one of otsu and adaptive binarization")
+    return tuple(s for s in PREPROCESS_STEPS if s in steps)
+
+def otsu_threshold(gray):
+    # Grey level that best separates ink from paper (maximum between-class variance).
+    hist = np.bincount(gray.ravel(), minlength=256).astype(np.float64)
+    if np.count_nonzero(hist) < 2:
+        # A single tone (a blank tile or clip) has nothing to separate; the fixed ink level keeps
+        # a white image white.
+        return INK_LEVEL
+    levels = np.arange(256)
+    weight = np.cumsum(hist)
+    total = weight[-1]
+    mass = np.cumsum(hist * levels)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        mean_low = mass / weight
+        mean_high = (mass[-1] - mass) / (total - weight)
+        variance = weight * (total - weight) * (mean_low - mean_high) ** 2
+    return int(np.nanargmax(variance[:-1]))
+
+def _window_sum(values, radius):
+    # Sums over +-radius rows (clipped at the edges) from a running sum padded at both ends, and
+    # how many rows each window covered.
+    n = values.shape[0]
+    running = np.empty((n + 2 * radius + 1,) + values.shape[1:], dtype=np.int32)
+    running[:radius + 1] = 0
+    np.cumsum(values, axis=0, dtype=np.int32, out=running[radius + 1:n + radius + 1])
+    running[n + radius + 1:] = running[n + radius]
+    counts = np.minimum(np.arange(n) + radius + 1, n) - np.maximum(np.arange(n) - radius, 0)
+    return running[2 * radius + 1:] - running[:n], counts.astype(np.int32)
+
+def _box_sum(values, radius):
+    # Sum over the (2*radius+1)^2 window around every pixel and the window's pixel count; two
+    # 1-D running sums, so the cost doesn't depend on the window size.
+    rows, row_counts = _window_sum(values, radius)
+    sums, col_counts = _window_sum(rows.T, radius)
+    return sums.T, np.outer(row_counts, col_counts)
+
+def binarize_otsu(gray):
+    return (gray > otsu_threshold(gray)).astype(np.uint8) * np.uint8(255)
+
+def binarize_adaptive(gray, radius=16, offset=10, scale=4):
+    # Local mean threshold: a pixel is ink when it is `offset` levels darker than its
+    # neighbourhood, so shading and yellowed paper don't turn into black areas. The mean varies
+    # slowly, so it is computed on scale x scale blocks and spread back over their pixels.
+    h, w = gray.shape
+    padded = np.pad(gray, ((0, -h % scale), (0, -w % scale)), mode="edge")
+    blocks = padded.reshape(padded.shape[0] // scale, scale, padded.shape[1] // scale, scale).sum(axis=(1, 3), dtype=np.int32)
+    sums, counts = _box_sum(blocks, max(1, radius // scale))
+    mean = (sums / (counts * scale * scale)).astype(np.float32)
+    mean = np.repeat(np.repeat(mean, scale, axis=0), scale, axis=1)[:h, :w]
+    return (gray > mean - offset).astype(np.uint8) * np.uint8(255)
+
+def despeckle(binary, size=2):
+    # Removes ink specks up to size x size pixels: ink whose (2*size+1)^2 neighbourhood holds no
+    # more ink than the speck itself would. Strokes of real characters have far more.
+    # The window is small, so it is summed from shifted slices (in uint8: at most 25 ink pixels
+    # at size 2).
+    h, w = binary.shape
+    k = 2 * size + 1
+    ink = np.pad((binary < 128).astype(np.uint8), size)
+    rows = ink[0:h].copy()
+    for i in range(1, k):
+        rows += ink[i:i + h]
+    sums = rows[:, 0:w].copy()
+    for j in range(1, k):
+        sums += rows[:, j:j + w]
+    out = binary.copy()
+    out[(binary < 128) & (sums <= size * size)] = 255
+    return out
+
+def border_crop(gray, level=INK_LEVEL, dark=0.5, limit=0.1):
+    # (top, bottom, left, right) pixel bounds inside the dark bands scanners leave along the
+    # page edges: rows / columns from the edge inwards that are mostly ink, up to `limit` of the
+    # page on each side.
+    h, w = gray.shape
+    ink = gray < level
+    rows = ink.mean(axis=1) > dark
+    cols = ink.mean(axis=0) > dark
+
+    def run(flags, cap):
+        # Length of the leading run of True, capped.
+        stop = np.flatnonzero(~flags[:cap])
+        return int(stop[0]) if stop.size else cap
+
+    top, bottom = run(rows, int(h * limit)), h - run(rows[::-1], int(h * limit))
+    left, right = run(cols, int(w * limit)), w - run(cols[::-1], int(w * limit))
+    return top, bottom, left, right
+
+def _sharpest(xs, ys, angles):
+    # (score, angle, vertical) of the candidate angle whose projection profile is sharpest.
+    best = (-1.0, 0.0, True)
+    for angle in angles:
+        t = math.tan(math.radians(angle))
+        for vertical, across, along in ((True, xs, ys), (False, ys, xs)):
+            bins = np.round(across - along * t).astype(np.int64)
+            profile = np.bincount(bins - bins.min())
+            score = float(np.dot(profile, profile))
+            if score > best[0]:
+                best = (score, float(angle), vertical)
+    return best
+
+def skew_angle(gray, max_angle=2.0, level=INK_LEVEL):
+    # (angle in degrees, vertical) of the text lines. Ink positions are projected across the
+    # lines at each candidate angle and the angle with the sharpest profile (largest sum of
+    # squares) wins; both orientations are tried, so horizontal text works too. A coarse pass
+    # on every 4th pixel finds the neighbourhood, a finer one on every 2nd pixel the angle.
+    ys, xs = np.nonzero(gray[::4, ::4] < level)
+    if xs.size < 100:
+        return 0.0, True
+    _, coarse, _ = _sharpest(xs, ys, np.arange(-max_angle, max_angle + 0.125, 0.25))
+    ys, xs = np.nonzero(gray[::2, ::2] < level)
+    _, angle, vertical = _sharpest(xs, ys, np.arange(coarse - 0.25, coarse + 0.26, 0.05))
+    return round(angle, 2) + 0.0, vertical
+
+def _shear(image, t, vertical):
+    # Vertical text: row y moves left by y*t, which straightens columns leaning by atan(t);
+    # horizontal text: column x moves up by x*t. Uncovered pixels become paper (white).
+    # Rows (columns) with the same shift are moved as one slice.
+    src = image if vertical else image.T
+    out = np.full_like(src, 255)
+    n, width = src.shape
+    shifts = np.round(np.arange(n) * t).astype(np.int64)
+    starts = np.flatnonzero(np.diff(shifts, prepend=shifts[0] - 1))
+    for a, b in zip(starts, list(starts[1:]) + [n]):
+        s = int(shifts[a])
+        if s >= 0:
+            out[a:b, :width - s] = src[a:b, s:]
+        else:
+            out[a:b, -s:] = src[a:b, :width + s]
+    return out if vertical else out.T
+
+def preprocess(pix, steps):
+    # Runs the steps on a grayscale pixmap. Returns (pixmap, to_source), where to_source maps
+    # (x, y) in the returned image back to the input render's pixels, for word boxes.
+    if not steps:
+        return pix, None
+    gray = pixmap_array(pix)
+    dx = dy = 0
+    t, vertical = 0.0, True
+    if "border" in steps:
+        top, bottom, left, right = border_crop(gray)
+        gray = gray[top:bottom, left:right]
+        dx, dy = left, top
+    if "deskew" in steps:
+        angle, vertical = skew_angle(gray)
+        if abs(angle) >= 0.1:
+            t = math.tan(math.radians(angle))
+            gray = _shear(gray, t, vertical)
+    if "otsu" in steps:
+        gray = binarize_otsu(gray)
+    elif "adaptive" in steps:
+        gray = binarize_adaptive(gray)
+    if "despeckle" in steps:
+        # Speck removal needs a black-and-white image; without a binarization step the specks
+        # are found on an Otsu mask and painted out of the grey image.
+        if "otsu" in steps or "adaptive" in steps:
+            gray = despeckle(gray)
+        else:
+            mask = despeckle(binarize_otsu(gray)) == 255
+            gray = np.where(mask & (gray <= otsu_threshold(gray)), 255, gray).astype(np.uint8)
+    h, w = gray.shape
+    out = fitz.Pixmap(fitz.csGRAY, w, h, np.ascontiguousarray(gray).tobytes(), False)
+    out.set_dpi(pix.xres, pix.yres)
+    del gray
+
+    def to_source(x, y):
+        if vertical:
+            x += round(y * t)
+        else:
+            y += round(x * t)
+        return x + dx, y + dy
+    return out, to_source
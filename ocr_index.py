@@ -0,0 +1,274 @@
+import sys
+import os
+import re
+import json
+import time
+import sqlite3
+import argparse
+import unicodedata
+
+# Full-text search over OCR output, with page numbers.
+#   python ocr_index.py add ~/ocr -r                  # index (or re-index changed) outputs
+#   python ocr_index.py search "吾輩は猫"              # ranked hits: document, page, snippet
+# Japanese has no spaces to split words on, so pages go into an SQLite FTS5 index with the
+# trigram tokenizer: every 3-character sequence is a term, and any phrase of 3 or more
+# characters is found through the index, ranked by BM25. Shorter search terms (2-character
+# words are common in Japanese) can't use trigrams and fall back to a LIKE scan over the page
+# texts, which is slower on a large library.
+# ocr_batch / ocr_watch / ocr_service (--index) and the GUI add each document as it finishes.
+# Outputs are re-indexed only when their size or mtime changed.
+
+DEFAULT_INDEX_PATH = "ocr_index.sqlite"
+
+# Shortest term the trigram index can look up.
+MIN_TRIGRAM = 3
+
+_PAGE_MARKER = re.compile(r"^--- Page (\d+)(?: \(.*\))? ---$")
+
+def normalize(text):
+    # Full-width ASCII to half-width (NFKC), and line breaks removed: vertical text is broken
+    # into short columns, and a phrase must match across them. Latin words on either side of a
+    # break keep a space between them.
+    text = unicodedata.normalize("NFKC", text).replace("\f", "")
+    parts = [line.strip() for line in text.splitlines() if line.strip()]
+    joined = ""
+    for part in parts:
+        if joined and joined[-1].isascii() and joined[-1].isalnum() and part[0].isascii() and part[0].isalnum():
+            joined += " "
+        joined += part
+    return joined
+
+def read_text_output(path):
+    # [(page number, text)] from a *_output.txt file ("--- Page N ---" blocks; "[header]" lines
+    # are running heads, not body text).
+    pages = []
+    current = None
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            match = _PAGE_MARKER.match(line.rstrip("\n"))
+            if match:
+                current = [int(match.group(1)), []]
+                pages.append(current)
+            elif current is not None and not line.startswith("[header] "):
+                current[1].append(line)
+    return [(number, "".join(lines)) for number, lines in pages]
+
+def read_jsonl_output(path):
+    pages = []
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            if line.strip():
+                record = json.loads(line)
+                pages.append((record["page"], record["text"]))
+    return pages
+
+def read_output(path):
+    return read_jsonl_output(path) if path.endswith(".jsonl") else read_text_output(path)
+
+def find_outputs(paths, recursive=False):
+    # *_pages.jsonl and *_output.txt files; where a document has both, the JSONL one.
+    found = {}
+    for path in paths:
+        if os.path.isfile(path):
+            files = [path]
+        else:
+            files = []
+            for root, dirs, names in os.walk(path):
+                dirs.sort()
+                files += [os.path.join(root, name) for name in sorted(names)]
+                if not recursive:
+                    break
+        for file_path in files:
+            for suffix in ("_pages.jsonl", "_output.txt"):
+                if file_path.endswith(suffix):
+                    base = os.path.abspath(file_path[:-len(suffix)])
+                    if suffix == "_pages.jsonl" or base not in found:
+                        found[base] = os.path.abspath(file_path)
+    return list(found.values())
+
+def _snippet(text, term, width=30):
+    at = text.find(term)
+    if at < 0:
+        return text[:width * 2]
+    start = max(0, at - width)
+    end = at + len(term) + width
+    return (("…" if start else "") + text[start:at] + "[" + term + "]" + text[at + len(term):end]
+            + ("…" if end < len(text) else ""))
+
+class SearchIndex:
+    def __init__(self, path=DEFAULT_INDEX_PATH):
+        self.path = path
+        self.conn = sqlite3.connect(path, timeout=30)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        # Page texts live in a plain table (read by the LIKE fallback and for snippets); the FTS5
+        # table indexes them without a second copy (external content).
+        self.conn.executescript("""
+            CREATE TABLE IF NOT EXISTS documents (
+                id INTEGER PRIMARY KEY,
+                output TEXT UNIQUE NOT NULL,
+                pdf TEXT,
+                pages INTEGER,
+                size INTEGER,
+                mtime REAL,
+                indexed REAL
+            );
+            CREATE TABLE IF NOT EXISTS pages (
+                id INTEGER PRIMARY KEY,
+                doc_id INTEGER NOT NULL,
+                page INTEGER NOT NULL,
+                text TEXT NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS pages_doc ON pages (doc_id);
+            CREATE VIRTUAL TABLE IF NOT EXISTS pages_fts USING fts5(
+                text, content='pages', content_rowid='id', tokenize='trigram'
+            );
+        """)
+        self.conn.commit()
+
+    def close(self):
+        self.conn.close()
+
+    def _delete(self, doc_id):
+        for row_id, text in self.conn.execute("SELECT id, text FROM pages WHERE doc_id = ?", (doc_id,)).fetchall():
+            self.conn.execute("INSERT INTO pages_fts (pages_fts, rowid, text) VALUES ('delete', ?, ?)", (row_id, text))
+        self.conn.execute("DELETE FROM pages WHERE doc_id = ?", (doc_id,))
+
+    def add_pages(self, output, pages, pdf=None, size=None, mtime=None):
+        # Replaces everything indexed for this output with pages [(page number, text)].
+        output = os.path.abspath(output)
+        with self.conn:
+            row = self.conn.execute("SELECT id FROM documents WHERE output = ?", (output,)).fetchone()
+            if row:
+                doc_id = row[0]
+                self._delete(doc_id)
+                self.conn.execute("UPDATE documents SET pdf = COALESCE(?, pdf), pages = ?, size = ?, mtime = ?, "
+                                  "indexed = ? WHERE id = ?", (pdf, len(pages), size, mtime, time.time(), doc_id))
+            else:
+                doc_id = self.conn.execute(
+                    "INSERT INTO documents (output, pdf, pages, size, mtime, indexed) VALUES (?, ?, ?, ?, ?, ?)",
+                    (output, pdf, len(pages), size, mtime, time.time())).lastrowid
+            for number, text in pages:
+                text = normalize(text)
+                if not text:
+                    continue
+                row_id = self.conn.execute("INSERT INTO pages (doc_id, page, text) VALUES (?, ?, ?)",
+                                           (doc_id, number, text)).lastrowid
+                self.conn.execute("INSERT INTO pages_fts (rowid, text) VALUES (?, ?)", (row_id, text))
+        return len(pages)
+
+    def add_output(self, output_path, pdf=None, force=False):
+        # Pages indexed, or None when the file hasn't changed since it was last indexed.
+        output_path = os.path.abspath(output_path)
+        st = os.stat(output_path)
+        if not force:
+            row = self.conn.execute("SELECT size, mtime FROM documents WHERE output = ?", (output_path,)).fetchone()
+            if row and row[0] == st.st_size and row[1] == st.st_mtime:
+                return None
+        return self.add_pages(output_path, read_output(output_path), pdf, st.st_size, st.st_mtime)
+
+    def add_stats(self, pdf_path, stats):
+        # Indexes a document ocr_pdf just finished, from its JSONL or text output.
+        outputs = stats.get("outputs") or {}
+        output = outputs.get("jsonl") or outputs.get("text")
+        if not output:
+            print(f"Not indexing {pdf_path}: no text or jsonl output.")
+            return None
+        return self.add_output(output, pdf=os.path.abspath(pdf_path), force=True)
+
+    def prune(self):
+        # Drops documents whose output file is gone; returns how many.
+        gone = [(doc_id, output) for doc_id, output in self.conn.execute("SELECT id, output FROM documents")
+                if not os.path.exists(output)]
+        with self.conn:
+            for doc_id, _ in gone:
+                self._delete(doc_id)
+                self.conn.execute("DELETE FROM documents WHERE id = ?", (doc_id,))
+        return len(gone)
+
+    def search(self, query, limit=20):
+        # Hits for every whitespace-separated term (all must occur on the page), best first:
+        # [{"pdf", "output", "page", "snippet", "score"}]. Terms of 3+ characters use the index.
+        terms = normalize(query).split()
+        if not terms:
+            return []
+        long_terms = [t for t in terms if len(t) >= MIN_TRIGRAM]
+        short_terms = [t for t in terms if len(t) < MIN_TRIGRAM]
+        likes = "".join(" AND p.text LIKE ? ESCAPE '\\'" for _ in short_terms)
+        like_args = ["%" + t.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_") + "%" for t in short_terms]
+        if long_terms:
+            match = " AND ".join('"' + t.replace('"', '""') + '"' for t in long_terms)
+            rows = self.conn.execute(
+                "SELECT d.pdf, d.output, p.page, snippet(pages_fts, 0, '[', ']', '…', 16), pages_fts.rank "
+                "FROM pages_fts JOIN pages p ON p.id = pages_fts.rowid JOIN documents d ON d.id = p.doc_id "
+                f"WHERE pages_fts MATCH ?{likes} ORDER BY pages_fts.rank LIMIT ?",
+                [match] + like_args + [limit]).fetchall()
+        else:
+            # No trigram to look up: scan the page texts, in library order.
+            rows = [(pdf, output, page, _snippet(text, short_terms[0]), None) for pdf, output, page, text in
+                    self.conn.execute(
+                        "SELECT d.pdf, d.output, p.page, p.text FROM pages p JOIN documents d ON d.id = p.doc_id "
+                        f"WHERE 1{likes} ORDER BY p.doc_id, p.page LIMIT ?", like_args + [limit])]
+        # BM25 ranks are negative, lower is better; reported as a positive score.
+        return [{"pdf": pdf, "output": output, "page": page, "snippet": snippet,
+                 "score": None if rank is None else round(-rank, 4)} for pdf, output, page, snippet, rank in rows]
+
+def _name(hit):
+    # The PDF's file name, or the output's without its suffix when the PDF isn't known.
+    if hit["pdf"]:
+        return os.path.basename(hit["pdf"])
+    name = os.path.basename(hit["output"])
+    for suffix in ("_pages.jsonl", "_output.txt"):
+        if name.endswith(suffix):
+            return name[:-len(suffix)]
+    return name
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Full-text search over OCR output.")
+    parser.add_argument("--index", default=DEFAULT_INDEX_PATH, help="index database")
+    commands = parser.add_subparsers(dest="command", required=True)
+    add = commands.add_parser("add", help="index *_pages.jsonl / *_output.txt files (changed ones only)")
+    add.add_argument("paths", nargs="+", help="output files or directories")
+    add.add_argument("-r", "--recursive", action="store_true", help="walk directories recursively")
+    add.add_argument("--force", action="store_true", help="re-index unchanged files too")
+    search = commands.add_parser("search", help="search the index")
+    search.add_argument("query", help="text to find; separate terms with spaces (all must be on the page)")
+    search.add_argument("-n", "--limit", type=int, default=20)
+    search.add_argument("--json", action="store_true", help="print the hits as JSON")
+    commands.add_parser("prune", help="drop documents whose output files are gone")
+    args = parser.parse_args(argv)
+
+    index = SearchIndex(args.index)
+    try:
+        if args.command == "add":
+            outputs = find_outputs(args.paths, args.recursive)
+            indexed = pages = 0
+            for output in outputs:
+                try:
+                    count = index.add_output(output, force=args.force)
+                except (OSError, ValueError, KeyError) as e:
+                    print(f"Cannot index {output}: {e}")
+                    continue
+                if count is not None:
+                    indexed += 1
+                    pages += count
+            print(f"Indexed {indexed} of {len(outputs)} outputs ({pages} pages); "
+                  f"{len(outputs) - indexed} unchanged or failed.")
+        elif args.command == "search":
+            start = time.perf_counter()
+            hits = index.search(args.query, args.limit)
+            elapsed = (time.perf_counter() - start) * 1000
+            if args.json:
+                print(json.dumps(hits, ensure_ascii=False, indent=2))
+            else:
+                for hit in hits:
+                    print(f"{_name(hit)}  p.{hit['page']}  {hit['snippet']}")
+                print(f"{len(hits)} hits in {elapsed:.1f} ms")
+        elif args.command == "prune":
+            print(f"Removed {index.prune()} documents.")
+    finally:
+        index.close()
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,75 @@
+import os
+import json
+import hashlib
+
+# Per-document checkpoint journal. Every finished page is appended (and flushed) as one JSON line
+# next to the output file, so a STOP or a crash at page 380 of 400 keeps the 379 pages already
+# done; the next run continues from the missing pages and the journal is removed once the
+# final *_output.txt has been assembled.
+# The first line identifies the document and settings; a journal written for a different
+# version of the PDF or different OCR settings is ignored and started over.
+
+# Bytes hashed at each end of the PDF for the header: a re-scan with the same name, size and page
+# count differs in its image data, and a PDF's trailer (with its /ID) is at the end.
+SAMPLE_BYTES = 64 * 1024
+
+def sample_hash(path, sample=SAMPLE_BYTES):
+    # SHA-256 of the first and last `sample` bytes; cheap even for a large book.
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        h.update(f.read(sample))
+        size = os.fstat(f.fileno()).st_size
+        if size > sample:
+            f.seek(max(sample, size - sample))
+            h.update(f.read())
+    return h.hexdigest()[:16]
+
+class PageJournal:
+    def __init__(self, path, header):
+        self.path = path
+        self.header = header
+        self.file = None
+
+    def load(self):
+        # Returns {page index: result} for the pages recorded by a previous, interrupted run.
+        results = {}
+        if not os.path.exists(self.path):
+            return results
+        with open(self.path, "r", encoding="utf-8") as f:
+            lines = f.read().splitlines()
+        try:
+            if not lines or json.loads(lines[0]) != self.header:
+                return results
+        except ValueError:
+            return results
+        for line in lines[1:]:
+            try:
+                result = json.loads(line)
+            except ValueError:
+                # The last line may be cut short if the process died while writing it.
+                continue
+            results[result["page"]] = result
+        return results
+
+    def open(self, resume):
+        # resume=False starts a new journal (discarding a stale or mismatched one).
+        self.file = open(self.path, "a" if resume else "w", encoding="utf-8")
+        if not resume:
+            self._write(self.header)
+
+    def append(self, result):
+        self._write(result)
+
+    def _write(self, record):
+        self.file.write(json.dumps(record, ensure_ascii=False) + "\n")
+        self.file.flush()
+
+    def close(self):
+        if self.file:
+            self.file.close()
+            self.file = None
+
+    def remove(self):
+        self.close()
+        if os.path.exists(self.path):
+            os.remove(self.path)
@@ -0,0 +1,129 @@
+import os
+import json
+import time
+import sqlite3
+import hashlib
+
+# Processing manifest (replaces the flat processed_log.txt).
+# A document is identified by the SHA-256 of its content plus a hash of the settings that affect
+# the output, so a renamed file is still recognised, two folders with the same file name don't
+# collide, and a changed PDF or changed settings is processed again.
+# Hashing a whole PDF is not free, so hashes are remembered per (path, size, mtime) and only
+# recomputed when the file changes. SQLite in WAL mode with a busy timeout makes the manifest
+# safe to share between the GUI, the CLI and concurrent workers.
+
+DONE = "done"
+RUNNING = "running"
+FAILED = "failed"
+
+def settings_hash(settings):
+    return hashlib.sha256(json.dumps(settings, sort_keys=True).encode()).hexdigest()[:16]
+
+def file_hash(path):
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+class Manifest:
+    def __init__(self, path):
+        self.path = path
+        self.conn = sqlite3.connect(path, timeout=30)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript("""
+            CREATE TABLE IF NOT EXISTS documents (
+                content_hash TEXT NOT NULL,
+                settings_hash TEXT NOT NULL,
+                path TEXT NOT NULL,
+                status TEXT NOT NULL,
+                started REAL,
+                finished REAL,
+                seconds REAL,
+                pages INTEGER,
+                output TEXT,
+                error TEXT,
+                PRIMARY KEY (content_hash, settings_hash)
+            );
+            CREATE TABLE IF NOT EXISTS file_hashes (
+                path TEXT PRIMARY KEY,
+                size INTEGER NOT NULL,
+                mtime REAL NOT NULL,
+                content_hash TEXT NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS migrations (
+                name TEXT PRIMARY KEY,
+                finished REAL NOT NULL
+            );
+        """)
+        self.conn.commit()
+
+    def content_hash(self, pdf_path):
+        path = os.path.abspath(pdf_path)
+        st = os.stat(path)
+        row = self.conn.execute("SELECT size, mtime, content_hash FROM file_hashes WHERE path = ?", (path,)).fetchone()
+        if row and row[0] == st.st_size and row[1] == st.st_mtime:
+            return row[2]
+        digest = file_hash(path)
+        self.conn.execute("INSERT OR REPLACE INTO file_hashes (path, size, mtime, content_hash) VALUES (?, ?, ?, ?)",
+                          (path, st.st_size, st.st_mtime, digest))
+        self.conn.commit()
+        return digest
+
+    def status(self, pdf_path, settings):
+        row = self.conn.execute("SELECT status FROM documents WHERE content_hash = ? AND settings_hash = ?",
+                                (self.content_hash(pdf_path), settings_hash(settings))).fetchone()
+        return row[0] if row else None
+
+    def is_done(self, pdf_path, settings):
+        return self.status(pdf_path, settings) == DONE
+
+    def _upsert(self, pdf_path, settings, **fields):
+        key = (self.content_hash(pdf_path), settings_hash(settings))
+        fields["path"] = os.path.abspath(pdf_path)
+        self.conn.execute("INSERT OR IGNORE INTO documents (content_hash, settings_hash, path, status) VALUES (?, ?, ?, ?)",
+                          key + (fields["path"], fields.get("status", RUNNING)))
+        assignments = ", ".join(f"{name} = ?" for name in fields)
+        self.conn.execute(f"UPDATE documents SET {assignments} WHERE content_hash = ? AND settings_hash = ?",
+                          tuple(fields.values()) + key)
+        self.conn.commit()
+
+    def start(self, pdf_path, settings):
+        self._upsert(pdf_path, settings, status=RUNNING, started=time.time(), finished=None, error=None)
+
+    def finish(self, pdf_path, settings, pages=None, output=None, seconds=None):
+        self._upsert(pdf_path, settings, status=DONE, finished=time.time(), pages=pages, output=output, seconds=seconds)
+
+    def fail(self, pdf_path, settings, error, seconds=None):
+        self._upsert(pdf_path, settings, status=FAILED, finished=time.time(), error=str(error), seconds=seconds)
+
+    def import_legacy_log(self, log_path, source_dir, settings, legacy_settings):
+        # One-time migration, so upgrading doesn't re-OCR the whole library: the PDFs in
+        # source_dir (the one folder the old processed_log.txt covered; it lists bare names) are
+        # recorded as done. Only when this run's settings are the ones the log was written with
+        # (legacy_settings), and not for files changed since the log was last written. Once an
+        # import has run, the log is never read again.
+        name = "legacy_log:" + os.path.abspath(log_path)
+        if not os.path.exists(log_path) or not os.path.isdir(source_dir):
+            return 0
+        if settings_hash(settings) != settings_hash(legacy_settings):
+            return 0
+        if self.conn.execute("SELECT 1 FROM migrations WHERE name = ?", (name,)).fetchone():
+            return 0
+        log_mtime = os.path.getmtime(log_path)
+        with open(log_path, "r", encoding="utf-8") as f:
+            names = set(f.read().splitlines())
+        imported = 0
+        for filename in sorted(os.listdir(source_dir)):
+            pdf_path = os.path.join(source_dir, filename)
+            if (filename in names and os.path.isfile(pdf_path) and os.path.getmtime(pdf_path) <= log_mtime
+                    and self.status(pdf_path, settings) is None):
+                self._upsert(pdf_path, settings, status=DONE, finished=time.time())
+                imported += 1
+        self.conn.execute("INSERT INTO migrations (name, finished) VALUES (?, ?)", (name, time.time()))
+        self.conn.commit()
+        return imported
+
+    def close(self):
+        self.conn.close()
@@ -0,0 +1,101 @@
+import os
+import json
+import time
+from contextlib import contextmanager
+
+# Instrumentation for ocr_pdf. Pages carry a {stage: seconds} dict (text_layer, preview, render, preprocess,
+# cache, ocr, headers), and ocr_pdf reports events to an optional event_callback:
+#   {"event": "document_start", "pdf", "pages", "time"}
+#   {"event": "page", "pdf", "page", "source", "seconds", "timings"}
+#   {"event": "document_end", "pdf", "pages", "seconds", "timings"}   (timings summed + journal/write)
+# The sinks below turn those events into a JSONL log or a Prometheus text file.
+
+@contextmanager
+def stage_timer(timings, stage):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        timings[stage] = timings.get(stage, 0.0) + time.perf_counter() - start
+
+def add_timings(total, timings):
+    for stage, seconds in timings.items():
+        total[stage] = total.get(stage, 0.0) + seconds
+
+def fan_out(*callbacks):
+    # One event_callback that feeds several sinks.
+    callbacks = [cb for cb in callbacks if cb]
+
+    def callback(event):
+        for cb in callbacks:
+            cb(event)
+    return callback
+
+class JsonlEventWriter:
+    # Appends every event as one JSON line.
+    def __init__(self, path):
+        self.file = open(path, "a", encoding="utf-8")
+
+    def __call__(self, event):
+        self.file.write(json.dumps(event, ensure_ascii=False) + "\n")
+        self.file.flush()
+
+    def close(self):
+        self.file.close()
+
+class PrometheusMetrics:
+    # Aggregates events into counters and writes them in the Prometheus text exposition format,
+    # e.g. for node_exporter's textfile collector.
+    def __init__(self):
+        self.documents = 0
+        self.document_seconds = 0.0
+        self.pages = {}
+        self.stage_seconds = {}
+        self.stage_pages = {}
+
+    def __call__(self, event):
+        if event["event"] == "page":
+            self.pages[event["source"]] = self.pages.get(event["source"], 0) + 1
+            for stage, seconds in event["timings"].items():
+                self.stage_seconds[stage] = self.stage_seconds.get(stage, 0.0) + seconds
+                self.stage_pages[stage] = self.stage_pages.get(stage, 0) + 1
+        elif event["event"] == "document_end":
+            self.documents += 1
+            self.document_seconds += event["seconds"]
+            # Document-level stages (journal, write) are not part of any page event.
+            for stage in ("journal", "write"):
+                if stage in event["timings"]:
+                    self.stage_seconds[stage] = self.stage_seconds.get(stage, 0.0) + event["timings"][stage]
+
+    def render(self):
+        lines = [
+            "# HELP glassocr_documents_total Documents finished.",
+            "# TYPE glassocr_documents_total counter",
+            f"glassocr_documents_total {self.documents}",
+            "# HELP glassocr_document_seconds_total Wall time spent in ocr_pdf.",
+            "# TYPE glassocr_document_seconds_total counter",
+            f"glassocr_document_seconds_total {self.document_seconds:.6f}",
+            "# HELP glassocr_pages_total Pages finished, by where their text came from.",
+            "# TYPE glassocr_pages_total counter",
+        ]
+        lines += [f'glassocr_pages_total{{source="{source}"}} {count}' for source, count in sorted(self.pages.items())]
+        lines += [
+            "# HELP glassocr_stage_seconds_total Time spent per processing stage.",
+            "# TYPE glassocr_stage_seconds_total counter",
+        ]
+        lines += [f'glassocr_stage_seconds_total{{stage="{stage}"}} {seconds:.6f}'
+                  for stage, seconds in sorted(self.stage_seconds.items())]
+        lines += [
+            "# HELP glassocr_stage_pages_total Pages that went through each stage.",
+            "# TYPE glassocr_stage_pages_total counter",
+        ]
+        lines += [f'glassocr_stage_pages_total{{stage="{stage}"}} {count}'
+                  for stage, count in sorted(self.stage_pages.items())]
+        return "\n".join(lines) + "\n"
+
+    def write(self, path):
+        # Write-then-rename so a scraper never reads a half-written file.
+        temp_path = path + ".tmp"
+        with open(temp_path, "w", encoding="utf-8") as f:
+            f.write(self.render())
+        os.replace(temp_path, path)
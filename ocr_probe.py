@@ -0,0 +1,135 @@
+import os
+import sys
+import json
+import string
+import shutil
+import subprocess
+from packaging.version import parse as parse_version
+
+# Tesseract discovery, done lazily on first use and shared by ocr_pdf, the CLI and the GUI.
+# Asking tesseract for its version and installed languages spawns processes, so the answers are
+# kept in ~/.cache/glassocr/tesseract_probe.json keyed by the binary's path, size and mtime (and
+# the tessdata folder's mtime, so added languages show up). Later starts and pool workers read
+# them back instead of running tesseract again.
+
+PROBE_CACHE_PATH = os.path.join(os.path.expanduser("~"), ".cache", "glassocr", "tesseract_probe.json")
+
+def candidate_paths():
+    # Usual Windows install locations (UB Mannheim installer, per-machine and per-user).
+    paths = [
+        r"C:\Program Files\Tesseract-OCR\tesseract.exe",
+        r"C:\Program Files (x86)\Tesseract-OCR\tesseract.exe",
+    ]
+    if os.getenv("LOCALAPPDATA"):
+        paths.append(os.path.join(os.getenv("LOCALAPPDATA"), r"Programs\Tesseract-OCR\tesseract.exe"))
+    return paths
+
+_found = {}
+
+def find_tesseract(configured=None):
+    # Path of the tesseract executable: the configured one if it exists, else PATH, else the
+    # usual install locations. None when there is none.
+    if configured in _found:
+        return _found[configured]
+    path = None
+    if configured and os.path.isfile(configured):
+        path = configured
+    elif configured and shutil.which(configured):
+        path = shutil.which(configured)
+    else:
+        path = shutil.which("tesseract")
+        if path is None:
+            path = next((p for p in candidate_paths() if os.path.isfile(p)), None)
+    _found[configured] = path
+    return path
+
+def _cache_key(path):
+    st = os.stat(path)
+    key = f"{os.path.realpath(path)}|{st.st_size}|{st.st_mtime}"
+    tessdata = os.path.join(os.path.dirname(os.path.realpath(path)), "tessdata")
+    if os.path.isdir(tessdata):
+        key += f"|{os.stat(tessdata).st_mtime}"
+    return key
+
+def _load_cache():
+    try:
+        with open(PROBE_CACHE_PATH, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+def _save_cache(cache):
+    try:
+        os.makedirs(os.path.dirname(PROBE_CACHE_PATH), exist_ok=True)
+        temp_path = f"{PROBE_CACHE_PATH}.{os.getpid()}.tmp"
+        with open(temp_path, "w", encoding="utf-8") as f:
+            json.dump(cache, f, ensure_ascii=False, indent=1)
+        os.replace(temp_path, PROBE_CACHE_PATH)
+    except OSError as e:
+        print(f"Could not save the Tesseract probe cache: {e}")
+
+def _run(args):
+    kwargs = {}
+    if sys.platform == "win32":
+        # No console window flashing up from the GUI.
+        kwargs["creationflags"] = subprocess.CREATE_NO_WINDOW
+    result = subprocess.run(args, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, stdin=subprocess.DEVNULL,
+                            timeout=30, **kwargs)
+    return result.stdout.decode("utf-8", "replace")
+
+def _parse_version(output):
+    # Same normalisation as pytesseract.get_tesseract_version(), so page cache keys don't change.
+    raw, *_ = output.lstrip(string.printable[10:]).partition(" ")
+    raw, *_ = raw.partition("-")
+    return str(parse_version(raw))
+
+def _parse_langs(output):
+    # --list-langs prints a heading line, then one language per line.
+    return sorted(line.strip() for line in output.splitlines()[1:] if line.strip() and " " not in line.strip())
+
+_probed = {}
+
+def probe(path):
+    # {"path", "version", "langs"} for the tesseract at path, or None if it can't be run.
+    if not path:
+        return None
+    try:
+        key = _cache_key(path)
+    except OSError:
+        return None
+    if key in _probed:
+        return _probed[key]
+    cache = _load_cache()
+    info = cache.get(key)
+    if info is None:
+        try:
+            info = {
+                "path": path,
+                "version": _parse_version(_run([path, "--version"])),
+                "langs": _parse_langs(_run([path, "--list-langs"])),
+            }
+        except (OSError, subprocess.SubprocessError, ValueError) as e:
+            print(f"Could not run {path}: {e}")
+            return None
+        # Entries for other binaries (or older versions of this one) are dropped with their path.
+        cache = {k: v for k, v in cache.items() if v.get("path") != path}
+        cache[key] = info
+        _save_cache(cache)
+    _probed[key] = info
+    return info
+
+def missing_langs(lang, info):
+    # The parts of a "jpn+jpn_vert" style language spec that the probed tesseract doesn't have.
+    return [part for part in lang.split("+") if part and part not in info["langs"]]
+
+def check_lang(lang, tesseract_cmd=None):
+    # Returns the probe info (None when there is no tesseract to ask); raises ValueError when a
+    # requested language is not installed.
+    info = probe(find_tesseract(tesseract_cmd))
+    if info is None:
+        return None
+    missing = missing_langs(lang, info)
+    if missing:
+        raise ValueError(f"Tesseract {info['version']} at {info['path']} has no traineddata for "
+                         f"{', '.join(missing)}. Installed: {', '.join(info['langs']) or 'none'}")
+    return info
@@ -0,0 +1,272 @@
+import sys
+import os
+import time
+import signal
+import fnmatch
+from collections import OrderedDict, deque
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+from concurrent.futures.process import BrokenProcessPool
+import fitz  # PyMuPDF
+import pytesseract
+from ocr_script import (DocumentRun, _process_chunk, _chunks, _page_engine, _page_journal, _set_tesseract_threads,
+                        _terminate_pool, _workers_within_memory)
+from ocr_cancel import Cancelled, CancelToken
+
+# Page-level scheduling across the documents of a batch. Instead of one document at a time (or
+# one per job process, each with its own page workers), the pages of every pending PDF go through
+# one shared pool of page workers, so a long book at the end of the batch still has every core
+# and short documents don't wait behind long ones. A document is finalized (outputs moved into
+# place, manifest updated by the caller) as soon as its last page is done.
+# Orders:
+#   shortest  documents with the fewest pages left first (default); pages already in a journal
+#             from an interrupted run don't count
+#   fifo      in the order they were added
+#   priority  higher priority first, then in the order they were added
+# Documents are opened when their first page is handed out, so only the few in progress hold
+# open journals and output files, however large the batch.
+
+ORDERS = ("shortest", "fifo", "priority")
+
+# Pool workers keep the last few documents open; pages of one document mostly arrive together.
+_OPEN_DOCS = 4
+_worker_docs = OrderedDict()
+_worker_settings = None
+_worker_cancel = None
+
+def _on_worker_terminate(signum, frame):
+    _worker_cancel.cancel()
+    os._exit(1)
+
+def _init_scheduler_worker(settings):
+    global _worker_settings, _worker_cancel
+    if settings["tesseract_cmd"]:
+        pytesseract.pytesseract.tesseract_cmd = settings["tesseract_cmd"]
+    _set_tesseract_threads(settings["tesseract_threads"])
+    _worker_settings = settings
+    _worker_cancel = CancelToken()
+    _page_engine(settings).cancel_token = _worker_cancel
+    if sys.platform != "win32":
+        signal.signal(signal.SIGTERM, _on_worker_terminate)
+
+def _worker_doc(pdf_path):
+    doc = _worker_docs.pop(pdf_path, None)
+    if doc is None:
+        doc = fitz.open(pdf_path)
+        if len(_worker_docs) >= _OPEN_DOCS:
+            _, oldest = _worker_docs.popitem(last=False)
+            oldest.close()
+    _worker_docs[pdf_path] = doc
+    return doc
+
+def _scheduled_task(pdf_path, indices):
+    doc = _worker_doc(pdf_path)
+    return _process_chunk([doc.load_page(i) for i in indices], _worker_settings)
+
+def page_count(pdf_path):
+    with fitz.open(pdf_path) as doc:
+        return len(doc)
+
+def priority_from_patterns(pdf_path, patterns):
+    # Priority for --priority GLOB options: the first matching pattern ranks highest.
+    name = os.path.basename(pdf_path).lower()
+    for n, pattern in enumerate(patterns):
+        if fnmatch.fnmatch(name, pattern.lower()) or fnmatch.fnmatch(pdf_path.lower(), pattern.lower()):
+            return len(patterns) - n
+    return 0
+
+class PageScheduler:
+    # on_document(pdf_path, stats, seconds, error) is called for every document as it completes
+    # (error None) or fails; progress_callback(pdf_path, done, total) after every page.
+    def __init__(self, settings, workers=1, order="shortest", progress_callback=None, event_callback=None,
+                 on_document=None, cancel_token=None):
+        if order not in ORDERS:
+            raise ValueError(f"order must be one of {', '.join(ORDERS)}, not {order!r}")
+        self.settings = settings
+        self.workers = max(1, workers or 1)
+        self.order = order
+        self.progress_callback = progress_callback
+        self.event_callback = event_callback
+        self.on_document = on_document
+        self.cancel_token = cancel_token
+        self.documents = []
+
+    def add(self, pdf_path, output_dir, priority=0, pages=None):
+        # pages: the page count if the caller already knows it (shortest-first needs it up front).
+        left = None
+        if self.order == "shortest":
+            if pages is None:
+                pages = page_count(pdf_path)
+            left = pages - len(_page_journal(pdf_path, output_dir, self.settings, pages).load())
+        self.documents.append({"pdf": pdf_path, "output_dir": output_dir, "priority": priority, "pages": pages,
+                               "left": left, "seq": len(self.documents), "run": None, "started": None,
+                               "failed": False})
+
+    def _ordered(self):
+        if self.order == "shortest":
+            return sorted(self.documents, key=lambda d: (d["left"], d["seq"]))
+        if self.order == "priority":
+            return sorted(self.documents, key=lambda d: (-d["priority"], d["seq"]))
+        return list(self.documents)
+
+    def _report(self, entry, stats, error):
+        if self.on_document:
+            self.on_document(entry["pdf"], stats, time.time() - (entry["started"] or time.time()), error)
+
+    def _finish(self, entry):
+        try:
+            stats = entry["run"].finish()
+        except Exception as e:
+            self._fail(entry, e)
+            return
+        entry["run"] = None
+        self._report(entry, stats, None)
+
+    def _fail(self, entry, error):
+        entry["failed"] = True
+        if entry["run"]:
+            entry["run"].abort()
+            entry["run"] = None
+        self._report(entry, None, error)
+
+    def _work(self):
+        # (entry, page indices) in scheduling order, opening each document on its first chunk.
+        size = self.settings["batch_size"]
+        for entry in self._ordered():
+            if self.cancel_token:
+                self.cancel_token.check()
+            entry["started"] = time.time()
+            try:
+                os.makedirs(entry["output_dir"], exist_ok=True)
+                entry["run"] = DocumentRun(entry["pdf"], entry["output_dir"], self.settings, self.event_callback)
+            except Exception as e:
+                self._fail(entry, e)
+                continue
+            if entry["run"].done:
+                # Every page was already in the journal.
+                self._finish(entry)
+                continue
+            for chunk in _chunks(entry["run"].remaining, size):
+                if entry["failed"]:
+                    break
+                yield entry, chunk
+
+    def run(self):
+        # Processes every added document; raises Cancelled (after reporting the documents in
+        # progress as cancelled) when the cancel token fires.
+        if not self.documents:
+            return
+        workers = self.workers
+        if self.settings["memory_budget"]:
+            workers = _workers_within_memory(workers, self.settings["memory_budget"])
+        total = sum(d["pages"] or 0 for d in self.documents)
+        print(f"Scheduling {len(self.documents)} documents ({total or '?'} pages, {self.order}) "
+              f"on {workers} worker processes.")
+
+        def new_executor():
+            return ProcessPoolExecutor(max_workers=workers, initializer=_init_scheduler_worker,
+                                       initargs=(self.settings,))
+
+        def replace_broken_pool(error):
+            # A worker that died (segfault, OOM kill) breaks the whole pool. Which chunk killed it
+            # is unknown, so every chunk in flight is retried once in a new pool; a document fails
+            # only when one of its chunks is in flight when the pool breaks a second time.
+            nonlocal executor
+            print(f"A page worker died ({error}); starting a new pool.")
+            for entry, chunk in running.values():
+                if entry["failed"]:
+                    continue
+                key = (entry["seq"], tuple(chunk))
+                if key in retried:
+                    self._fail(entry, error)
+                else:
+                    retried.add(key)
+                    retry.append((entry, chunk))
+            running.clear()
+            executor.shutdown(wait=False, cancel_futures=True)
+            executor = new_executor()
+
+        executor = new_executor()
+        handle = self.cancel_token.register(lambda: _terminate_pool(executor)) if self.cancel_token else None
+        work = self._work()
+        running = {}
+        retry = deque()
+        retried = set()
+        try:
+            while True:
+                # A couple of chunks per worker in flight: enough to keep them busy, few enough
+                # that documents are opened only shortly before their pages are needed.
+                while len(running) < workers * 2:
+                    if retry:
+                        # Chunks from a broken pool run one at a time, so if one of them kills
+                        # its worker again, it is the only chunk (and document) to fail.
+                        if running:
+                            break
+                        item = retry.popleft()
+                        if item[0]["failed"]:
+                            continue
+                    else:
+                        item = next(work, None)
+                        if item is None:
+                            break
+                    entry, chunk = item
+                    try:
+                        future = executor.submit(_scheduled_task, entry["pdf"], chunk)
+                    except BrokenProcessPool as e:
+                        replace_broken_pool(e)
+                        future = executor.submit(_scheduled_task, entry["pdf"], chunk)
+                    running[future] = item
+                if not running:
+                    break
+                finished, _ = wait(running, timeout=0.5, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    if future not in running:
+                        # Dropped with a broken pool.
+                        continue
+                    entry, chunk = running[future]
+                    try:
+                        results = future.result()
+                    except BrokenProcessPool as e:
+                        # Terminated workers surface as BrokenProcessPool too. Otherwise this
+                        # chunk is retried (or its document failed) with the rest in flight.
+                        if self.cancel_token:
+                            self.cancel_token.check()
+                        replace_broken_pool(e)
+                        continue
+                    except Exception as e:
+                        del running[future]
+                        if not entry["failed"]:
+                            self._fail(entry, e)
+                        continue
+                    del running[future]
+                    if entry["failed"]:
+                        continue
+                    run = entry["run"]
+                    for result in results:
+                        run.on_result(result)
+                        print(f"  Finished page {result['page']+1}/{run.total_pages} of {os.path.basename(entry['pdf'])}")
+                        if self.progress_callback:
+                            self.progress_callback(entry["pdf"], len(run.results), run.total_pages)
+                    if run.done:
+                        self._finish(entry)
+                if self.cancel_token:
+                    self.cancel_token.check()
+        except Cancelled as e:
+            for entry in self.documents:
+                if entry["run"]:
+                    print(f"Stopped {entry['pdf']}: {len(entry['run'].results)}/{entry['run'].total_pages} "
+                          f"pages kept in its journal.")
+                    entry["run"].abort()
+                    entry["run"] = None
+                    self._report(entry, None, e)
+            raise
+        except BaseException:
+            for entry in self.documents:
+                if entry["run"]:
+                    entry["run"].abort()
+                    entry["run"] = None
+            raise
+        finally:
+            if handle is not None:
+                self.cancel_token.unregister(handle)
+            work.close()
+            executor.shutdown(wait=True, cancel_futures=True)
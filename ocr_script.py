@@ -1,129 +1,729 @@
 import sys
 import os
+import json
+import time
+import signal
+from collections import Counter
 import fitz  # PyMuPDF
 import pytesseract
-from PIL import Image
-import io
-
-# Configuration
-# Attempt to find tesseract if not in PATH
-possible_paths = [
-    r"C:\Program Files\Tesseract-OCR\tesseract.exe",
-    r"C:\Program Files (x86)\Tesseract-OCR\tesseract.exe",
-]
-
-tesseract_cmd = None
-# Check if tesseract is in PATH
-try:
-    pytesseract.get_tesseract_version()
-    print("Tesseract found in PATH.")
-except:
-    print("Tesseract not in PATH. Checking common locations...")
-    for path in possible_paths:
-        if os.path.exists(path):
-            tesseract_cmd = path
-            print(f"Tesseract found at: {path}")
+from ocr_text_layer import extract_text_layer
+from ocr_image import (render_preview, pixmap_array, ink_density, find_body_region, column_tiles, preprocess,
+                       parse_preprocess, DEFAULT_BLANK_THRESHOLD)
+from ocr_journal import PageJournal, sample_hash
+from ocr_cache import PageCache, get_cache, DEFAULT_CACHE_PATH
+from ocr_engines import mean_confidence, get_engine, available_engines
+from ocr_metrics import stage_timer, add_timings
+from ocr_writers import WriterStage, WRITERS, WORD_FORMATS
+from ocr_cancel import Cancelled, CancelToken
+from ocr_probe import find_tesseract, check_lang
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+# Adaptive zoom: mean word confidence (0-100) a page must reach before it stops being re-rendered.
+DEFAULT_MIN_CONFIDENCE = 80
+
+def output_settings(zoom=3, psm=5, lang='jpn_vert', engine='pytesseract', use_text_layer=True,
+                    blank_threshold=DEFAULT_BLANK_THRESHOLD, zoom_steps=None, min_confidence=DEFAULT_MIN_CONFIDENCE,
+                    header_mode=None, formats=("text",), memory_budget=None, preprocess=()):
+    # The settings that change what ocr_pdf writes; they key the page journal and the manifest.
+    # Optional modes only appear when enabled, so documents processed before they existed still match.
+    settings = {"zoom": zoom, "psm": psm, "lang": lang, "engine": engine, "use_text_layer": use_text_layer,
+                "blank_threshold": blank_threshold}
+    if zoom_steps:
+        settings["zoom_steps"] = list(zoom_steps)
+        settings["min_confidence"] = min_confidence
+    if header_mode:
+        settings["header_mode"] = header_mode
+    if list(formats) != ["text"]:
+        settings["formats"] = list(formats)
+    if memory_budget:
+        settings["memory_budget"] = memory_budget
+    if preprocess:
+        settings["preprocess"] = list(parse_preprocess(preprocess))
+    return settings
+
+def render_page(page, zoom, clip=None):
+    # Render page to image (higher resolution for better OCR).
+    # Rendering straight to 8-bit grayscale replaces the RGB render + convert('L') copy.
+    # clip (page coordinates) renders only that part of the page.
+    mat = fitz.Matrix(zoom, zoom)
+    return page.get_pixmap(matrix=mat, colorspace=fitz.csGRAY, clip=clip)
+
+def _page_engine(settings):
+    return get_engine(settings["engine"], settings["lang"], settings["psm"], settings["tesseract_cmd"])
+
+# Rough peak memory per rendered pixel while a page is OCR'd: the 8-bit render plus Tesseract's
+# own grey, binary and working copies of the image.
+BYTES_PER_PIXEL = 8
+# Narrower tiles would leave only a line or two of vertical text per tile.
+MIN_TILE_WIDTH = 36
+
+def _tile_width(page, settings, zoom, clip):
+    # Widest tile (points) that fits the memory budget at zoom, or None when the whole region fits.
+    budget = settings["memory_budget"]
+    if not budget:
+        return None
+    region = clip or page.rect
+    width = budget * 2**20 / (BYTES_PER_PIXEL * zoom * zoom * region.height)
+    return None if region.width <= width else max(width, MIN_TILE_WIDTH)
+
+def _batch_limit(pages, settings):
+    # Pages whose renders fit the memory budget together: a batch holds every render until the
+    # engine call. Each one is charged a whole page's OCR cost, as _workers_within_memory does.
+    budget = settings["memory_budget"]
+    if not budget:
+        return len(pages)
+    zoom = settings["zoom"]
+    largest = max(page.rect.width * page.rect.height for page in pages)
+    return max(1, int(budget * 2**20 // (BYTES_PER_PIXEL * zoom * zoom * largest)))
+
+def _recognize_pix(engine, pix, zoom, clip, timings, want_words, steps=()):
+    to_source = None
+    if steps:
+        with stage_timer(timings, "preprocess"):
+            pix, to_source = preprocess(pix, steps)
+    with stage_timer(timings, "ocr"):
+        if want_words:
+            # Text, boxes and confidences from the same Tesseract call.
+            text, words = engine.recognize_words(pix)
+            return text, _page_words(words, zoom, clip, to_source)
+        return engine.recognize(pix), None
+
+def _recognize(page, settings, engine, zoom, clip, timings, want_words, pix=None):
+    # (text, words) for the page (or clip) at zoom; words in page coordinates, None unless wanted.
+    # pix is the render if the caller already made it. Over the memory budget the region is
+    # rendered and OCR'd one full-height column tile at a time, right to left, and the texts are
+    # joined in that order, so only one tile is in memory at any zoom.
+    steps = settings["preprocess"]
+    if pix is not None:
+        return _recognize_pix(engine, pix, zoom, clip, timings, want_words, steps)
+    tile_width = _tile_width(page, settings, zoom, clip)
+    if tile_width is None:
+        with stage_timer(timings, "render"):
+            pix = render_page(page, zoom, clip)
+        return _recognize_pix(engine, pix, zoom, clip, timings, want_words, steps)
+    region = clip or page.rect
+    with stage_timer(timings, "render"):
+        preview = render_preview(page, clip=region)
+        gray = pixmap_array(preview)
+        tiles = column_tiles(gray, region, tile_width)
+        del gray
+    texts, words = [], []
+    for tile in tiles:
+        with stage_timer(timings, "render"):
+            tile_pix = render_page(page, zoom, tile)
+        text, tile_words = _recognize_pix(engine, tile_pix, zoom, tile, timings, want_words, steps)
+        del tile_pix
+        # Every tile ends with Tesseract's page break; the joined page gets one.
+        texts.append(text.replace("\f", ""))
+        if want_words:
+            # Block numbers restart in every tile; keep them distinct across the page.
+            offset = max((w["block"] for w in words), default=0)
+            words += [dict(w, block=w["block"] + offset) for w in tile_words]
+    return "".join(texts) + "\f", (words if want_words else None)
+
+def _recognize_adaptive(page, settings, engine, first_pix, clip, timings):
+    # Coarse-to-fine: OCR at the cheapest zoom first and only re-render at the next zoom step
+    # while the mean word confidence stays below the threshold. Keeps the most confident attempt.
+    best = None
+    for step, zoom in enumerate(settings["zoom_steps"]):
+        text, words = _recognize(page, settings, engine, zoom, clip, timings, True, first_pix if step == 0 else None)
+        confidence = mean_confidence(words)
+        if best is None or confidence > best[2]:
+            best = (text, zoom, confidence, words)
+        if confidence >= settings["min_confidence"]:
             break
+    return best
 
-if tesseract_cmd:
-    pytesseract.pytesseract.tesseract_cmd = tesseract_cmd
-else:
-    # If we still haven't found it, we might fail, but let's try proceed and see if user has it set elsewhere or let it error naturally if not found
-    pass
+def _page_words(words, zoom, clip, to_source=None):
+    # Word boxes from render pixels to page coordinates (points), for the structured writers.
+    # to_source undoes preprocessing (border crop, deskew) so boxes match the page.
+    x0, y0 = (clip.x0, clip.y0) if clip else (0, 0)
+    if to_source:
+        words = [dict(w, left=left, top=top) for w in words for left, top in [to_source(w["left"], w["top"])]]
+    return [dict(w, left=round(x0 + w["left"] / zoom, 2), top=round(y0 + w["top"] / zoom, 2),
+                 width=round(w["width"] / zoom, 2), height=round(w["height"] / zoom, 2)) for w in words]
 
-def ocr_pdf(pdf_path, output_dir=None, progress_callback=None, zoom=3, psm=5, lang='jpn_vert', tesseract_cmd=None):
-    if output_dir is None:
-        output_dir = os.getcwd()
+def _cache_key(page, settings, engine, zoom, clip, pix=None):
+    # Adaptive results depend on the whole zoom ladder and threshold, not just the first render.
+    zoom_key = f"{settings['zoom_steps']}@{settings['min_confidence']}" if settings["zoom_steps"] else zoom
+    if settings["words"]:
+        # Entries with word boxes are stored as JSON under their own key.
+        zoom_key = f"{zoom_key}+words"
+    if settings["memory_budget"]:
+        # Tiling can change the text; tiled pages are keyed by a zoom 1 render.
+        zoom_key = f"{zoom_key}@{settings['memory_budget']}MB"
+    if settings["preprocess"]:
+        zoom_key = f"{zoom_key}+{','.join(settings['preprocess'])}"
+    key_pix = pix if pix is not None else render_page(page, 1, clip)
+    return PageCache.key(key_pix, settings["lang"], settings["psm"], zoom_key, engine.name, engine.version())
+
+def _cached_result(text, settings, zoom):
+    result = {"text": text, "cached": True, "zoom": zoom, "confidence": None}
+    if settings["words"]:
+        result.update(json.loads(text))
+    return result
+
+def _cache_put(cache, key, settings, text, words, confidence):
+    cache.put(key, json.dumps({"text": text, "words": words, "confidence": confidence},
+                              ensure_ascii=False) if settings["words"] else text)
+
+def _ocr_page(page, settings, clip, timings):
+    # Returns {"text", "cached", "zoom", "confidence"} for a page (or the clip of it) that needs OCR,
+    # plus "words" (boxes in page coordinates) when a structured output format asked for them.
+    adaptive = bool(settings["zoom_steps"])
+    zoom = settings["zoom_steps"][0] if adaptive else settings["zoom"]
+    # A page over the memory budget is never rendered whole (see _recognize).
+    tiled = _tile_width(page, settings, zoom, clip) is not None
+    pix = None
+    if not tiled:
+        with stage_timer(timings, "render"):
+            pix = render_page(page, zoom, clip)
+    confidence = None
+    words = None
+    
+    # Perform OCR
+    # --psm 5: Assume a single uniform block of vertically aligned text.
+    # This proved effective for the body text in testing.
+    try:
+        engine = _page_engine(settings)
+        cache = get_cache(settings["cache"]) if settings["cache"] else None
+        if cache:
+            with stage_timer(timings, "cache"):
+                key = _cache_key(page, settings, engine, zoom, clip, pix)
+                text = cache.get(key)
+            if text is not None:
+                return _cached_result(text, settings, None if adaptive else zoom)
+        if adaptive:
+            text, zoom, confidence, words = _recognize_adaptive(page, settings, engine, pix, clip, timings)
+        else:
+            text, words = _recognize(page, settings, engine, zoom, clip, timings, settings["words"], pix)
+            if words is not None:
+                confidence = mean_confidence(words)
+        del pix
+        if cache:
+            with stage_timer(timings, "cache"):
+                _cache_put(cache, key, settings, text, words, confidence)
+    except Cancelled:
+        raise
+    except Exception as e:
+        print(f"OCR Error on page {page.number}: {e}")
+        text = ""
+    result = {"text": text, "cached": False, "zoom": zoom, "confidence": confidence}
+    if settings["words"]:
+        result["words"] = words or []
+    return result
+
+def _process_page(page, settings):
+    # Result for one page: its text, where the text came from ("text layer", "blank" or "ocr"),
+    # and how long each stage took ("timings", see ocr_metrics).
+    start = time.perf_counter()
+    timings = {}
+    result = _page_result(page, settings, timings)
+    return _finish_result(result, page, timings, time.perf_counter() - start)
+
+def _finish_result(result, page, timings, seconds):
+    result["width"], result["height"] = page.rect.width, page.rect.height
+    result["timings"] = timings
+    result["seconds"] = seconds
+    return result
+
+def _precheck(page, settings, timings):
+    # (result, body, margins) before any OCR: result is final for text-layer and blank pages
+    # (None otherwise); body and margins are the regions from header detection.
+    if settings["use_text_layer"]:
+        with stage_timer(timings, "text_layer"):
+            text = extract_text_layer(page)
+        if text is not None:
+            return {"page": page.number, "text": text, "source": "text layer", "cached": False}, None, []
+    body, margins = None, []
+    if settings["blank_threshold"] or settings["header_mode"]:
+        with stage_timer(timings, "preview"):
+            # One low-resolution render serves both pre-checks.
+            preview = render_preview(page)
+            gray = pixmap_array(preview)
+            # Blank versos and section breaks: an ink check instead of a full OCR render.
+            blank = bool(settings["blank_threshold"]) and ink_density(gray) < settings["blank_threshold"]
+            # Crop to the main text block so margins, running heads and the nombre aren't OCR'd.
+            if settings["header_mode"] and not blank:
+                body, margins = find_body_region(gray)
+            del gray
+        if blank:
+            return {"page": page.number, "text": "", "source": "blank", "cached": False}, None, []
+    return None, body, margins
+
+def _page_result(page, settings, timings):
+    result, body, margins = _precheck(page, settings, timings)
+    if result is not None:
+        return result
+    result = {"page": page.number, "source": "ocr"}
+    result.update(_ocr_page(page, settings, body, timings))
+    if settings["header_mode"] == "separate" and margins:
+        # Running heads / page numbers OCR'd on their own, kept apart from the body text.
+        engine = _page_engine(settings)
+        headers = []
+        with stage_timer(timings, "headers"):
+            for rect in margins:
+                try:
+                    text = engine.recognize(render_page(page, settings["zoom"], rect)).strip()
+                except Cancelled:
+                    raise
+                except Exception as e:
+                    print(f"OCR Error on page {page.number} (header): {e}")
+                    continue
+                if text:
+                    headers.append(text)
+        result["headers"] = headers
+    return result
+
+def _batchable(settings):
+    # Batched OCR covers the plain render-and-recognise path; adaptive zoom and separately
+    # OCR'd headers need a result before deciding what to OCR next, and only engines that start
+    # a process per page gain anything.
+    return (settings["batch_size"] > 1 and not settings["zoom_steps"] and settings["header_mode"] != "separate"
+            and hasattr(_page_engine(settings), "recognize_batch"))
+
+def _process_chunk(pages, settings):
+    # Results for several pages, with the pages that need OCR recognised in one engine call
+    # (one tesseract process for the chunk). Text-layer, blank, cached and tiled pages are
+    # handled as in _process_page. If the batched call fails, its pages are OCR'd one by one,
+    # so a single bad page only costs its own text.
+    if len(pages) < 2 or not _batchable(settings):
+        return [_process_page(page, settings) for page in pages]
+    limit = _batch_limit(pages, settings)
+    if limit < len(pages):
+        return [result for part in _chunks(pages, limit) for result in _process_chunk(part, settings)]
+    engine = _page_engine(settings)
+    cache = get_cache(settings["cache"]) if settings["cache"] else None
+    zoom = settings["zoom"]
+    results = []
+    pending = []
+    for page in pages:
+        start = time.perf_counter()
+        timings = {}
+        result, body, _ = _precheck(page, settings, timings)
+        if result is None and _tile_width(page, settings, zoom, body) is not None:
+            result = _page_result(page, settings, timings)
+        elif result is None:
+            try:
+                with stage_timer(timings, "render"):
+                    pix = render_page(page, zoom, body)
+                key = None
+                if cache:
+                    with stage_timer(timings, "cache"):
+                        key = _cache_key(page, settings, engine, zoom, body, pix)
+                        text = cache.get(key)
+                    if text is not None:
+                        result = dict(_cached_result(text, settings, zoom), page=page.number, source="ocr")
+                if result is None:
+                    to_source = None
+                    if settings["preprocess"]:
+                        with stage_timer(timings, "preprocess"):
+                            pix, to_source = preprocess(pix, settings["preprocess"])
+                    pending.append({"index": len(results), "page": page, "pix": pix, "clip": body,
+                                    "to_source": to_source, "key": key, "timings": timings, "start": start})
+            except Cancelled:
+                raise
+            except Exception as e:
+                print(f"OCR Error on page {page.number}: {e}")
+                result = {"page": page.number, "source": "ocr", "text": "", "cached": False, "zoom": zoom,
+                          "confidence": None}
+                if settings["words"]:
+                    result["words"] = []
+        results.append(None if result is None else _finish_result(result, page, timings, time.perf_counter() - start))
+    if not pending:
+        return results
+    batch_start = time.perf_counter()
+    outputs = None
+    if len(pending) > 1:
+        try:
+            outputs = engine.recognize_batch([p["pix"] for p in pending], settings["words"])
+        except Cancelled:
+            raise
+        except Exception as e:
+            first, last = pending[0]["page"].number + 1, pending[-1]["page"].number + 1
+            print(f"Batched OCR of pages {first}-{last} failed ({e}); OCR'ing them one by one.")
+    # Each page is charged an equal share of the batched call.
+    share = (time.perf_counter() - batch_start) / len(pending) if outputs else 0.0
+    for n, p in enumerate(pending):
+        page, timings = p["page"], p["timings"]
+        words = confidence = None
+        failed = False
+        if outputs:
+            timings["ocr"] = timings.get("ocr", 0.0) + share
+            text, words = outputs[n] if settings["words"] else (outputs[n], None)
+        else:
+            try:
+                with stage_timer(timings, "ocr"):
+                    text, words = engine.recognize_words(p["pix"]) if settings["words"] else (engine.recognize(p["pix"]), None)
+            except Cancelled:
+                raise
+            except Exception as e:
+                print(f"OCR Error on page {page.number}: {e}")
+                text, words, failed = "", None, True
+        if words is not None:
+            words = _page_words(words, zoom, p["clip"], p["to_source"])
+            confidence = mean_confidence(words)
+        if cache and not failed:
+            with stage_timer(timings, "cache"):
+                _cache_put(cache, p["key"], settings, text, words, confidence)
+        result = {"page": page.number, "source": "ocr", "text": text, "cached": False, "zoom": zoom,
+                  "confidence": confidence}
+        if settings["words"]:
+            result["words"] = words or []
+        results[p["index"]] = _finish_result(result, page, timings, time.perf_counter() - p["start"])
+    return results
+
+def _chunks(indices, size):
+    return [indices[n:n + size] for n in range(0, len(indices), size)]
+
+# Pool workers: every process opens its own fitz document once and keeps it
+# for all the pages it is handed (fitz documents cannot be shared across processes).
+# The OCR engine is created here too, so a persistent engine stays loaded for the worker's lifetime.
+_worker_doc = None
+_worker_settings = None
+# Cancelling the document terminates the workers; on POSIX the SIGTERM handler first kills the
+# worker's running tesseract process so it doesn't outlive the worker.
+_worker_cancel = None
+
+def _on_worker_terminate(signum, frame):
+    _worker_cancel.cancel()
+    os._exit(1)
+
+def _set_tesseract_threads(threads):
+    # Tesseract's OpenMP pool size, read by every tesseract process started afterwards (and by
+    # tesserocr when it is first loaded in a process).
+    if threads:
+        os.environ["OMP_THREAD_LIMIT"] = str(threads)
+
+def _init_worker(pdf_path, settings):
+    global _worker_doc, _worker_settings, _worker_cancel
+    if settings["tesseract_cmd"]:
+        pytesseract.pytesseract.tesseract_cmd = settings["tesseract_cmd"]
+    _set_tesseract_threads(settings["tesseract_threads"])
+    _worker_doc = fitz.open(pdf_path)
+    _worker_settings = settings
+    _worker_cancel = CancelToken()
+    _page_engine(settings).cancel_token = _worker_cancel
+    if sys.platform != "win32":
+        signal.signal(signal.SIGTERM, _on_worker_terminate)
+
+def _ocr_chunk_task(indices):
+    return _process_chunk([_worker_doc.load_page(i) for i in indices], _worker_settings)
+
+def _terminate_pool(executor):
+    # ProcessPoolExecutor only gained a public way to stop running tasks in Python 3.14.
+    if hasattr(executor, "terminate_workers"):
+        executor.terminate_workers()
+        return
+    for process in list((executor._processes or {}).values()):
+        process.terminate()
+
+def _available_memory_mb():
+    # Free physical memory, where the OS tells us (None elsewhere, e.g. Windows).
+    try:
+        return os.sysconf("SC_AVPHYS_PAGES") * os.sysconf("SC_PAGE_SIZE") / 2**20
+    except (AttributeError, ValueError, OSError):
+        return None
 
+def _workers_within_memory(workers, memory_budget):
+    available = _available_memory_mb()
+    if available is None:
+        return workers
+    fitting = max(1, int(available // memory_budget))
+    if fitting < workers:
+        print(f"Memory budget {memory_budget} MB per worker: {available:.0f} MB free, limiting to {fitting} workers.")
+    return min(workers, fitting)
+
+def _ocr_pages_parallel(pdf_path, pages, total_pages, workers, progress_callback, settings, on_result,
+                        cancel_token=None):
+    # Pages complete out of order; the writer stage puts them back in order.
+    done = total_pages - len(pages)
+    executor = ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                                   initargs=(pdf_path, settings))
+    handle = cancel_token.register(lambda: _terminate_pool(executor)) if cancel_token else None
+    try:
+        # Chunks small enough that every worker gets some, so batching never idles a worker.
+        size = min(settings["batch_size"], -(-len(pages) // workers))
+        futures = [executor.submit(_ocr_chunk_task, chunk) for chunk in _chunks(pages, size)]
+        for future in as_completed(futures):
+            try:
+                chunk_results = future.result()
+            except Exception:
+                # Terminated workers surface as BrokenProcessPool.
+                if cancel_token:
+                    cancel_token.check()
+                raise
+            for result in chunk_results:
+                print(f"  Finished page {result['page']+1}/{total_pages}")
+                on_result(result)
+                done += 1
+                if progress_callback:
+                    progress_callback(done, total_pages)
+            if cancel_token:
+                cancel_token.check()
+    finally:
+        if handle is not None:
+            cancel_token.unregister(handle)
+        # Don't start queued pages if we are leaving early (error or stop request).
+        executor.shutdown(wait=True, cancel_futures=True)
+
+def ocr_settings(zoom=3, psm=5, lang='jpn_vert', tesseract_cmd=None, engine='pytesseract', use_text_layer=True,
+                 cache=None, blank_threshold=DEFAULT_BLANK_THRESHOLD, zoom_steps=None,
+                 min_confidence=DEFAULT_MIN_CONFIDENCE, header_mode=None, formats=("text",), memory_budget=None,
+                 preprocess=None, batch_size=1, tesseract_threads=None):
+    # Validated settings for ocr_pdf (and ocr_scheduler, which runs many documents on them):
+    # everything a page needs, in a picklable form for the pool workers. Raises ValueError for
+    # unknown engines, header modes, formats or preprocessing steps and missing languages.
+    # Tesseract is looked up here, on first use, not at import time (see ocr_probe).
+    tesseract_cmd = find_tesseract(tesseract_cmd) or tesseract_cmd
     if tesseract_cmd:
         pytesseract.pytesseract.tesseract_cmd = tesseract_cmd
-        
-    print(f"Processing: {pdf_path} (Zoom: {zoom}, PSM: {psm}, Lang: {lang})")
-    
-    # The original error handling for file existence and opening PDF is removed from here.
-    # It's implied that these checks should happen before calling ocr_pdf, or the function
-    # will now raise an exception if the file doesn't exist or is invalid.
-    doc = fitz.open(pdf_path)
+    _set_tesseract_threads(tesseract_threads)
+
+    settings = {
+        "zoom": zoom,
+        "psm": psm,
+        "lang": lang,
+        "engine": engine,
+        "tesseract_cmd": pytesseract.pytesseract.tesseract_cmd,
+        "use_text_layer": use_text_layer,
+        "blank_threshold": blank_threshold,
+        # Adaptive zoom: e.g. [2, 3, 5]; pages move up a step while their mean word confidence
+        # is below min_confidence. None renders every page once at `zoom`.
+        "zoom_steps": sorted(zoom_steps) if zoom_steps else None,
+        "min_confidence": min_confidence,
+        # Body-region cropping: None OCRs the whole page, "drop" crops to the main text block,
+        # "separate" also OCRs running heads / page numbers on their own.
+        "header_mode": header_mode,
+        # Page cache file; cache=True uses the default location under ~/.cache/glassocr.
+        "cache": (DEFAULT_CACHE_PATH if cache is True else cache) or None,
+        # Structured formats need word boxes and confidences from the engine.
+        "words": bool(WORD_FORMATS.intersection(formats)),
+        "memory_budget": memory_budget or None,
+        # Raises ValueError for unknown steps.
+        "preprocess": parse_preprocess(preprocess),
+        # Not part of output_settings: batching doesn't change the text.
+        "batch_size": max(1, int(batch_size or 1)),
+        "tesseract_threads": tesseract_threads or None,
+    }
+    if engine not in available_engines():
+        raise ValueError(f"OCR engine '{engine}' is not available. Available: {', '.join(available_engines())}")
+    # A missing language fails here, before any page, rather than as an OCR error on every page.
+    # Without tesseract, text-layer and blank pages still work.
+    if check_lang(lang, tesseract_cmd) is None:
+        print("Warning: Tesseract not found; only pages with a text layer can be read.")
+    if header_mode not in (None, "drop", "separate"):
+        raise ValueError(f"header_mode must be None, 'drop' or 'separate', not {header_mode!r}")
+    formats = list(dict.fromkeys(formats))
+    unknown = [name for name in formats if name not in WRITERS]
+    if not formats or unknown:
+        raise ValueError(f"Unknown output format(s) {unknown}. Available: {', '.join(WRITERS)}")
+    settings["formats"] = formats
+    # What the journal (and the processing manifest) compare against.
+    settings["output_settings"] = output_settings(zoom, psm, lang, engine, use_text_layer, blank_threshold,
+                                                  zoom_steps, min_confidence, header_mode, formats, memory_budget,
+                                                  preprocess)
+    return settings
+
+def _page_journal(pdf_path, output_dir, settings, total_pages):
+    # The journal lives next to the text output even when only other formats are written.
     base_name = os.path.basename(pdf_path)
-    output_filename = os.path.splitext(base_name)[0] + "_output.txt"
-    output_path = os.path.join(output_dir, output_filename)
+    output_path = os.path.join(output_dir, os.path.splitext(base_name)[0]) + WRITERS["text"].suffix
+    return PageJournal(output_path + ".journal", {
+        "pdf": base_name,
+        "size": os.path.getsize(pdf_path),
+        "sample": sample_hash(pdf_path),
+        "pages": total_pages,
+        "settings": settings["output_settings"],
+    })
 
-    print(f"Writing to: {output_path}")
+class DocumentRun:
+    # One document's journal, writer stage and page bookkeeping, from opening it to its stats.
+    # ocr_pdf drives one at a time; ocr_scheduler keeps several open and feeds them pages from a
+    # shared pool. Pages may arrive in any order.
+    def __init__(self, pdf_path, output_dir, settings, event_callback=None):
+        self.pdf_path = pdf_path
+        self.settings = settings
+        self.event_callback = event_callback
+        formats = settings["formats"]
+        # The original error handling for file existence and opening PDF is removed from here.
+        # It's implied that these checks should happen before calling ocr_pdf, or the function
+        # will now raise an exception if the file doesn't exist or is invalid.
+        self.doc = fitz.open(pdf_path)
+        base_name = os.path.basename(pdf_path)
+        output_base = os.path.join(output_dir, os.path.splitext(base_name)[0])
 
-    # Check/Validate language (Optional validation, but we trust the input mostly)
-    # If user provided a custom lang, we try to use it. 
-    # If they want auto-fallback logic, we could keep it, but for now let's respect the argument.
-    print(f"Using language: {lang}")
+        print(f"Using language: {settings['lang']}")
 
-    with open(output_path, "w", encoding="utf-8") as f:
-        # Process the entire book.
-        total_pages = len(doc)
+        self.total_pages = len(self.doc)
+
+        # Finished pages are checkpointed to a journal next to the output, so an interrupted
+        # document resumes from its first missing page instead of page 1.
+        self.journal = _page_journal(pdf_path, output_dir, settings, self.total_pages)
+        self.results = self.journal.load()
+        if self.results:
+            print(f"Resuming: {len(self.results)}/{self.total_pages} pages already done.")
+        self.journal.open(resume=bool(self.results))
+        self.remaining = [i for i in range(self.total_pages) if i not in self.results]
+
+        # Output files are written by a background thread while the remaining pages are OCR'd.
+        self.writer = WriterStage(output_base, formats, {"pdf": base_name, "pages": self.total_pages,
+                                                         "formats": formats})
+        for path in self.writer.paths.values():
+            print(f"Writing to: {path}")
+        for i in sorted(self.results):
+            self.writer.put(self.results[i])
+
+        self.start = time.perf_counter()
+        self.timings = {}
+        self.emit("document_start", pages=self.total_pages, resumed=len(self.results), time=time.time())
+
+    @property
+    def done(self):
+        return len(self.results) == self.total_pages
+
+    def emit(self, event, **fields):
+        if self.event_callback:
+            self.event_callback(dict({"event": event, "pdf": self.pdf_path}, **fields))
+
+    def on_result(self, result):
+        with stage_timer(self.timings, "journal"):
+            self.journal.append(result)
+        self.results[result["page"]] = result
+        self.writer.put(result)
+        add_timings(self.timings, result["timings"])
+        # The zoom a page ended up at and its confidence go here (--events), not to the log.
+        self.emit("page", page=result["page"] + 1, source=result["source"], cached=result["cached"],
+                  zoom=result.get("zoom"), confidence=result.get("confidence"),
+                  seconds=round(result["seconds"], 6), timings={k: round(v, 6) for k, v in result["timings"].items()})
+
+    def abort(self):
+        # Leaves the journal in place for the next run and drops the partial outputs.
+        self.writer.abort()
+        self.journal.close()
+        self.doc.close()
+
+    def finish(self):
+        # Stats for the completed document (see ocr_pdf).
+        self.journal.close()
+        self.doc.close()
+        # Wait for the writer to catch up and move the outputs into place; the journal goes only
+        # after that, so a crash here still resumes.
+        with stage_timer(self.timings, "write"):
+            self.writer.finish()
+        self.journal.remove()
+
+        formats = self.settings["formats"]
+        results = self.results
+        total_pages = self.total_pages
+        # Which pages were taken from the existing text layer and which were OCR'd.
+        # For OCR'd pages, the zoom each page finally used (None for page-cache hits).
+        # "output" is the first format's file, "outputs" all of them by format.
+        stats = {"pages": total_pages, "output": self.writer.paths[formats[0]], "outputs": self.writer.paths,
+                 "text layer": [], "blank": [], "ocr": [], "cache hits": 0, "zoom": {}}
         for i in range(total_pages):
-            if progress_callback:
-                progress_callback(i + 1, total_pages)
-                
-            page = doc.load_page(i)
-            print(f"  Converting page {i+1}/{total_pages}...")
-            
-            # Render page to image (higher resolution for better OCR)
-            # zoom = 3  # Start using parameter
-            mat = fitz.Matrix(zoom, zoom)
-            pix = page.get_pixmap(matrix=mat)
-            
-            # Convert to PIL Image
-            img_data = pix.tobytes("png")
-            image = Image.open(io.BytesIO(img_data))
-
-            # Preprocessing
-            # Convert to grayscale
-            image = image.convert('L')
-            
-            # Perform OCR
-            # --psm 5: Assume a single uniform block of vertically aligned text.
-            # This proved effective for the body text in testing.
-            config_str = f'--psm {psm}'
-            try:
-                text = pytesseract.image_to_string(image, lang=lang, config=config_str)
-            except Exception as e:
-                print(f"OCR Error on page {i}: {e}")
-                text = ""
-            
-            f.write(f"--- Page {i+1} ---\n")
-            f.write(text)
-            f.write("\n\n")
-            
-    print(f"Done. Saved to {output_filename}")
+            result = results[i]
+            stats[result["source"]].append(i + 1)
+            if result["cached"]:
+                stats["cache hits"] += 1
+            if result["source"] == "ocr":
+                stats["zoom"][i + 1] = result.get("zoom")
+        # Stage totals over the pages processed in this run (resumed pages are not re-timed).
+        stats["timings"] = {k: round(v, 6) for k, v in self.timings.items()}
+        self.emit("document_end", pages=total_pages, seconds=round(time.perf_counter() - self.start, 6),
+                  timings=stats["timings"])
+
+        print(f"Text layer: {len(stats['text layer'])} pages, blank (skipped): {len(stats['blank'])} pages, "
+              f"OCR: {len(stats['ocr'])} pages")
+        if self.settings["cache"]:
+            misses = len(stats['ocr']) - stats['cache hits']
+            print(f"Page cache: {stats['cache hits']} hits, {misses} misses")
+        if self.settings["zoom_steps"]:
+            used = Counter(z for z in stats["zoom"].values() if z is not None)
+            print("Zoom used: " + ", ".join(f"{z}: {used[z]} pages" for z in sorted(used)))
+        print(f"Done. Saved to {', '.join(os.path.basename(path) for path in self.writer.paths.values())}")
+        return stats
+
+def ocr_pdf(pdf_path, output_dir=None, progress_callback=None, zoom=3, psm=5, lang='jpn_vert', tesseract_cmd=None, workers=1,
+            engine='pytesseract', use_text_layer=True, cache=None, blank_threshold=DEFAULT_BLANK_THRESHOLD,
+            zoom_steps=None, min_confidence=DEFAULT_MIN_CONFIDENCE, header_mode=None, event_callback=None,
+            formats=("text",), cancel_token=None, memory_budget=None, preprocess=None, batch_size=1,
+            tesseract_threads=None):
+    # event_callback receives instrumentation events (document_start, page, document_end);
+    # see ocr_metrics for their fields and for JSONL / Prometheus sinks.
+    # formats: output writers to run, any of "text", "jsonl", "hocr", "alto" (see ocr_writers).
+    # cancel_token (ocr_cancel.CancelToken): cancelling it stops the document at once and raises
+    # Cancelled; finished pages stay in the journal for the next run.
+    # memory_budget (MB per worker): pages whose render would exceed it are OCR'd in column tiles,
+    # and workers are limited to what fits in the available memory.
+    # preprocess: image clean-up before OCR, e.g. "border,deskew,otsu,despeckle" (see ocr_image).
+    # batch_size: pages OCR'd per tesseract process (pytesseract engine). Starting tesseract and
+    # loading its language data costs about as much as a small page, so chunks of pages share one
+    # run; the text is the same as page by page.
+    # tesseract_threads: OMP_THREAD_LIMIT for tesseract. Each process otherwise starts one thread
+    # per core, so several workers oversubscribe the CPU; ocr_tune measures the best split.
+    if output_dir is None:
+        output_dir = os.getcwd()
+
+    print(f"Processing: {pdf_path} (Zoom: {zoom}, PSM: {psm}, Lang: {lang}, Engine: {engine})")
+
+    settings = ocr_settings(zoom, psm, lang, tesseract_cmd, engine, use_text_layer, cache, blank_threshold,
+                            zoom_steps, min_confidence, header_mode, formats, memory_budget, preprocess,
+                            batch_size, tesseract_threads)
+    run = DocumentRun(pdf_path, output_dir, settings, event_callback)
+    remaining = run.remaining
+    total_pages = run.total_pages
+
+    ocr_engine = None
+    try:
+        # Process the entire book.
+        if workers and workers > 1 and len(remaining) > 1:
+            # Split the pages across a process pool; each worker opens its own copy of the PDF.
+            workers = min(workers, len(remaining))
+            if memory_budget:
+                workers = _workers_within_memory(workers, memory_budget)
+            print(f"Using {workers} worker processes.")
+            _ocr_pages_parallel(pdf_path, remaining, total_pages, workers, progress_callback, settings, run.on_result,
+                                cancel_token)
+        else:
+            ocr_engine = _page_engine(settings)
+            ocr_engine.cancel_token = cancel_token
+            pages_before, seconds_before = ocr_engine.pages, ocr_engine.seconds
+            for chunk in _chunks(remaining, settings["batch_size"]):
+                if cancel_token:
+                    cancel_token.check()
+                if progress_callback:
+                    progress_callback(chunk[0] + 1, total_pages)
+
+                pages = [run.doc.load_page(i) for i in chunk]
+                if len(chunk) > 1:
+                    print(f"  Converting pages {chunk[0]+1}-{chunk[-1]+1}/{total_pages}...")
+                else:
+                    print(f"  Converting page {chunk[0]+1}/{total_pages}...")
+
+                for result in _process_chunk(pages, settings):
+                    run.on_result(result)
+
+            ocr_pages = ocr_engine.pages - pages_before
+            if ocr_pages:
+                ms_per_page = (ocr_engine.seconds - seconds_before) * 1000 / ocr_pages
+                print(f"Engine {ocr_engine.name}: {ms_per_page:.0f} ms/page")
+    except Cancelled:
+        run.abort()
+        print(f"Stopped: {len(run.results)}/{total_pages} pages kept in {os.path.basename(run.journal.path)}.")
+        raise
+    except BaseException:
+        run.abort()
+        raise
+    finally:
+        # The engine is cached per process and outlives this document.
+        if ocr_engine:
+            ocr_engine.cancel_token = None
+
+    return run.finish()
 
 if __name__ == "__main__":
-    source_dir = os.path.expanduser("~")
-    # output_dir = r"C:\Users\947x9\.gemini\antigravity\scratch\ocr_project" # Current directory
-    
-    # Get list of all PDF files
-    pdf_files = [f for f in os.listdir(source_dir) if f.lower().endswith('.pdf')]
-    
-    # Load processed history
-    history_file = "processed_log.txt"
-    processed_files = set()
-    if os.path.exists(history_file):
-        with open(history_file, "r", encoding="utf-8") as f:
-            processed_files = set(f.read().splitlines())
-    
-    print(f"Found {len(pdf_files)} PDF files in {source_dir}")
-    print(f"Already processed: {len(processed_files)} files")
-    
-    for filename in pdf_files:
-        if filename in processed_files:
-            print(f"Skipping {filename} (already processed).")
-            continue
-
-        pdf_path = os.path.join(source_dir, filename)
-        print(f"\nProcessing: {filename}")
-        
-        try:
-            ocr_pdf(pdf_path)
-            print(f"Successfully processed {filename}")
-            # Identify success and log
-            with open(history_file, "a", encoding="utf-8") as f:
-                f.write(filename + "\n")
-        except Exception as e:
-            print(f"Error processing {filename}: {e}")
+    # Kept for compatibility: with no arguments, process the PDFs in the home directory.
+    # See ocr_batch.py for the options (recursive walks, --jobs, JSON summary, ...).
+    from ocr_batch import main
+    sys.exit(main(sys.argv[1:] or [os.path.expanduser("~")]))
@@ -0,0 +1,448 @@
+import sys
+import os
+import json
+import time
+import uuid
+import argparse
+import threading
+import multiprocessing
+from urllib.parse import urlsplit, parse_qs
+from collections import OrderedDict, deque
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from ocr_script import ocr_pdf, output_settings
+from ocr_batch import add_ocr_arguments, job_options, _number
+from ocr_manifest import Manifest
+from ocr_index import SearchIndex
+from ocr_engines import get_engine, available_engines
+from ocr_writers import WRITERS
+from ocr_image import parse_preprocess
+from ocr_metrics import PrometheusMetrics
+from ocr_probe import check_lang
+
+# Local OCR job service: other tools submit PDFs over HTTP instead of starting a process per job.
+#   python ocr_service.py --port 8765 --pool 2 --max-queued 16 -o /srv/ocr
+#   curl -X POST localhost:8765/jobs -d '{"pdf": "/srv/scans/a.pdf", "settings": {"zoom": 4}}'
+#   curl localhost:8765/jobs/<id>
+# Endpoints:
+#   POST   /jobs          {"pdf", "output_dir"?, "settings"?, "force"?} -> 202 {"id", "status"}
+#                         400 for a bad request, 503 (with Retry-After) when the queue is full,
+#                         409 {"id"} while a job for the same PDF and output_dir is queued or running
+#   GET    /jobs          every job the service remembers (the newest --keep finished ones)
+#   GET    /jobs/<id>     status (queued, running, done, skipped, failed, cancelled), pages_done /
+#                         pages_total while running, the ocr_pdf stats (output paths...) when done
+#   DELETE /jobs/<id>     cancels a job that hasn't started yet
+#   GET    /health        pool size and queue depth
+#   GET    /metrics       Prometheus text format (see ocr_metrics)
+#   GET    /search?q=..   ranked page hits from the --index full-text index (see ocr_index)
+# Jobs run in a fixed pool of long-lived worker processes. Each one loads its OCR engine once, at
+# start-up, and keeps it for every job it runs. The service only listens on localhost by default.
+
+# Per-job settings a client may override, with the ocr_pdf defaults coming from the command line.
+JOB_SETTINGS = {
+    "zoom": (int, float),
+    "psm": int,
+    "lang": str,
+    "engine": str,
+    "use_text_layer": bool,
+    "blank_threshold": (int, float),
+    "zoom_steps": (list, type(None)),
+    "min_confidence": (int, float),
+    "header_mode": (str, type(None)),
+    "formats": list,
+    "memory_budget": (int, type(None)),
+    "preprocess": (list, str),
+    "batch_size": int,
+    "workers": int,
+    "cache": bool,
+}
+
+QUEUED = "queued"
+RUNNING = "running"
+DONE = "done"
+SKIPPED = "skipped"
+FAILED = "failed"
+CANCELLED = "cancelled"
+FINISHED = (DONE, SKIPPED, FAILED, CANCELLED)
+
+class QueueFull(Exception):
+    pass
+
+class JobConflict(Exception):
+    # Another job already writes this PDF's output; job_id is that job.
+    def __init__(self, job_id):
+        super().__init__(f"job {job_id} is already processing this PDF")
+        self.job_id = job_id
+
+# Set in each pool process by _init_service_worker.
+_updates = None
+
+def _init_service_worker(updates, engine, lang, psm, tesseract_cmd):
+    global _updates
+    _updates = updates
+    try:
+        get_engine(engine, lang, psm, tesseract_cmd)
+    except Exception as e:
+        print(f"Could not load the {engine} engine up front: {e}")
+
+def _service_job(job_id, pdf_path, output_dir, options, settings, manifest_path, force, index_path=None):
+    # Runs in a pool process; progress and instrumentation events go back through _updates.
+    _updates.put((job_id, "start", os.getpid()))
+    manifest = Manifest(manifest_path)
+    try:
+        if not force and manifest.is_done(pdf_path, settings):
+            return None
+        manifest.start(pdf_path, settings)
+        start = time.time()
+        os.makedirs(output_dir, exist_ok=True)
+        try:
+            stats = ocr_pdf(pdf_path, output_dir=output_dir,
+                            progress_callback=lambda done, total: _updates.put((job_id, "progress", (done, total))),
+                            event_callback=lambda event: _updates.put((job_id, "event", event)), **options)
+        except Exception as e:
+            manifest.fail(pdf_path, settings, e, seconds=time.time() - start)
+            raise
+        manifest.finish(pdf_path, settings, pages=stats["pages"], output=stats["output"], seconds=time.time() - start)
+        if index_path:
+            # Like the manifest, the index is shared by the pool processes (SQLite WAL).
+            index = SearchIndex(index_path)
+            try:
+                index.add_stats(pdf_path, stats)
+            finally:
+                index.close()
+        return stats
+    finally:
+        manifest.close()
+
+class JobQueue:
+    def __init__(self, pool_size, max_queued, defaults, output_dir, manifest_path, max_page_workers, keep=1000,
+                 index_path=None):
+        self.defaults = defaults
+        self.output_dir = output_dir
+        self.manifest_path = manifest_path
+        self.index_path = index_path
+        self.max_queued = max_queued
+        self.max_page_workers = max_page_workers
+        self.keep = keep
+        self.pool_size = pool_size
+        # Reentrant: a future that is already done runs its callback inside _dispatch.
+        self.lock = threading.RLock()
+        self.jobs = OrderedDict()
+        # Jobs wait here, not in the executor, so they can still be cancelled; the executor only
+        # ever gets as many jobs as it has workers.
+        self.waiting = deque()
+        self.futures = {}
+        self.metrics = PrometheusMetrics()
+        self.updates = multiprocessing.Queue()
+        self.executor = self._new_executor()
+        self.update_thread = threading.Thread(target=self._read_updates, name="glassocr-updates", daemon=True)
+        self.update_thread.start()
+
+    def _new_executor(self):
+        return ProcessPoolExecutor(
+            max_workers=self.pool_size, initializer=_init_service_worker,
+            initargs=(self.updates, self.defaults["engine"], self.defaults["lang"], self.defaults["psm"],
+                      self.defaults["tesseract_cmd"]))
+
+    def _job_options(self, overrides):
+        # ocr_pdf keyword arguments and manifest settings for one job; ValueError for bad input.
+        if not isinstance(overrides, dict):
+            raise ValueError("settings must be an object")
+        unknown = set(overrides) - set(JOB_SETTINGS)
+        if unknown:
+            raise ValueError(f"unknown settings: {', '.join(sorted(unknown))}")
+        for name, value in overrides.items():
+            types = JOB_SETTINGS[name]
+            # bool is an int subclass; only "use_text_layer" and "cache" take booleans.
+            if not isinstance(value, types) or (isinstance(value, bool) and types is not bool):
+                raise ValueError(f"invalid value for {name}: {value!r}")
+        options = dict(self.defaults, **overrides)
+        options["zoom"] = _number(options["zoom"])
+        if options["zoom_steps"]:
+            if not all(isinstance(z, (int, float)) and not isinstance(z, bool) for z in options["zoom_steps"]):
+                raise ValueError(f"invalid value for zoom_steps: {options['zoom_steps']!r}")
+            options["zoom_steps"] = [_number(z) for z in options["zoom_steps"]]
+        if options["engine"] not in available_engines():
+            raise ValueError(f"OCR engine '{options['engine']}' is not available")
+        if options["header_mode"] not in (None, "drop", "separate"):
+            raise ValueError(f"invalid header_mode: {options['header_mode']!r}")
+        if not options["formats"] or any(name not in WRITERS for name in options["formats"]):
+            raise ValueError(f"formats must be a list of: {', '.join(WRITERS)}")
+        options["workers"] = max(1, min(options["workers"], self.max_page_workers))
+        options["batch_size"] = max(1, options["batch_size"])
+        if not all(isinstance(step, str) for step in options["preprocess"]):
+            raise ValueError(f"invalid value for preprocess: {options['preprocess']!r}")
+        options["preprocess"] = list(parse_preprocess(options["preprocess"]))
+        # Clients switch the cache on or off; where it lives is the service's choice.
+        options["cache"] = (self.defaults["cache"] or True) if options["cache"] else None
+        check_lang(options["lang"], options["tesseract_cmd"])
+        settings = output_settings(options["zoom"], options["psm"], options["lang"], options["engine"],
+                                   options["use_text_layer"], options["blank_threshold"], options["zoom_steps"],
+                                   options["min_confidence"], options["header_mode"], options["formats"],
+                                   options["memory_budget"], options["preprocess"])
+        return options, settings
+
+    def submit(self, request):
+        if not isinstance(request, dict) or not isinstance(request.get("pdf"), str):
+            raise ValueError("a job needs a \"pdf\" path")
+        pdf_path = os.path.abspath(request["pdf"])
+        if not os.path.isfile(pdf_path):
+            raise ValueError(f"no such file: {pdf_path}")
+        output_dir = os.path.abspath(request.get("output_dir") or self.output_dir)
+        options, settings = self._job_options(request.get("settings") or {})
+        with self.lock:
+            # Two jobs writing the same output and journal at once would corrupt both.
+            for other in self.jobs.values():
+                if other["status"] in (QUEUED, RUNNING) and (other["pdf"], other["output_dir"]) == (pdf_path, output_dir):
+                    raise JobConflict(other["id"])
+            if len(self.waiting) >= self.max_queued:
+                raise QueueFull(f"{len(self.waiting)} jobs already queued")
+            job_id = uuid.uuid4().hex[:12]
+            job = {"id": job_id, "pdf": pdf_path, "output_dir": output_dir, "status": QUEUED,
+                   "settings": {name: options[name] for name in JOB_SETTINGS},
+                   "submitted": time.time(), "started": None, "finished": None,
+                   "pages_done": 0, "pages_total": None, "result": None, "error": None}
+            self.jobs[job_id] = job
+            self.waiting.append((job_id, (job_id, pdf_path, output_dir, options, settings, self.manifest_path,
+                                          bool(request.get("force")), self.index_path)))
+            print(f"Job {job_id} queued: {pdf_path}")
+            self._dispatch()
+            return dict(job)
+
+    def _dispatch(self):
+        # Called with the lock held.
+        while self.waiting and len(self.futures) < self.pool_size:
+            job_id, args = self.waiting.popleft()
+            try:
+                future = self.executor.submit(_service_job, *args)
+            except BrokenProcessPool:
+                # A worker died (segfault, OOM kill); its jobs fail through their futures and the
+                # rest run on a new pool.
+                print("A worker process died; starting a new pool.")
+                self.executor.shutdown(wait=False, cancel_futures=True)
+                self.executor = self._new_executor()
+                future = self.executor.submit(_service_job, *args)
+            self.futures[job_id] = future
+            future.add_done_callback(lambda f, job_id=job_id: self._finished(job_id, f))
+
+    def _finished(self, job_id, future):
+        with self.lock:
+            job = self.jobs.get(job_id)
+            self.futures.pop(job_id, None)
+            if job is None:
+                return
+            job["finished"] = time.time()
+            if future.cancelled():
+                job["status"] = CANCELLED
+            elif future.exception() is not None:
+                job["status"] = FAILED
+                job["error"] = str(future.exception())
+            elif future.result() is None:
+                job["status"] = SKIPPED
+            else:
+                job["status"] = DONE
+                job["result"] = future.result()
+                job["pages_done"] = job["pages_total"] = job["result"]["pages"]
+            self._forget_old_jobs()
+            self._dispatch()
+        print(f"Job {job_id} {job['status']}" + (f": {job['error']}" if job["error"] else ""))
+
+    def _forget_old_jobs(self):
+        finished = [job_id for job_id, job in self.jobs.items() if job["status"] in FINISHED]
+        for job_id in finished[:max(0, len(finished) - self.keep)]:
+            del self.jobs[job_id]
+
+    def _read_updates(self):
+        while True:
+            item = self.updates.get()
+            if item is None:
+                break
+            job_id, kind, value = item
+            with self.lock:
+                if kind == "event":
+                    self.metrics(value)
+                job = self.jobs.get(job_id)
+                if job is None or job["status"] in FINISHED:
+                    continue
+                if kind == "start":
+                    job["status"] = RUNNING
+                    job["started"] = time.time()
+                elif kind == "progress":
+                    job["pages_done"], job["pages_total"] = value
+                elif kind == "event" and value["event"] == "document_start":
+                    job["pages_total"] = value["pages"]
+
+    def get(self, job_id):
+        with self.lock:
+            job = self.jobs.get(job_id)
+            return dict(job) if job else None
+
+    def list(self):
+        with self.lock:
+            return [dict(job) for job in self.jobs.values()]
+
+    def cancel(self, job_id):
+        # True if the job was still waiting and won't run.
+        with self.lock:
+            for entry in self.waiting:
+                if entry[0] == job_id:
+                    self.waiting.remove(entry)
+                    job = self.jobs[job_id]
+                    job["status"] = CANCELLED
+                    job["finished"] = time.time()
+                    return True
+        return False
+
+    def health(self):
+        with self.lock:
+            return {"pool": self.pool_size, "max_queued": self.max_queued,
+                    "queued": len(self.waiting), "running": len(self.futures)}
+
+    def close(self):
+        with self.lock:
+            self.waiting.clear()
+        self.executor.shutdown(wait=True, cancel_futures=True)
+        self.updates.put(None)
+        self.update_thread.join()
+
+# Largest request body accepted, in bytes.
+MAX_BODY = 1 << 20
+
+class ServiceHandler(BaseHTTPRequestHandler):
+    server_version = "GlassOCR"
+
+    def _send(self, status, body, content_type="application/json", headers=None):
+        data = body.encode("utf-8") if isinstance(body, str) else json.dumps(body, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", f"{content_type}; charset=utf-8")
+        self.send_header("Content-Length", str(len(data)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _job_id(self):
+        parts = self.path.split("?")[0].strip("/").split("/")
+        return parts[1] if len(parts) == 2 and parts[0] == "jobs" else None
+
+    def do_GET(self):
+        jobs = self.server.jobs
+        path = self.path.split("?")[0].rstrip("/")
+        if path == "/jobs":
+            self._send(200, {"jobs": jobs.list()})
+        elif path == "/health":
+            self._send(200, jobs.health())
+        elif path == "/metrics":
+            with jobs.lock:
+                text = jobs.metrics.render()
+            self._send(200, text, "text/plain; version=0.0.4")
+        elif path == "/search":
+            self._search()
+        elif self._job_id():
+            job = jobs.get(self._job_id())
+            if job:
+                self._send(200, job)
+            else:
+                self._send(404, {"error": "no such job"})
+        else:
+            self._send(404, {"error": "not found"})
+
+    def _search(self):
+        index_path = self.server.jobs.index_path
+        if not index_path:
+            self._send(404, {"error": "no search index (start the service with --index)"})
+            return
+        query = parse_qs(urlsplit(self.path).query)
+        text = query.get("q", [""])[0]
+        try:
+            limit = int(query.get("limit", ["20"])[0])
+        except ValueError:
+            self._send(400, {"error": "limit must be a number"})
+            return
+        if not text.strip():
+            self._send(400, {"error": "missing q"})
+            return
+        # A connection per request: the handler threads can't share one.
+        index = SearchIndex(index_path)
+        try:
+            hits = index.search(text, max(1, min(limit, 1000)))
+        finally:
+            index.close()
+        self._send(200, {"query": text, "hits": hits})
+
+    def do_POST(self):
+        if self.path.split("?")[0].rstrip("/") != "/jobs":
+            self._send(404, {"error": "not found"})
+            return
+        length = int(self.headers.get("Content-Length") or 0)
+        if length > MAX_BODY:
+            self._send(413, {"error": "request too large"})
+            return
+        try:
+            job = self.server.jobs.submit(json.loads(self.rfile.read(length) or b"null"))
+        except JobConflict as e:
+            self._send(409, {"error": str(e), "id": e.job_id}, headers={"Location": f"/jobs/{e.job_id}"})
+            return
+        except QueueFull as e:
+            # Backpressure: the client should come back later rather than queue without limit.
+            self._send(503, {"error": f"queue full ({e})"}, headers={"Retry-After": "5"})
+            return
+        except ValueError as e:
+            self._send(400, {"error": str(e)})
+            return
+        self._send(202, {"id": job["id"], "status": job["status"]}, headers={"Location": f"/jobs/{job['id']}"})
+
+    def do_DELETE(self):
+        job_id = self._job_id()
+        if not job_id or not self.server.jobs.get(job_id):
+            self._send(404, {"error": "no such job"})
+        elif self.server.jobs.cancel(job_id):
+            self._send(200, {"id": job_id, "status": CANCELLED})
+        else:
+            self._send(409, {"error": "job already started or finished"})
+
+    def log_message(self, format, *args):
+        print(f"{self.address_string()} {format % args}")
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="Local OCR job service with a worker pool and a status API.")
+    parser.add_argument("--host", default="127.0.0.1", help="address to listen on (default: localhost only)")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--pool", type=int, default=2, help="jobs run concurrently (worker processes)")
+    parser.add_argument("--max-queued", type=int, default=16,
+                        help="jobs waiting for a worker before new submissions get 503")
+    parser.add_argument("--max-page-workers", type=int, default=os.cpu_count() or 1,
+                        help="upper limit for a job's \"workers\" setting")
+    parser.add_argument("--keep", type=int, default=1000, help="finished jobs remembered for GET /jobs")
+    parser.add_argument("-o", "--output-dir", default=os.getcwd(), help="default output directory")
+    add_ocr_arguments(parser)
+    parser.add_argument("--manifest", default="processed_manifest.sqlite", help="processing manifest database")
+    parser.add_argument("--index", help="add finished documents to this full-text search index and serve /search")
+    return parser
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    try:
+        defaults, _ = job_options(args)
+    except ValueError as e:
+        print(f"Error: {e}")
+        return 2
+    jobs = JobQueue(max(1, args.pool), max(0, args.max_queued), defaults, args.output_dir,
+                    os.path.abspath(args.manifest), max(1, args.max_page_workers), args.keep,
+                    os.path.abspath(args.index) if args.index else None)
+    server = ThreadingHTTPServer((args.host, args.port), ServiceHandler)
+    server.jobs = jobs
+    print(f"GlassOCR service on http://{args.host}:{server.server_port} "
+          f"({args.pool} workers, up to {args.max_queued} queued jobs)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print("Shutting down; running jobs finish first, queued jobs are dropped.")
+    finally:
+        server.server_close()
+        jobs.close()
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,242 @@
+import sys
+import os
+import re
+import json
+import time
+import random
+import argparse
+import itertools
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import fitz  # PyMuPDF
+from ocr_script import render_page
+from ocr_text_layer import extract_text_layer
+from ocr_image import render_preview, pixmap_array, find_body_region, preprocess, parse_preprocess, PREPROCESS_STEPS
+from ocr_engines import get_engine, available_engines
+
+# Parameter sweep: which OCR settings are cheapest while still accurate enough?
+#   python ocr_sweep.py scans/*.pdf --zoom 2,3,4 --psm 5,6 --lang jpn_vert --preprocess none,crop,crop+otsu \
+#       --sample 5 --jobs 4 --target-cer 0.03
+# Ground truth is <name>_truth.txt next to each PDF (or in --truth-dir), in the same
+# "--- Page N ---" layout as *_output.txt, so a hand-corrected output file works. With
+# --text-layer-truth, born-digital PDFs are rendered and OCR'd and their text layer is the truth.
+# Work is split per (pdf, page, zoom): each task renders the page once and runs every
+# psm/lang/preprocess combination on that render.
+# A preprocess variant is "none", or steps joined with "+": "crop" (body region, as --headers drop)
+# and the ocr_image clean-up steps, e.g. "otsu" or "crop+deskew+otsu".
+
+PREPROCESS = ("none", "crop") + PREPROCESS_STEPS
+
+def parse_variant(variant):
+    # "crop+deskew+otsu" -> (crop?, clean-up steps); ValueError for unknown steps.
+    parts = [p for p in variant.split("+") if p and p != "none"]
+    return "crop" in parts, parse_preprocess([p for p in parts if p != "crop"])
+
+PAGE_HEADER = re.compile(r"^--- Page (\d+)(?: \(.*\))? ---$", re.MULTILINE)
+
+def read_truth(path):
+    # {page index: text} from a file in the *_output.txt layout.
+    with open(path, "r", encoding="utf-8") as f:
+        content = f.read()
+    parts = PAGE_HEADER.split(content)
+    return {int(number) - 1: text for number, text in zip(parts[1::2], parts[2::2])}
+
+def _normalize(text):
+    # Line breaks and spacing differ between OCR output and transcriptions; compare characters only.
+    return "".join(text.split())
+
+def levenshtein(a, b):
+    if len(a) < len(b):
+        a, b = b, a
+    previous = list(range(len(b) + 1))
+    for i, ca in enumerate(a, 1):
+        current = [i]
+        for j, cb in enumerate(b, 1):
+            current.append(min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (ca != cb)))
+        previous = current
+    return previous[-1]
+
+def cer(text, truth):
+    # Character error rate: edit distance over the length of the truth.
+    text, truth = _normalize(text), _normalize(truth)
+    if not truth:
+        return 0.0 if not text else 1.0
+    return levenshtein(text, truth) / len(truth)
+
+def _crop(pix, rect, zoom):
+    # Cut the body region out of an existing render instead of rendering the page again.
+    gray = pixmap_array(pix)
+    x0, y0 = max(0, int(rect.x0 * zoom)), max(0, int(rect.y0 * zoom))
+    x1, y1 = min(pix.width, int(rect.x1 * zoom)), min(pix.height, int(rect.y1 * zoom))
+    samples = gray[y0:y1, x0:x1].tobytes()
+    del gray
+    cropped = fitz.Pixmap(fitz.csGRAY, x1 - x0, y1 - y0, samples, False)
+    cropped.set_dpi(pix.xres, pix.yres)
+    return cropped
+
+# Documents stay open in each worker process for all the tasks it is handed.
+_docs = {}
+
+def _sweep_task(pdf_path, page_index, zoom, truth, combos, engine_name, tesseract_cmd):
+    # One render at `zoom`, every (psm, lang, preprocess) combination on it.
+    if pdf_path not in _docs:
+        _docs[pdf_path] = fitz.open(pdf_path)
+    page = _docs[pdf_path].load_page(page_index)
+    start = time.perf_counter()
+    pix = render_page(page, zoom)
+    render_seconds = time.perf_counter() - start
+
+    variants = {}
+    for pre in dict.fromkeys(pre for _, _, pre in combos):
+        start = time.perf_counter()
+        crop, steps = parse_variant(pre)
+        image = pix
+        if crop:
+            preview = render_preview(page)
+            gray = pixmap_array(preview)
+            body, _ = find_body_region(gray)
+            del gray
+            image = _crop(pix, body, zoom) if body else pix
+        if steps:
+            image, _ = preprocess(image, steps)
+        variants[pre] = (image, time.perf_counter() - start)
+
+    rows = []
+    for psm, lang, pre in combos:
+        image, pre_seconds = variants[pre]
+        engine = get_engine(engine_name, lang, psm, tesseract_cmd)
+        start = time.perf_counter()
+        try:
+            text = engine.recognize(image)
+        except Exception as e:
+            print(f"OCR Error on {os.path.basename(pdf_path)} page {page_index+1} (psm {psm}, {lang}): {e}")
+            text = ""
+        ocr_seconds = time.perf_counter() - start
+        rows.append({
+            "config": {"zoom": zoom, "psm": psm, "lang": lang, "preprocess": pre},
+            # The render is shared by every combination, but each one would pay for it on its own.
+            "seconds": render_seconds + pre_seconds + ocr_seconds,
+            "cer": cer(text, truth),
+        })
+    return rows
+
+def sample_pages(truth, sample, rng):
+    pages = sorted(truth)
+    if sample and len(pages) > sample:
+        pages = sorted(rng.sample(pages, sample))
+    return pages
+
+def rank(rows, target_cer=None):
+    # Aggregate per config, sort by accuracy, and mark the speed/accuracy Pareto front
+    # (no other config is both faster and more accurate).
+    totals = {}
+    for row in rows:
+        key = json.dumps(row["config"], sort_keys=True)
+        entry = totals.setdefault(key, {"config": row["config"], "pages": 0, "seconds": 0.0, "cer": 0.0})
+        entry["pages"] += 1
+        entry["seconds"] += row["seconds"]
+        entry["cer"] += row["cer"]
+    table = []
+    for entry in totals.values():
+        table.append({
+            "config": entry["config"],
+            "pages": entry["pages"],
+            "ms_per_page": round(entry["seconds"] * 1000 / entry["pages"], 1),
+            "cer": round(entry["cer"] / entry["pages"], 4),
+        })
+    for entry in table:
+        entry["pareto"] = not any(o["ms_per_page"] <= entry["ms_per_page"] and o["cer"] <= entry["cer"]
+                                  and (o["ms_per_page"], o["cer"]) != (entry["ms_per_page"], entry["cer"])
+                                  for o in table)
+    table.sort(key=lambda e: (e["cer"], e["ms_per_page"]))
+    best = None
+    if target_cer is not None:
+        meeting = [e for e in table if e["cer"] <= target_cer]
+        best = min(meeting, key=lambda e: e["ms_per_page"]) if meeting else None
+    return table, best
+
+def _list(value, cast=str):
+    return [cast(v) for v in value.split(",") if v]
+
+def _number(value):
+    value = float(value)
+    return int(value) if value.is_integer() else value
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Sweep OCR settings and rank them by speed and accuracy.")
+    parser.add_argument("pdfs", nargs="+")
+    parser.add_argument("--zoom", default="2,3,4", help="comma-separated zoom levels")
+    parser.add_argument("--psm", default="5,6", help="comma-separated page segmentation modes")
+    parser.add_argument("--lang", default="jpn_vert", help="comma-separated tesseract languages")
+    parser.add_argument("--preprocess", default="none",
+                        help="comma-separated variants, each steps joined with '+': " + ", ".join(PREPROCESS))
+    parser.add_argument("--engine", default="pytesseract")
+    parser.add_argument("--tesseract-cmd", help="path to the tesseract executable")
+    parser.add_argument("--truth-dir", help="directory with <name>_truth.txt files (default: next to the PDFs)")
+    parser.add_argument("--text-layer-truth", action="store_true", help="use each page's text layer as the truth")
+    parser.add_argument("--sample", type=int, default=5, help="pages sampled per PDF (0: all pages with a truth)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("-j", "--jobs", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--target-cer", type=float, help="report the fastest config at or below this error rate")
+    parser.add_argument("--output", help="write the ranked table as JSON")
+    args = parser.parse_args(argv)
+
+    zooms = _list(args.zoom, _number)
+    preprocess = _list(args.preprocess)
+    for pre in preprocess:
+        try:
+            parse_variant(pre)
+        except ValueError:
+            parser.error(f"unknown preprocessing '{pre}' (combine with '+' from {', '.join(PREPROCESS)})")
+    if args.engine not in available_engines():
+        parser.error(f"OCR engine '{args.engine}' is not available")
+    combos = list(itertools.product(_list(args.psm, int), _list(args.lang), preprocess))
+
+    rng = random.Random(args.seed)
+    tasks = []
+    for pdf_path in args.pdfs:
+        stem = os.path.splitext(os.path.basename(pdf_path))[0]
+        if args.text_layer_truth:
+            with fitz.open(pdf_path) as doc:
+                truth = {i: text for i, text in ((i, extract_text_layer(page)) for i, page in enumerate(doc)) if text}
+        else:
+            truth_path = os.path.join(args.truth_dir or os.path.dirname(pdf_path), stem + "_truth.txt")
+            if not os.path.exists(truth_path):
+                print(f"Skipping {pdf_path}: no ground truth ({truth_path}).")
+                continue
+            truth = read_truth(truth_path)
+        for page_index in sample_pages(truth, args.sample, rng):
+            for zoom in zooms:
+                tasks.append((pdf_path, page_index, zoom, truth[page_index], combos, args.engine, args.tesseract_cmd))
+    if not tasks:
+        print("Nothing to sweep: no pages with ground truth.")
+        return 1
+
+    print(f"Sweeping {len(zooms) * len(combos)} configs over {len(tasks) // len(zooms)} pages with {args.jobs} jobs.")
+    rows = []
+    with ProcessPoolExecutor(max_workers=max(1, args.jobs)) as executor:
+        futures = [executor.submit(_sweep_task, *task) for task in tasks]
+        for done, future in enumerate(as_completed(futures), 1):
+            rows.extend(future.result())
+            print(f"  {done}/{len(tasks)} renders done")
+
+    table, best = rank(rows, args.target_cer)
+    print(f"\n{'zoom':>5} {'psm':>4} {'lang':12} {'preprocess':20} {'ms/page':>9} {'CER':>7}")
+    for entry in table:
+        c = entry["config"]
+        mark = " *" if entry["pareto"] else ""
+        print(f"{c['zoom']:>5} {c['psm']:>4} {c['lang']:12} {c['preprocess']:20} "
+              f"{entry['ms_per_page']:9.1f} {entry['cer']:7.4f}{mark}")
+    print("* = Pareto front (nothing else is both faster and more accurate)")
+    if args.target_cer is not None:
+        if best:
+            print(f"Fastest config with CER <= {args.target_cer}: {best['config']} ({best['ms_per_page']} ms/page)")
+        else:
+            print(f"No config reached CER <= {args.target_cer}.")
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump({"results": table, "best": best}, f, ensure_ascii=False, indent=2)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,160 @@
+import unicodedata
+import fitz  # PyMuPDF
+
+# Reuse of an existing text layer (born-digital PDFs or PDFs that were OCR'd before).
+# extract_text_layer() returns the page text in reading order, or None when the layer is
+# missing or looks unusable, in which case the page has to be rendered and OCR'd.
+
+# Below this many non-space characters the page is treated as image-only
+# (a stray page number or a watermark is not a text layer).
+MIN_CHARS = 20
+# Share of garbage characters (U+FFFD, private use, control codes) that disqualifies a layer;
+# fonts without a ToUnicode map typically extract as one of these.
+MAX_BAD_RATIO = 0.05
+# A page whose images cover this share of it is a scan. Its text layer must then span at least
+# MIN_COVERAGE of the scanned area: a date stamp, a file name or a watermark typed onto a scan
+# has plenty of characters but is not the body text.
+SCAN_IMAGE_RATIO = 0.5
+MIN_COVERAGE = 0.25
+
+# rawdict without TEXT_PRESERVE_IMAGES: by default every image on the page is decoded too, which
+# on a scanned page costs far more than the text layer check saves.
+_RAWDICT_FLAGS = fitz.TEXTFLAGS_RAWDICT & ~fitz.TEXT_PRESERVE_IMAGES
+
+def _is_bad_char(ch):
+    if ch == "\ufffd":
+        return True
+    category = unicodedata.category(ch)
+    if category == "Co":  # private use
+        return True
+    return category == "Cc" and ch not in "\n\t"
+
+def is_usable(text, min_chars=MIN_CHARS):
+    chars = [ch for ch in text if not ch.isspace()]
+    if len(chars) < min_chars:
+        return False
+    bad = sum(1 for ch in chars if _is_bad_char(ch))
+    return bad <= len(chars) * MAX_BAD_RATIO
+
+def _lines(page):
+    # PyMuPDF's lines, each a list of its visible characters with their boxes and whether the
+    # line is written top-to-bottom. Producers that place each character on its own give
+    # one-character lines, which is why the reading order is rebuilt per glyph.
+    lines = []
+    for block in page.get_text("rawdict", flags=_RAWDICT_FLAGS)["blocks"]:
+        for line in block.get("lines", []):
+            dx, dy = line["dir"]
+            vertical = abs(dy) > abs(dx)
+            glyphs = [(char["c"], char["bbox"], vertical) for span in line["spans"] for char in span["chars"]
+                      if not char["c"].isspace()]
+            if glyphs:
+                lines.append(glyphs)
+    return lines
+
+def _is_horizontal_line(line):
+    # A real horizontal line (a running head, a page number with several digits): glyphs side by
+    # side on one row. PyMuPDF also merges one-character placements of neighbouring vertical
+    # columns into "lines"; their glyphs are a column gap apart.
+    if len(line) < 2 or line[0][2]:
+        return False
+    for (_, a, _), (_, b, _) in zip(line, line[1:]):
+        size = max(a[3] - a[1], 1)
+        if abs((a[1] + a[3]) - (b[1] + b[3])) > size or not -size / 2 <= b[0] - a[2] < size / 2:
+            return False
+    return True
+
+def _body_rows(glyphs):
+    # (top, bottom) of the body: glyph centres split into bands at gaps of two glyph heights,
+    # and the band with the most glyphs wins. A page number or a one-glyph head is a band of its own.
+    heights = sorted(b[3] - b[1] for _, b, _ in glyphs)
+    gap = 2 * max(heights[len(heights) // 2], 1)
+    centers = sorted((b[1] + b[3]) / 2 for _, b, _ in glyphs)
+    bands = [[centers[0]]]
+    for y in centers[1:]:
+        if y - bands[-1][-1] > gap:
+            bands.append([])
+        bands[-1].append(y)
+    band = max(bands, key=len)
+    return band[0], band[-1]
+
+def _row_text(glyphs):
+    # Margin glyphs as horizontal lines: rows top to bottom, each left to right.
+    rows = []
+    for ch, bbox, _ in sorted(glyphs, key=lambda g: (g[1][1] + g[1][3]) / 2):
+        center = (bbox[1] + bbox[3]) / 2
+        if rows and center - rows[-1]["center"] < max(bbox[3] - bbox[1], 1) / 2:
+            rows[-1]["glyphs"].append((bbox[0], ch))
+        else:
+            rows.append({"center": center, "glyphs": [(bbox[0], ch)]})
+    return ["".join(ch for _, ch in sorted(row["glyphs"])) for row in rows]
+
+def _area(rect):
+    return max(rect[2] - rect[0], 0) * max(rect[3] - rect[1], 0)
+
+def _covers_scan(page, lines):
+    # False when the page is a scan and the glyphs sit in a small part of it. get_image_info
+    # reads the image placements without decoding the images.
+    page_area = _area(page.rect) or 1
+    images = [info["bbox"] for info in page.get_image_info()]
+    image_area = sum(_area(bbox) for bbox in images)
+    if image_area < page_area * SCAN_IMAGE_RATIO:
+        return True
+    boxes = [bbox for line in lines for _, bbox, _ in line]
+    extent = (min(b[0] for b in boxes), min(b[1] for b in boxes), max(b[2] for b in boxes), max(b[3] for b in boxes))
+    return _area(extent) >= min(image_area, page_area) * MIN_COVERAGE
+
+def _is_vertical(glyphs):
+    if sum(1 for _, _, vertical in glyphs if vertical) * 2 > len(glyphs):
+        return True
+    # Otherwise decide from geometry: do neighbouring glyphs stack downwards (vertical)
+    # or run to the right (horizontal)?
+    down = right = 0
+    by_column = sorted(glyphs, key=lambda g: (round((g[1][0] + g[1][2]) / 2), g[1][1]))
+    for (_, a, _), (_, b, _) in zip(by_column, by_column[1:]):
+        size = max(a[3] - a[1], 1)
+        if abs((a[0] + a[2]) - (b[0] + b[2])) < size and -size / 2 <= b[1] - a[3] < size:
+            down += 1
+    by_row = sorted(glyphs, key=lambda g: (round((g[1][1] + g[1][3]) / 2), g[1][0]))
+    for (_, a, _), (_, b, _) in zip(by_row, by_row[1:]):
+        size = max(a[2] - a[0], 1)
+        if abs((a[1] + a[3]) - (b[1] + b[3])) < size and -size / 2 <= b[0] - a[2] < size:
+            right += 1
+    return down > right
+
+def _vertical_order(lines):
+    # Japanese vertical text: columns from right to left, each column top to bottom. Horizontal
+    # lines and glyphs above or below the body (running heads, the nombre) are not part of the
+    # columns; they come out as lines of their own before or after the body.
+    margin, body = [], []
+    for line in lines:
+        (margin if _is_horizontal_line(line) else body).extend(line)
+    if body:
+        top, bottom = _body_rows(body)
+        margin += [g for g in body if not top <= (g[1][1] + g[1][3]) / 2 <= bottom]
+        glyphs = [g for g in body if top <= (g[1][1] + g[1][3]) / 2 <= bottom]
+    else:
+        top = bottom = 0
+        glyphs = []
+    above = _row_text([g for g in margin if (g[1][1] + g[1][3]) / 2 < top])
+    below = _row_text([g for g in margin if (g[1][1] + g[1][3]) / 2 >= top])
+    columns = []
+    for ch, bbox, _ in sorted(glyphs, key=lambda g: -(g[1][0] + g[1][2])):
+        center = (bbox[0] + bbox[2]) / 2
+        width = max(bbox[2] - bbox[0], 1)
+        if columns and abs(columns[-1]["center"] - center) < width / 2:
+            columns[-1]["glyphs"].append((bbox[1], ch))
+        else:
+            columns.append({"center": center, "glyphs": [(bbox[1], ch)]})
+    return "\n".join(above + ["".join(ch for _, ch in sorted(col["glyphs"])) for col in columns] + below) + "\n"
+
+def extract_text_layer(page, min_chars=MIN_CHARS):
+    lines = _lines(page)
+    if not lines or not _covers_scan(page, lines):
+        return None
+    if _is_vertical([g for line in lines for g in line]):
+        text = _vertical_order(lines)
+    else:
+        text = page.get_text("text", sort=True)
+    if not is_usable(text, min_chars):
+        return None
+    return text
@@ -0,0 +1,230 @@
+import sys
+import os
+import json
+import time
+import shutil
+import argparse
+import tempfile
+import itertools
+from concurrent.futures import ProcessPoolExecutor
+import fitz  # PyMuPDF
+
+# Calibrates page workers x Tesseract threads (OMP_THREAD_LIMIT) x zoom on this machine.
+#   python ocr_tune.py scans/*.pdf                  # sample 16 pages from these PDFs
+#   python ocr_tune.py --workers 1,2,4 --threads 1,2 --zoom 3
+#   python ocr_tune.py --zoom 2,3,4 --save-zoom --target-cer 0.02
+# Tesseract runs an OpenMP pool with a thread per core in every process, so N page workers
+# each with their own pool oversubscribe the CPU and can be slower than fewer workers. Every
+# combination OCRs the same sample pages in a fresh process and is scored by pages/sec; the
+# fastest is saved to config.json, where the GUI and ocr_batch / ocr_watch / ocr_service pick it
+# up as their defaults. Without PDFs, the sample comes from bench_suite's generated corpus.
+# Zoom trades accuracy for speed, so the fastest zoom is only saved with --save-zoom, and a zoom
+# below the configured one only wins when its text stays within --target-cer of the text at the
+# configured zoom (character error rate, as in ocr_sweep).
+
+CONFIG_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "config.json")
+
+def load_config(path=CONFIG_PATH):
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+def load_tuned(path=CONFIG_PATH):
+    # {"workers", "tesseract_threads", "zoom", ...} from the last calibration, or {}. A result
+    # from a machine with a different core count (a copied config) doesn't apply here.
+    tuned = load_config(path).get("tuned")
+    if not isinstance(tuned, dict) or tuned.get("cpus") != (os.cpu_count() or 1):
+        return {}
+    return tuned
+
+def configured_zoom(path=CONFIG_PATH):
+    # The zoom the GUI (or an earlier --save-zoom) uses; the GUI's zoom is a whole number.
+    try:
+        zoom = float(load_config(path).get("zoom", 3))
+    except (TypeError, ValueError):
+        return 3
+    return int(zoom) if zoom.is_integer() else zoom
+
+def save_tuned(tuned, path=CONFIG_PATH):
+    # The GUI's own keys are updated too, so its spin boxes start from the tuned values. Zoom is
+    # only in `tuned` when it was tuned on purpose (--save-zoom).
+    config = load_config(path)
+    config["tuned"] = tuned
+    config["workers"] = tuned["workers"]
+    config["tesseract_threads"] = tuned["tesseract_threads"]
+    if "zoom" in tuned:
+        config["zoom"] = tuned["zoom"]
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(config, f, ensure_ascii=False, indent=4)
+
+def _list(value, cast=int):
+    return [cast(v) for v in value.split(",") if v.strip()]
+
+def _powers_of_two(limit):
+    values = [1]
+    while values[-1] * 2 <= limit:
+        values.append(values[-1] * 2)
+    if values[-1] != limit:
+        values.append(limit)
+    return values
+
+def candidates(cpus, workers=None, threads=None, zooms=(3,)):
+    # (workers, threads, zoom) to measure. Unless both lists are given, workers x threads stays
+    # within the cores: combinations beyond that are the oversubscription this is meant to avoid.
+    explicit = bool(workers and threads)
+    workers = workers or _powers_of_two(cpus)
+    threads = threads or [t for t in (1, 2, 4) if t <= cpus]
+    combos = [(w, t, z) for z, w, t in itertools.product(zooms, workers, threads) if explicit or w * t <= cpus]
+    return combos or [(1, 1, z) for z in zooms]
+
+def sample_pages(pdf_paths, pages, out_path):
+    # Evenly spaced pages from all the PDFs, copied into one sample PDF.
+    counts = []
+    for pdf_path in pdf_paths:
+        with fitz.open(pdf_path) as doc:
+            counts.append(len(doc))
+    everything = [(path, i) for path, count in zip(pdf_paths, counts) for i in range(count)]
+    if not everything:
+        raise ValueError("no pages to sample")
+    step = max(1, len(everything) / pages)
+    picked = [everything[int(n * step)] for n in range(min(pages, len(everything)))]
+    sample = fitz.open()
+    for path, i in picked:
+        with fitz.open(path) as doc:
+            sample.insert_pdf(doc, from_page=i, to_page=i)
+    sample.save(out_path)
+    sample.close()
+    return len(picked)
+
+def run_combo(sample_path, options, workers, threads, zoom):
+    # Runs in its own process, so OMP_THREAD_LIMIT and the engine cache start fresh.
+    # Returns (pages OCR'd, seconds, {page index: text}).
+    from ocr_script import ocr_pdf
+    from ocr_sweep import read_truth
+    with tempfile.TemporaryDirectory() as out_dir:
+        start = time.perf_counter()
+        stats = ocr_pdf(sample_path, output_dir=out_dir, zoom=zoom, workers=workers, tesseract_threads=threads,
+                        use_text_layer=False, **options)
+        elapsed = time.perf_counter() - start
+        texts = read_truth(stats["output"])
+    return len(stats["ocr"]), elapsed, texts
+
+def sample_cer(texts, reference):
+    # Character error rate of a whole sample against the text OCR'd at the reference zoom.
+    from ocr_sweep import _normalize, levenshtein
+    errors = total = 0
+    for index, truth in reference.items():
+        truth = _normalize(truth)
+        errors += levenshtein(_normalize(texts.get(index, "")), truth)
+        total += len(truth)
+    return errors / total if total else 0.0
+
+def _measure(sample_path, options, workers, threads, zoom):
+    with ProcessPoolExecutor(max_workers=1) as executor:
+        return executor.submit(run_combo, sample_path, options, workers, threads, zoom).result()
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Find the fastest workers x Tesseract threads x zoom for this machine.")
+    parser.add_argument("pdfs", nargs="*", help="PDFs to sample pages from (default: a generated corpus)")
+    parser.add_argument("--pages", type=int, default=16, help="sample pages OCR'd per combination")
+    parser.add_argument("--workers", help="page worker counts to try, e.g. 1,2,4 (default: powers of two up to the cores)")
+    parser.add_argument("--threads", help="OMP_THREAD_LIMIT values to try, e.g. 1,2,4")
+    parser.add_argument("--zoom", default="3", help="zooms to try, e.g. 2,3")
+    parser.add_argument("--save-zoom", action="store_true",
+                        help="also save the fastest zoom (whole numbers only; by default zoom is left as configured)")
+    parser.add_argument("--target-cer", type=float,
+                        help="let a zoom below the configured one win if its character error rate against the "
+                             "configured zoom's text is at most this (e.g. 0.02)")
+    parser.add_argument("--repeat", type=int, default=1, help="runs per combination; the fastest counts")
+    parser.add_argument("--psm", type=int, default=5)
+    parser.add_argument("--lang", default="jpn_vert")
+    parser.add_argument("--engine", default="pytesseract")
+    parser.add_argument("--tesseract-cmd", help="path to the tesseract executable")
+    parser.add_argument("--batch-size", type=int, default=1, help="pages per tesseract run (see ocr_batch)")
+    parser.add_argument("--config", default=CONFIG_PATH, help="config file to store the result in")
+    parser.add_argument("--no-save", action="store_true", help="only print the results")
+    args = parser.parse_args(argv)
+
+    from ocr_batch import _number
+    cpus = os.cpu_count() or 1
+    zooms = [_number(z) for z in _list(args.zoom, float)]
+    if args.save_zoom and any(not isinstance(z, int) for z in zooms):
+        parser.error("--save-zoom needs whole-number zooms (the GUI's Zoom is a whole number)")
+    reference_zoom = configured_zoom(args.config)
+    if any(z < reference_zoom for z in zooms) and args.target_cer is not None and reference_zoom not in zooms:
+        # The lower zooms are compared against the configured zoom's text.
+        zooms.append(reference_zoom)
+    combos = candidates(cpus, _list(args.workers) if args.workers else None,
+                        _list(args.threads) if args.threads else None, zooms)
+    options = {"psm": args.psm, "lang": args.lang, "engine": args.engine, "tesseract_cmd": args.tesseract_cmd,
+               "batch_size": args.batch_size}
+
+    work_dir = tempfile.mkdtemp(prefix="glassocr_tune_")
+    try:
+        pdf_paths = args.pdfs
+        if not pdf_paths:
+            from bench_suite import make_corpus
+            pdf_paths = make_corpus(work_dir, 6)
+        sample_path = os.path.join(work_dir, "sample.pdf")
+        pages = sample_pages(pdf_paths, args.pages, sample_path)
+        print(f"{len(combos)} combinations on {pages} sample pages, {cpus} CPUs.")
+        # One untimed run first, so the first combination doesn't pay for cold disk caches.
+        _measure(sample_path, options, 1, 1, combos[0][2])
+        results = []
+        texts_by_zoom = {}
+        for workers, threads, zoom in combos:
+            best = None
+            for _ in range(max(1, args.repeat)):
+                ocr_pages, elapsed, texts = _measure(sample_path, options, workers, threads, zoom)
+                if best is None or elapsed < best:
+                    best = elapsed
+            if not ocr_pages:
+                print("No page was OCR'd (all blank?); nothing to compare.")
+                return 1
+            texts_by_zoom.setdefault(zoom, texts)
+            rate = ocr_pages / best
+            results.append({"workers": workers, "tesseract_threads": threads, "zoom": zoom,
+                            "pages_per_sec": round(rate, 3)})
+            print(f"  workers {workers:>2}  threads {threads:>2}  zoom {zoom:>4}  {rate:8.2f} pages/sec")
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    # Lower zooms are faster but may read worse: without an accuracy check they can't win.
+    reference = texts_by_zoom.get(reference_zoom)
+    for result in results:
+        if result["zoom"] >= reference_zoom:
+            result["eligible"] = True
+        elif args.target_cer is None or reference is None:
+            result["eligible"] = False
+        else:
+            result["cer"] = round(sample_cer(texts_by_zoom[result["zoom"]], reference), 4)
+            result["eligible"] = result["cer"] <= args.target_cer
+    eligible = [r for r in results if r["eligible"]]
+    if not eligible:
+        print(f"Every zoom tried is below the configured zoom {reference_zoom}; pass --target-cer to allow "
+              f"a lower zoom, or include {reference_zoom} in --zoom.")
+        return 1
+    skipped = sorted({r["zoom"] for r in results if not r["eligible"]})
+    if skipped:
+        print(f"Not choosing zoom {', '.join(map(str, skipped))}: below the configured zoom {reference_zoom}"
+              + (f" and over --target-cer {args.target_cer}." if args.target_cer is not None else
+                 " (pass --target-cer to allow it if accurate enough)."))
+    best = max(eligible, key=lambda r: r["pages_per_sec"])
+    print(f"Fastest: {best['workers']} workers x {best['tesseract_threads']} Tesseract threads at zoom {best['zoom']} "
+          f"({best['pages_per_sec']:.2f} pages/sec)")
+    if args.no_save:
+        return 0
+    tuned = dict(best, cpus=cpus, engine=args.engine, created=time.strftime("%Y-%m-%dT%H:%M:%S"), results=results)
+    del tuned["eligible"]
+    tuned.pop("cer", None)
+    if not args.save_zoom:
+        # Measured at this zoom, but the configured zoom stays.
+        tuned["measured_zoom"] = tuned.pop("zoom")
+    save_tuned(tuned, args.config)
+    print(f"Saved to {args.config}")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
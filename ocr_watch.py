@@ -0,0 +1,338 @@
+import sys
+import os
+import time
+import errno
+import select
+import struct
+import fnmatch
+import ctypes
+import ctypes.util
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from ocr_batch import add_ocr_arguments, job_options, find_pdfs, _run_job
+from ocr_manifest import Manifest
+from ocr_index import SearchIndex
+from ocr_metrics import JsonlEventWriter, PrometheusMetrics, fan_out
+
+# Watch-folder mode: a long-running process that OCRs PDFs as they arrive in a folder.
+#   python ocr_watch.py /srv/scans -r -o /srv/ocr --jobs 2
+# On Linux, inotify (through ctypes, no extra packages) reports new and changed files; elsewhere,
+# or with --poll (needed for network mounts, where inotify sees no remote changes), each watched
+# folder is only listed again when its mtime changes. The folder is listed once at start-up to
+# pick up files that arrived while the watcher was down, never afterwards.
+# A file is handed to the job pool once its size and mtime have not changed for --settle seconds,
+# so half-copied scans are not read. Finished documents go into the processing manifest like
+# ocr_batch's, so a restart, or the GUI on the same folder, skips them.
+
+IN_MODIFY = 0x00000002
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE_SELF = 0x00000400
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ISDIR = 0x40000000
+WATCH_MASK = IN_MODIFY | IN_CLOSE_WRITE | IN_MOVED_TO | IN_CREATE | IN_DELETE_SELF
+
+_EVENT = struct.Struct("iIII")
+
+def _matches(name, patterns):
+    return any(fnmatch.fnmatch(name.lower(), pattern.lower()) for pattern in patterns)
+
+def _list_dir(directory):
+    # (files, subdirectories) in one directory; a folder that vanished is empty.
+    files, dirs = [], []
+    try:
+        with os.scandir(directory) as entries:
+            for entry in entries:
+                try:
+                    (dirs if entry.is_dir() else files).append(entry.path)
+                except OSError:
+                    pass
+    except OSError:
+        pass
+    return files, dirs
+
+class InotifyWatcher:
+    def __init__(self, recursive, patterns):
+        self.recursive = recursive
+        self.patterns = patterns
+        self.libc = ctypes.CDLL(ctypes.util.find_library("c"), use_errno=True)
+        self.fd = self.libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+        self.dirs = {}
+
+    def add(self, directory):
+        # Returns the matching files already in the directory (and its subdirectories), which a
+        # new folder moved into the share may bring with it.
+        wd = self.libc.inotify_add_watch(self.fd, os.fsencode(directory), WATCH_MASK)
+        if wd < 0:
+            err = ctypes.get_errno()
+            if err == errno.ENOSPC:
+                print(f"Cannot watch {directory}: inotify watch limit reached "
+                      "(raise fs.inotify.max_user_watches or use --poll)")
+            return []
+        self.dirs[wd] = directory
+        files, dirs = _list_dir(directory)
+        found = [path for path in files if _matches(os.path.basename(path), self.patterns)]
+        if self.recursive:
+            for subdir in dirs:
+                found += self.add(subdir)
+        return found
+
+    def poll(self, timeout):
+        # Paths of matching files that were created, written or moved in.
+        readable, _, _ = select.select([self.fd], [], [], timeout)
+        if not readable:
+            return []
+        try:
+            data = os.read(self.fd, 64 * 1024)
+        except BlockingIOError:
+            return []
+        changed = []
+        offset = 0
+        while offset < len(data):
+            wd, mask, _, length = _EVENT.unpack_from(data, offset)
+            name = os.fsdecode(data[offset + _EVENT.size:offset + _EVENT.size + length].rstrip(b"\0"))
+            offset += _EVENT.size + length
+            if mask & IN_Q_OVERFLOW:
+                # The kernel dropped events: list every watched folder once to catch up.
+                print("inotify queue overflowed; listing the watched folders again.")
+                for directory in list(self.dirs.values()):
+                    files, _ = _list_dir(directory)
+                    changed += [path for path in files if _matches(os.path.basename(path), self.patterns)]
+                continue
+            if mask & IN_IGNORED:
+                self.dirs.pop(wd, None)
+                continue
+            directory = self.dirs.get(wd)
+            if directory is None or not name:
+                continue
+            path = os.path.join(directory, name)
+            if mask & IN_ISDIR:
+                if self.recursive and mask & (IN_CREATE | IN_MOVED_TO):
+                    changed += self.add(path)
+            elif _matches(name, self.patterns):
+                changed.append(path)
+        return changed
+
+    def close(self):
+        os.close(self.fd)
+
+class PollingWatcher:
+    def __init__(self, recursive, patterns, interval=2.0):
+        self.recursive = recursive
+        self.patterns = patterns
+        self.interval = interval
+        # directory -> (mtime, names seen)
+        self.dirs = {}
+
+    def add(self, directory):
+        files, dirs = _list_dir(directory)
+        try:
+            mtime = os.stat(directory).st_mtime
+        except OSError:
+            return []
+        self.dirs[directory] = (mtime, set(files) | set(dirs))
+        found = [path for path in files if _matches(os.path.basename(path), self.patterns)]
+        if self.recursive:
+            for subdir in dirs:
+                found += self.add(subdir)
+        return found
+
+    def poll(self, timeout):
+        time.sleep(min(timeout, self.interval))
+        changed = []
+        now = time.time()
+        for directory, (mtime, seen) in list(self.dirs.items()):
+            try:
+                current = os.stat(directory).st_mtime
+            except OSError:
+                del self.dirs[directory]
+                continue
+            # Some file systems (FAT, many SMB servers) keep mtimes in whole or even seconds, so a
+            # folder changed within the last few seconds is listed again regardless.
+            if current == mtime and now - current > 3:
+                continue
+            files, dirs = _list_dir(directory)
+            self.dirs[directory] = (current, set(files) | set(dirs))
+            changed += [path for path in files if path not in seen and _matches(os.path.basename(path), self.patterns)]
+            if self.recursive:
+                for subdir in dirs:
+                    if subdir not in seen:
+                        changed += self.add(subdir)
+        return changed
+
+    def close(self):
+        pass
+
+def make_watcher(recursive, patterns, poll=False, interval=2.0):
+    if not poll and sys.platform.startswith("linux"):
+        try:
+            return InotifyWatcher(recursive, patterns)
+        except (OSError, AttributeError) as e:
+            print(f"inotify unavailable ({e}); polling every {interval:g}s instead.")
+    return PollingWatcher(recursive, patterns, interval)
+
+def _pdf_complete(path):
+    # A PDF ends with its trailer; a copy that stalled mid-way doesn't have one yet.
+    try:
+        with open(path, "rb") as f:
+            f.seek(max(0, os.path.getsize(path) - 1024))
+            return b"%%EOF" in f.read()
+    except OSError:
+        return False
+
+class SettleTracker:
+    # Files whose size and mtime have stopped changing for `settle` seconds (and, for PDFs, that
+    # end in a trailer) are ready. Scanners and SMB copies write in bursts, so "closed after
+    # writing" alone is not enough.
+    def __init__(self, settle):
+        self.settle = settle
+        self.pending = {}
+
+    def touch(self, path):
+        self.pending[path] = (None, time.monotonic())
+
+    def ready(self):
+        now = time.monotonic()
+        done = []
+        for path, (signature, since) in list(self.pending.items()):
+            try:
+                st = os.stat(path)
+            except OSError:
+                # Deleted or renamed away before it settled; a rename shows up as a new path.
+                del self.pending[path]
+                continue
+            current = (st.st_size, st.st_mtime_ns)
+            if current != signature:
+                self.pending[path] = (current, now)
+            elif st.st_size > 0 and now - since >= self.settle and (
+                    not path.lower().endswith(".pdf") or _pdf_complete(path)):
+                del self.pending[path]
+                done.append(path)
+        return done
+
+def _output_dir(path, roots, output_dir):
+    # Mirrors the folder structure under the watched root, like ocr_batch.
+    for root in roots:
+        rel = os.path.relpath(os.path.dirname(path), root)
+        if not rel.startswith(os.pardir):
+            return os.path.normpath(os.path.join(output_dir, rel))
+    return output_dir
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="Watch folders and OCR new PDFs as they arrive.")
+    parser.add_argument("paths", nargs="+", help="directories to watch")
+    parser.add_argument("-r", "--recursive", action="store_true", help="watch subdirectories too")
+    parser.add_argument("-g", "--glob", action="append", dest="patterns",
+                        help="file name pattern to include (repeatable, default: *.pdf)")
+    parser.add_argument("-o", "--output-dir", default=os.getcwd(), help="where *_output.txt files go")
+    parser.add_argument("-j", "--jobs", type=int, default=1, help="PDFs processed concurrently")
+    add_ocr_arguments(parser)
+    parser.add_argument("--settle", type=float, default=2.0,
+                        help="seconds a file's size must stay unchanged before it is processed")
+    parser.add_argument("--poll", action="store_true", help="poll instead of using inotify (network mounts)")
+    parser.add_argument("--interval", type=float, default=2.0, help="polling interval in seconds")
+    parser.add_argument("--manifest", default="processed_manifest.sqlite", help="processing manifest database")
+    parser.add_argument("--index", help="add each finished document to this full-text search index (see ocr_index)")
+    parser.add_argument("--events", help="append per-page timing events to this JSONL file")
+    parser.add_argument("--metrics", help="write Prometheus metrics to this text file after every document")
+    return parser
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    patterns = args.patterns or ["*.pdf"]
+    roots = [os.path.abspath(path) for path in args.paths]
+    for root in roots:
+        if not os.path.isdir(root):
+            print(f"Error: {root} is not a directory")
+            return 2
+    try:
+        options, settings = job_options(args)
+    except ValueError as e:
+        print(f"Error: {e}")
+        return 2
+    manifest = Manifest(args.manifest)
+    index = SearchIndex(args.index) if args.index else None
+    events_writer = JsonlEventWriter(args.events) if args.events else None
+    metrics = PrometheusMetrics() if args.metrics else None
+    on_event = fan_out(events_writer, metrics)
+
+    watcher = make_watcher(args.recursive, patterns, args.poll, args.interval)
+    tracker = SettleTracker(args.settle)
+    # Watches are set up before the start-up listing, so nothing arriving in between is missed.
+    for root in roots:
+        watcher.add(root)
+    for pdf_path, _ in find_pdfs(roots, args.recursive, patterns):
+        tracker.touch(pdf_path)
+    print(f"Watching {', '.join(roots)} with {type(watcher).__name__} ({len(tracker.pending)} files found at start).")
+
+    # The pool's processes stay up between documents, so each new file starts without re-importing.
+    executor = ProcessPoolExecutor(max_workers=max(1, args.jobs))
+    running = {}
+
+    def submit(path):
+        # A job process that died (segfault, OOM kill) breaks the whole pool: its documents fail
+        # with BrokenProcessPool below, and the watcher carries on with a fresh pool.
+        nonlocal executor
+        job = (_run_job, path, _output_dir(path, roots, args.output_dir), options)
+        try:
+            return executor.submit(*job)
+        except BrokenProcessPool:
+            print("A job process died; starting a new pool.")
+            executor.shutdown(wait=False, cancel_futures=True)
+            executor = ProcessPoolExecutor(max_workers=max(1, args.jobs))
+            return executor.submit(*job)
+    try:
+        while True:
+            for path in watcher.poll(0.5):
+                if path not in running:
+                    tracker.touch(path)
+            for path in tracker.ready():
+                if path in running:
+                    continue
+                try:
+                    if manifest.is_done(path, settings):
+                        continue
+                    manifest.start(path, settings)
+                except OSError as e:
+                    print(f"Cannot read {path}: {e}")
+                    continue
+                print(f"Queued {path}")
+                running[path] = (time.time(), submit(path))
+            for path, (queued, future) in list(running.items()):
+                if not future.done():
+                    continue
+                del running[path]
+                try:
+                    stats, seconds, events = future.result()
+                except Exception as e:
+                    print(f"Error processing {path}: {e}")
+                    manifest.fail(path, settings, e)
+                    continue
+                for event in events:
+                    on_event(event)
+                if metrics:
+                    metrics.write(args.metrics)
+                manifest.finish(path, settings, pages=stats["pages"], output=stats["output"], seconds=seconds)
+                if index:
+                    index.add_stats(path, stats)
+                print(f"Successfully processed {path} ({stats['pages']} pages, {seconds:.1f}s, "
+                      f"{time.time() - queued:.1f}s after queueing)")
+    except KeyboardInterrupt:
+        print("Stopping; documents in progress are resumed from their journals next time.")
+    finally:
+        watcher.close()
+        executor.shutdown(wait=False, cancel_futures=True)
+        manifest.close()
+        if index:
+            index.close()
+        if events_writer:
+            events_writer.close()
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,269 @@
+import os
+import json
+import queue
+import threading
+from html import escape
+
+# Output formats for ocr_pdf. Each writer streams pages in page order to "<path>.tmp" and renames
+# it into place when the document is complete, so a crash never leaves a truncated file behind.
+#   text   *_output.txt       the original "--- Page N ---" format
+#   jsonl  *_pages.jsonl      one JSON object per page: text, source, confidence, word boxes
+#   hocr   *_output.hocr      hOCR (HTML) with ocr_carea / ocr_par / ocr_line / ocrx_word boxes
+#   alto   *_alto.xml         ALTO v4 with TextBlock / TextLine / String boxes
+# Word boxes are in PDF page coordinates (points, origin top-left), taken from the same
+# Tesseract call that produced the text. Text-layer and blank pages have no word boxes.
+
+class PageWriter:
+    suffix = None
+
+    def __init__(self, output_base):
+        self.path = output_base + self.suffix
+        self.temp_path = self.path + ".tmp"
+        self.file = open(self.temp_path, "w", encoding="utf-8")
+
+    def begin(self, info):
+        pass
+
+    def write_page(self, result):
+        raise NotImplementedError
+
+    def end(self):
+        pass
+
+    def finish(self):
+        self.end()
+        self.file.close()
+        os.replace(self.temp_path, self.path)
+
+    def abort(self):
+        self.file.close()
+        if os.path.exists(self.temp_path):
+            os.remove(self.temp_path)
+
+class TextWriter(PageWriter):
+    suffix = "_output.txt"
+
+    def write_page(self, result):
+        # OCR'd pages keep the plain separator; other sources are named in it.
+        f = self.file
+        if result["source"] == "ocr":
+            f.write(f"--- Page {result['page']+1} ---\n")
+        else:
+            f.write(f"--- Page {result['page']+1} ({result['source']}) ---\n")
+        for header in result.get("headers", []):
+            f.write(f"[header] {header}\n")
+        f.write(result["text"])
+        f.write("\n\n")
+
+class JsonlWriter(PageWriter):
+    suffix = "_pages.jsonl"
+
+    def write_page(self, result):
+        record = {
+            "page": result["page"] + 1,
+            "source": result["source"],
+            "width": result.get("width"),
+            "height": result.get("height"),
+            "text": result["text"],
+            "confidence": result.get("confidence"),
+            "headers": result.get("headers", []),
+            "words": result.get("words"),
+        }
+        self.file.write(json.dumps(record, ensure_ascii=False) + "\n")
+
+def _lines(result):
+    # [(block, par, line, [words])] in Tesseract's reading order.
+    lines = {}
+    for word in result.get("words") or []:
+        lines.setdefault((word["block"], word["par"], word["line"]), []).append(word)
+    return [key + (words,) for key, words in lines.items()]
+
+def _bbox(words):
+    x0 = min(w["left"] for w in words)
+    y0 = min(w["top"] for w in words)
+    x1 = max(w["left"] + w["width"] for w in words)
+    y1 = max(w["top"] + w["height"] for w in words)
+    return x0, y0, x1, y1
+
+class HocrWriter(PageWriter):
+    suffix = "_output.hocr"
+
+    def begin(self, info):
+        self.file.write(
+            '<?xml version="1.0" encoding="UTF-8"?>\n'
+            '<!DOCTYPE html PUBLIC "-//W3C//DTD XHTML 1.0 Transitional//EN"'
+            ' "http://www.w3.org/TR/xhtml1/DTD/xhtml1-transitional.dtd">\n'
+            '<html xmlns="http://www.w3.org/1999/xhtml" xml:lang="ja" lang="ja">\n<head>\n'
+            f'<title>{escape(info["pdf"])}</title>\n'
+            '<meta http-equiv="Content-Type" content="text/html;charset=utf-8" />\n'
+            '<meta name="ocr-system" content="GlassOCR" />\n'
+            '<meta name="ocr-capabilities" content="ocr_page ocr_carea ocr_par ocr_line ocrx_word" />\n'
+            '</head>\n<body>\n')
+
+    def write_page(self, result):
+        n = result["page"] + 1
+        width, height = result.get("width") or 0, result.get("height") or 0
+        title = f"bbox 0 0 {round(width)} {round(height)}; ppageno {n - 1}"
+        write = self.file.write
+        write(f'<div class="ocr_page" id="page_{n}" title="{title}">\n')
+        lines = _lines(result)
+        if not lines and result["text"].strip():
+            # Text layer: lines without geometry of their own.
+            write(f' <div class="ocr_carea" id="block_{n}_1" title="bbox 0 0 {round(width)} {round(height)}">\n')
+            for i, line in enumerate(result["text"].splitlines(), 1):
+                if line.strip():
+                    write(f'  <span class="ocr_line" id="line_{n}_{i}">{escape(line)}</span>\n')
+            write(' </div>\n')
+        block = par = None
+        for i, (b, p, l, words) in enumerate(lines, 1):
+            if b != block:
+                if block is not None:
+                    write('  </p>\n </div>\n')
+                block, par = b, None
+                box = _bbox([w for bb, _, _, ws in lines if bb == b for w in ws])
+                write(f' <div class="ocr_carea" id="block_{n}_{b}" title="bbox {_box_str(box)}">\n')
+            if p != par:
+                if par is not None:
+                    write('  </p>\n')
+                par = p
+                write(f'  <p class="ocr_par" id="par_{n}_{b}_{p}">\n')
+            write(f'   <span class="ocr_line" id="line_{n}_{i}" title="bbox {_box_str(_bbox(words))}">')
+            for j, w in enumerate(words, 1):
+                box = (w["left"], w["top"], w["left"] + w["width"], w["top"] + w["height"])
+                write(f'<span class="ocrx_word" id="word_{n}_{i}_{j}" '
+                      f'title="bbox {_box_str(box)}; x_wconf {round(w["conf"])}">{escape(w["text"])}</span>')
+            write('</span>\n')
+        if block is not None:
+            write('  </p>\n </div>\n')
+        write('</div>\n')
+
+    def end(self):
+        self.file.write('</body>\n</html>\n')
+
+def _box_str(box):
+    return " ".join(str(round(v)) for v in box)
+
+# ALTO measures in 1/1200 inch; PDF points are 1/72 inch.
+_ALTO_UNIT = 1200 / 72
+
+def _alto(value):
+    return round(value * _ALTO_UNIT)
+
+class AltoWriter(PageWriter):
+    suffix = "_alto.xml"
+
+    def begin(self, info):
+        self.file.write(
+            '<?xml version="1.0" encoding="UTF-8"?>\n'
+            '<alto xmlns="http://www.loc.gov/standards/alto/ns-v4#"'
+            ' xmlns:xsi="http://www.w3.org/2001/XMLSchema-instance"'
+            ' xsi:schemaLocation="http://www.loc.gov/standards/alto/ns-v4#'
+            ' http://www.loc.gov/standards/alto/v4/alto-4-2.xsd">\n'
+            '<Description>\n<MeasurementUnit>inch1200</MeasurementUnit>\n'
+            f'<sourceImageInformation><fileName>{escape(info["pdf"])}</fileName></sourceImageInformation>\n'
+            '</Description>\n<Layout>\n')
+
+    def write_page(self, result):
+        n = result["page"] + 1
+        width, height = _alto(result.get("width") or 0), _alto(result.get("height") or 0)
+        write = self.file.write
+        write(f'<Page ID="page_{n}" PHYSICAL_IMG_NR="{n}" WIDTH="{width}" HEIGHT="{height}">\n')
+        write(f'<PrintSpace HPOS="0" VPOS="0" WIDTH="{width}" HEIGHT="{height}">\n')
+        lines = _lines(result)
+        if not lines and result["text"].strip():
+            write(f'<TextBlock ID="block_{n}_1">\n')
+            for i, line in enumerate(result["text"].splitlines(), 1):
+                if line.strip():
+                    write(f'<TextLine ID="line_{n}_{i}"><String CONTENT="{escape(line)}"/></TextLine>\n')
+            write('</TextBlock>\n')
+        block = None
+        for i, (b, _, _, words) in enumerate(lines, 1):
+            if b != block:
+                if block is not None:
+                    write('</TextBlock>\n')
+                block = b
+                write(f'<TextBlock ID="block_{n}_{b}"{_alto_box(_bbox([w for bb, _, _, ws in lines if bb == b for w in ws]))}>\n')
+            write(f'<TextLine ID="line_{n}_{i}"{_alto_box(_bbox(words))}>')
+            for j, w in enumerate(words, 1):
+                box = (w["left"], w["top"], w["left"] + w["width"], w["top"] + w["height"])
+                write(f'<String ID="string_{n}_{i}_{j}" CONTENT="{escape(w["text"])}"{_alto_box(box)}'
+                      f' WC="{max(0.0, w["conf"]) / 100:.2f}"/>')
+            write('</TextLine>\n')
+        if block is not None:
+            write('</TextBlock>\n')
+        write('</PrintSpace>\n</Page>\n')
+
+    def end(self):
+        self.file.write('</Layout>\n</alto>\n')
+
+def _alto_box(box):
+    x0, y0, x1, y1 = box
+    return f' HPOS="{_alto(x0)}" VPOS="{_alto(y0)}" WIDTH="{_alto(x1 - x0)}" HEIGHT="{_alto(y1 - y0)}"'
+
+WRITERS = {
+    "text": TextWriter,
+    "jsonl": JsonlWriter,
+    "hocr": HocrWriter,
+    "alto": AltoWriter,
+}
+
+# Formats that need word boxes from the OCR engine.
+WORD_FORMATS = {"jsonl", "hocr", "alto"}
+
+class WriterStage:
+    # Background writer thread: OCR results are handed over as they complete (in any order) and
+    # written out in page order as soon as the next page is available, so disk I/O overlaps with
+    # OCR instead of happening after the last page.
+    def __init__(self, output_base, formats, info):
+        self.writers = [WRITERS[name](output_base) for name in formats]
+        self.info = info
+        self.queue = queue.Queue()
+        self.error = None
+        self.thread = threading.Thread(target=self._run, name="glassocr-writer", daemon=True)
+        self.thread.start()
+
+    @property
+    def paths(self):
+        return {name: writer.path for name, writer in zip(self.info["formats"], self.writers)}
+
+    def put(self, result):
+        self.queue.put(result)
+
+    def _run(self):
+        pending = {}
+        next_page = 0
+        try:
+            for writer in self.writers:
+                writer.begin(self.info)
+            while True:
+                result = self.queue.get()
+                if result is None:
+                    break
+                pending[result["page"]] = result
+                while next_page in pending:
+                    page = pending.pop(next_page)
+                    for writer in self.writers:
+                        writer.write_page(page)
+                    next_page += 1
+            if next_page != self.info["pages"]:
+                raise RuntimeError(f"writer stage ended after {next_page} of {self.info['pages']} pages")
+        except Exception as e:
+            self.error = e
+
+    def finish(self):
+        # Waits for the remaining pages, then moves every output into place.
+        self.queue.put(None)
+        self.thread.join()
+        if self.error:
+            self.abort()
+            raise self.error
+        for writer in self.writers:
+            writer.finish()
+
+    def abort(self):
+        if self.thread.is_alive():
+            self.queue.put(None)
+            self.thread.join()
+        for writer in self.writers:
+            if not writer.file.closed:
+                writer.abort()